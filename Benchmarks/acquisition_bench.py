@@ -0,0 +1,124 @@
+"""
+Frame latency and CPU cost of the acquisition modes.
+
+Runs the same consumer (deinterleave, `--work_ms` of processing and a
+`--wait_ms` cv2.waitKey-like delay) against:
+    inline    retrieveBuffer() in the consumer loop, as the capture scripts did
+    polling   Utils.acquisition.Acquisition with its retrieveBuffer() thread
+    callback  Utils.acquisition.Acquisition with startCapture(callback)
+Latency is the time from the camera timestamp to the consumer picking the frame
+up, relative to the fastest delivery seen (camera and host clocks are not
+synchronized). Needs a camera, or the simulated one:
+    PYTHONBEE_BACKEND=sim python acquisition_bench.py --duration 10 --out acquisition.json
+"""
+
+import argparse
+import time
+import numpy as np
+
+from bench_utils import write_report, print_comparison
+from Utils.backend import PyCapture2
+from Utils.acquisition import Acquisition, MODES
+from Utils.camera_setup import configure_camera
+from Utils.deinterleave import StereoDeinterleaver, raw_view
+from Utils.metrics import FrameMetrics
+from Utils.timestamps import CycleClock, enable_embedded_timestamp
+
+BENCH_MODES = ('inline',) + MODES
+
+
+def consume(splitter, raw, rows, cols, work_ms, wait_ms):
+    splitter.split(raw, rows, cols)
+    end = time.perf_counter() + work_ms / 1000.0
+    while time.perf_counter() < end:
+        pass
+    time.sleep(wait_ms / 1000.0)
+
+
+def bench_mode(cam, mode, duration, work_ms, wait_ms, depth):
+    clock = CycleClock()
+    metrics = FrameMetrics()
+    splitter = StereoDeinterleaver()
+    delivery, pickup = [], []
+    acquisition = None
+
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    if mode == 'inline':
+        cam.startCapture()
+    else:
+        acquisition = Acquisition(cam, mode, depth, metrics).start()
+    while time.monotonic() - wall_start < duration:
+        if acquisition is None:
+            try:
+                image = cam.retrieveBuffer()
+            except PyCapture2.Fc2error:
+                continue
+            received = time.monotonic()
+            metrics.update(image.getTimeStamp())
+            camera_time = clock.update(image.getTimeStamp())
+            delivery.append(received - camera_time)
+            pickup.append(received - camera_time)
+            consume(splitter, raw_view(image), image.getRows(), image.getCols(), work_ms, wait_ms)
+        else:
+            frame = acquisition.get(timeout=0.5, latest=True)
+            if frame is None:
+                continue
+            received = time.monotonic()
+            camera_time = clock.update(frame.timestamp)
+            delivery.append(frame.host_time - camera_time)
+            pickup.append(received - camera_time)
+            consume(splitter, frame.raw, frame.rows, frame.cols, work_ms, wait_ms)
+            acquisition.release(frame)
+    if acquisition is None:
+        cam.stopCapture()
+    else:
+        acquisition.stop()
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # Camera-to-host clock offset, taken from the fastest delivery
+    latency = (np.array(pickup) - min(delivery)) * 1000.0 if delivery else np.zeros(1)
+    summary = metrics.summary()
+    return dict(mode=mode, work_ms=work_ms, wait_ms=wait_ms,
+                captured_fps=summary['frames'] / wall,
+                bus_drop_rate=summary['bus_dropped'] / max(summary['frames'], 1),
+                queue_drop_rate=(acquisition.dropped if acquisition else 0) / max(summary['frames'], 1),
+                consumed_fps=len(pickup) / wall,
+                latency_median_ms=float(np.median(latency)),
+                latency_p95_ms=float(np.percentile(latency, 95)),
+                cpu_percent=100.0 * cpu / wall)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Acquisition mode benchmark')
+    parser.add_argument('--mode', type=str, nargs='+', choices=BENCH_MODES, default=list(BENCH_MODES))
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per mode')
+    parser.add_argument('--work_ms', type=float, default=10.0, help='Busy processing time per consumed frame')
+    parser.add_argument('--wait_ms', type=float, default=15.0, help='Idle display delay per consumed frame')
+    parser.add_argument('--depth', type=int, default=4, help='Preallocated frames of the acquisition queue')
+    parser.add_argument('--out', type=str, default=None, help='JSON report path (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None, help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    bus = PyCapture2.BusManager()
+    if not bus.getNumOfCameras():
+        raise SystemExit('No camera detected')
+    cam = PyCapture2.Camera()
+    cam.connect(bus.getCameraFromIndex(0))
+    print(f'Camera: {configure_camera(cam, bus.getCameraSerialNumberFromIndex(0))}')
+    enable_embedded_timestamp(cam, True)
+
+    results = []
+    for mode in args.mode:
+        result = bench_mode(cam, mode, args.duration, args.work_ms, args.wait_ms, args.depth)
+        results.append(result)
+        print(f'{mode:<9} {result["consumed_fps"]:6.1f} fps  latency {result["latency_median_ms"]:7.2f} ms'
+              f' (p95 {result["latency_p95_ms"]:7.2f})  cpu {result["cpu_percent"]:5.1f}%'
+              f'  bus drops {result["bus_drop_rate"]:.1%}')
+    cam.disconnect()
+
+    if args.out or not args.compare:
+        write_report(results, args.out, benchmark='acquisition')
+    if args.compare:
+        print_comparison(args.compare, results, metric='latency_median_ms')
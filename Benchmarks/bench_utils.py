@@ -0,0 +1,87 @@
+"""
+Shared helpers for the benchmark scripts: fixtures, timing and JSON reports.
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.sim_capture import SyntheticSource, ReplaySource
+from Utils.deinterleave import deinterleave
+
+ROWS, COLS = 768, 1024
+
+
+def load_raw_frames(source=None, rows=ROWS, cols=COLS, count=4):
+    """Fixed RAW16 stereo fixtures: recorded frames from `source` or a synthetic scene."""
+    frames = ReplaySource(source, rows, cols) if source else SyntheticSource(rows, cols, num_frames=count)
+    return [np.ascontiguousarray(frames[i]) for i in range(min(count, len(frames)))]
+
+
+def load_stereo_pair(source=None, rows=ROWS, cols=COLS):
+    left, right = deinterleave(load_raw_frames(source, rows, cols, 1)[0], rows, cols)
+    return left.copy(), right.copy()
+
+
+def time_stage(fn, repeat=20, warmup=2):
+    """Run `fn` and return timing statistics in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples = np.array(samples)
+    return {
+        'repeat': repeat,
+        'mean_ms': float(samples.mean()),
+        'median_ms': float(np.median(samples)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'min_ms': float(samples.min()),
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'cv2_threads': cv2.getNumThreads(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_report(results, path=None, **meta):
+    report = {'environment': environment(), 'meta': meta, 'results': results}
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+def result_key(result):
+    """Configuration part of a result: every field that is not a measurement."""
+    return tuple((k, result[k]) for k in sorted(result) if not isinstance(result[k], float) and k != 'repeat')
+
+
+def print_comparison(baseline_path, results, metric='median_ms'):
+    """Print the speedup of `results` over a previous JSON report."""
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None:
+            continue
+        label = ', '.join(f'{k}={v}' for k, v in result_key(result))
+        print(f'{label:<50} {old[metric]:9.2f} -> {result[metric]:9.2f} ms  x{old[metric] / result[metric]:.2f}')
@@ -0,0 +1,65 @@
+"""
+Throughput and compression ratio of the frame codecs (Utils/frame_codecs.py).
+
+Every codec and level encodes and decodes the left, right and demosaiced
+color images of one Bumblebee2 frame; use --source with recorded frames for
+realistic ratios, the synthetic fixture is noisier than real scenes. Example:
+    python codec_bench.py --source ./session --out codecs.json
+
+Encode MB/s is what one AsyncImageWriter worker sustains, ignoring the disk;
+compare the written MB/s with the disk bandwidth to pick a codec.
+"""
+
+import argparse
+
+from bench_utils import load_stereo_pair, time_stage, write_report, print_comparison
+from Utils.demosaic import Demosaicer
+from Utils.frame_codecs import make_codec, CODECS
+
+LEVELS = {'png': [None, 0, 1, 3, 6, 9], 'npy': [None], 'zlib': [1, 3, 6], 'lzma': [0, 1, 6]}
+
+
+def bench_codecs(images, codecs, repeat):
+    results = []
+    nbytes = sum(img.nbytes for img in images.values())
+    for name in codecs:
+        for level in LEVELS[name]:
+            codec = make_codec(name, level)
+            encoded = {key: codec.encode(img) for key, img in images.items()}
+            for key, img in images.items():
+                if not (codec.decode(encoded[key]) == img).all():
+                    raise RuntimeError(f'{codec} does not round-trip the {key} image')
+            size = sum(len(data) for data in encoded.values())
+            encode = time_stage(lambda: [codec.encode(img) for img in images.values()], repeat)
+            decode = time_stage(lambda: [codec.decode(data) for data in encoded.values()], repeat)
+            # 'level' stays None for the codec default, so reports stay comparable
+            results.append(dict(codec=name, level=level, ratio=size / nbytes,
+                                encode_mb_s=nbytes / encode['median_ms'] / 1000.0,
+                                written_mb_s=size / encode['median_ms'] / 1000.0,
+                                decode_mb_s=nbytes / decode['median_ms'] / 1000.0,
+                                decode_ms=decode['median_ms'], **encode))
+            print(f'{str(codec):<8} ratio {size / nbytes:6.3f}  encode {encode["median_ms"]:8.2f} ms '
+                  f'({results[-1]["encode_mb_s"]:7.1f} MB/s)  decode {decode["median_ms"]:8.2f} ms '
+                  f'({results[-1]["decode_mb_s"]:7.1f} MB/s)')
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Frame codec benchmark')
+    parser.add_argument('--codec', type=str, nargs='+', choices=CODECS, default=list(CODECS),
+                        help='Codecs to benchmark')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per codec and level')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Directory of recorded frames instead of the synthetic fixture')
+    parser.add_argument('--out', type=str, default=None, help='JSON report path (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None, help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    left, right = load_stereo_pair(args.source)
+    images = {'left': left, 'right': right, 'color': Demosaicer()(left)}
+    results = bench_codecs(images, args.codec, args.repeat)
+    if args.out or not args.compare:
+        write_report(results, args.out, benchmark='codecs', source=args.source)
+    if args.compare:
+        print_comparison(args.compare, results)
@@ -0,0 +1,66 @@
+"""
+Throughput of stripe-parallel disparity versus core count.
+
+Compares the single-call StereoEngine against ParallelStereoEngine with the
+thread and process backends for every worker count, example:
+    python parallel_bench.py --maxd 4 --workers 1 2 4 8 --out parallel.json
+"""
+
+import argparse
+import os
+import numpy as np
+
+from bench_utils import load_stereo_pair, time_stage, write_report, print_comparison
+from Utils.stereo_engine import StereoEngine
+from Utils.parallel_disparity import ParallelStereoEngine, BACKENDS
+
+
+def bench_parallel(left, right, maxd, worker_counts, stripes, backends, repeat):
+    results = []
+    engine = StereoEngine(maxd)
+    reference = engine.disparity(left, right).copy()
+    stats = time_stage(lambda: engine.disparity(left, right), repeat)
+    baseline = stats['median_ms']
+    results.append(dict(backend='single', workers=1, stripes=1, maxd=maxd,
+                        fps=1000.0 / baseline, speedup=1.0, **stats))
+    print(f'{"single":<8} workers=1  stripes=1  {baseline:8.2f} ms')
+
+    for backend in backends:
+        for workers in worker_counts:
+            n_stripes = stripes or workers
+            with ParallelStereoEngine(maxd, stripes=n_stripes, workers=workers, backend=backend) as parallel:
+                disparity = parallel.disparity(left, right)
+                # Fraction of pixels that differ from the single-call result by more than one disparity
+                mismatch = float(np.mean(np.abs(disparity.astype(np.int32) - reference) > 16))
+                stats = time_stage(lambda: parallel.disparity(left, right), repeat)
+            results.append(dict(backend=backend, workers=workers, stripes=n_stripes, maxd=maxd,
+                                fps=1000.0 / stats['median_ms'], speedup=baseline / stats['median_ms'],
+                                mismatch=mismatch, **stats))
+            print(f'{backend:<8} workers={workers:<2} stripes={n_stripes:<2} {stats["median_ms"]:8.2f} ms'
+                  f'  x{baseline / stats["median_ms"]:.2f}  mismatch {mismatch:.4%}')
+    return results
+
+
+if __name__ == '__main__':
+
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Stripe-parallel disparity benchmark')
+    parser.add_argument('--maxd', type=int, default=4, help='Maximum disparity coefficient')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, cpus} | set(range(8, cpus + 1, 8))),
+                        help='Worker counts to benchmark')
+    parser.add_argument('--stripes', type=int, default=None, help='Stripes per frame (default: one per worker)')
+    parser.add_argument('--backend', type=str, nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per configuration')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Directory of recorded frames instead of the synthetic fixture')
+    parser.add_argument('--out', type=str, default=None, help='JSON report path (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None, help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    left, right = load_stereo_pair(args.source)
+    results = bench_parallel(left, right, args.maxd, args.workers, args.stripes, args.backend, args.repeat)
+    if args.out or not args.compare:
+        write_report(results, args.out, benchmark='parallel_disparity', source=args.source)
+    if args.compare:
+        print_comparison(args.compare, results)
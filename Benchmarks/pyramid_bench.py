@@ -0,0 +1,70 @@
+"""
+Speed and accuracy of coarse-to-fine pyramid disparity against single-scale depth_map.
+
+For every --maxd and pyramid configuration, reports the median time, the speedup
+over StereoEngine, the mean absolute difference in pixels and the fraction of
+pixels off by more than one pixel (over pixels valid in both maps), example:
+    python pyramid_bench.py --maxd 4 8 --levels 1 2 3 --refine_width 16 32
+"""
+
+import argparse
+import numpy as np
+
+from bench_utils import load_stereo_pair, time_stage, write_report, print_comparison
+from Utils.stereo_engine import StereoEngine
+from Utils.pyramid_disparity import PyramidStereoEngine
+
+
+def disparity_error(disparity, reference):
+    valid = (disparity >= 0) & (reference >= 0)
+    error = np.abs(disparity[valid].astype(np.float32) - reference[valid]) / 16
+    return {
+        'mean_abs_error_px': float(error.mean()) if error.size else float('nan'),
+        'bad_pixel_rate': float((error > 1).mean()) if error.size else float('nan'),
+        'valid_rate': float(valid.mean()),
+    }
+
+
+def bench_pyramid(left, right, maxds, levels, widths, repeat):
+    results = []
+    for maxd in maxds:
+        engine = StereoEngine(maxd)
+        reference = engine.disparity(left, right).copy()
+        stats = time_stage(lambda: engine.disparity(left, right), repeat)
+        baseline = stats['median_ms']
+        results.append(dict(mode='single', maxd=maxd, levels=0, refine_width=0, speedup=1.0, **stats))
+        print(f'maxd={maxd:<3} single                    {baseline:8.2f} ms')
+
+        for level in levels:
+            for width in widths:
+                pyramid = PyramidStereoEngine(maxd, levels=level, refine_width=width)
+                error = disparity_error(pyramid.disparity(left, right), reference)
+                stats = time_stage(lambda: pyramid.disparity(left, right), repeat)
+                speedup = baseline / stats['median_ms']
+                results.append(dict(mode='pyramid', maxd=maxd, levels=level, refine_width=width,
+                                    speedup=speedup, **error, **stats))
+                print(f'maxd={maxd:<3} levels={level} width={width:<3}     {stats["median_ms"]:8.2f} ms'
+                      f'  x{speedup:.2f}  mae {error["mean_abs_error_px"]:.3f} px'
+                      f'  bad {error["bad_pixel_rate"]:.2%}')
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Pyramid disparity benchmark')
+    parser.add_argument('--maxd', type=int, nargs='+', default=[4, 8], help='Maximum disparity coefficients')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2], help='Pyramid levels to test')
+    parser.add_argument('--refine_width', type=int, nargs='+', default=[16, 32], help='Refinement widths to test')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per configuration')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Directory of recorded frames instead of the synthetic fixture')
+    parser.add_argument('--out', type=str, default=None, help='JSON report path (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None, help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    left, right = load_stereo_pair(args.source)
+    results = bench_pyramid(left, right, args.maxd, args.levels, args.refine_width, args.repeat)
+    if args.out or not args.compare:
+        write_report(results, args.out, benchmark='pyramid_disparity', source=args.source)
+    if args.compare:
+        print_comparison(args.compare, results)
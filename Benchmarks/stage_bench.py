@@ -0,0 +1,96 @@
+"""
+Per-stage microbenchmark of the frame-processing hot path.
+
+Each stage of Processing/live_depth.py and the capture scripts is timed
+separately on fixed 1024x768 RAW16 fixtures (synthetic, or recorded frames
+with --source). Stereo stages are repeated for every --maxd value.
+convert_merge is the color path the capture scripts ran before Utils/demosaic.py:
+Image.convert to BGR, three strided channel copies and cv2.merge. The SDK is not
+needed here, so its demosaic runs in the simulator's Image (Utils/sim_capture.py);
+compare it with the demosaic_* stages that replaced it.
+Results are written as JSON so runs can be compared, example:
+    python stage_bench.py --maxd 1 4 8 --out before.json
+    python stage_bench.py --maxd 1 4 8 --compare before.json
+"""
+
+import argparse
+import cv2
+
+from bench_utils import load_raw_frames, time_stage, write_report, print_comparison, ROWS, COLS
+from Utils.deinterleave import StereoDeinterleaver
+from Utils.stereo_engine import StereoEngine
+from Utils.disparity_colormap import DisparityColorizer, MODES
+from Utils.demosaic import Demosaicer, QUALITIES
+from Utils.sim_capture import Image, PIXEL_FORMAT
+
+
+def bench_stages(raw, maxds, repeat):
+    results = []
+    splitter = StereoDeinterleaver(ROWS, COLS)
+
+    def record(stage, stats, maxd=None):
+        results.append(dict(stage=stage, maxd=maxd, **stats))
+        print(f'{stage:<22} maxd={str(maxd):<4} {stats["median_ms"]:8.2f} ms')
+
+    record('deinterleave', time_stage(lambda: splitter.split(raw, ROWS, COLS), repeat))
+    left, right = (plane.copy() for plane in splitter.split(raw, ROWS, COLS))
+
+    image = Image(raw.ravel(), ROWS, COLS)
+
+    def convert_merge():
+        colorarray = image.convert(PIXEL_FORMAT.BGR).getData()
+        channels = [colorarray[c::3].reshape((ROWS, COLS)) for c in range(3)]
+        cv2.merge(channels)
+    record('convert_merge', time_stage(convert_merge, repeat))
+
+    for quality in QUALITIES:
+        demosaicer = Demosaicer(quality=quality)
+        record(f'demosaic_{quality}', time_stage(lambda: demosaicer(left), repeat))
+
+    for maxd in maxds:
+        engine = StereoEngine(maxd)
+        engine.disparity(left, right)  # Allocate and warm the engine buffers
+        record('sgbm_left', time_stage(
+            lambda: engine.left_matcher.compute(left, right, engine.displ), repeat), maxd)
+        record('sgbm_right', time_stage(
+            lambda: engine.right_matcher.compute(right, left, engine.dispr), repeat), maxd)
+        record('wls_filter', time_stage(
+            lambda: engine.wls_filter.filter(engine.displ, left, engine.filtered, engine.dispr), repeat), maxd)
+
+        filtered = engine.disparity(left, right)
+
+        def normalize_colormap():
+            img = cv2.normalize(src=filtered, dst=None, beta=0, alpha=255,
+                                norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            cv2.applyColorMap(img, cv2.COLORMAP_JET)
+        record('normalize_colormap', time_stage(normalize_colormap, repeat), maxd)
+        for mode in MODES:
+            for decimate in (1, 2):
+                colorize = DisparityColorizer(maxd, mode=mode, decimate=decimate)
+                record(f'colorize_{mode}/{decimate}', time_stage(lambda: colorize(filtered), repeat), maxd)
+        # Processing/live_depth.py depth_map: disparity, then the fixed-range colorizer
+        colorize = DisparityColorizer(maxd)
+        record('depth_map_total', time_stage(lambda: colorize(engine.disparity(left, right)), repeat), maxd)
+
+    record('png_encode', time_stage(lambda: cv2.imencode('.png', left), repeat))
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Per-stage frame processing benchmark')
+    parser.add_argument('--maxd', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Maximum disparity coefficients to benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per stage')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Directory of recorded frames instead of the synthetic fixture')
+    parser.add_argument('--out', type=str, default=None, help='JSON report path (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None, help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    raw = load_raw_frames(args.source, count=1)[0]
+    results = bench_stages(raw, args.maxd, args.repeat)
+    if args.out or not args.compare:
+        write_report(results, args.out, benchmark='stages', rows=ROWS, cols=COLS, source=args.source)
+    if args.compare:
+        print_comparison(args.compare, results)
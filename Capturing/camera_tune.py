@@ -0,0 +1,68 @@
+"""
+This script sweeps Format7 packet sizes and regions of interest on every
+camera and caches the best configuration per camera serial, which the
+capture scripts then apply at startup (Utils/camera_setup.py).
+
+Example:
+    python camera_tune.py --rois full 1024x384 640x480
+
+ROIs are WIDTHxHEIGHT (centered) or WIDTHxHEIGHTxOFFSET_XxOFFSET_Y.
+"""
+
+import argparse
+import os
+import sys
+from sys import exit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.backend import PyCapture2
+from Utils.camera_setup import tune, save_setup, roi_key, print_format7_capabilities, DEFAULT_CACHE_DIR
+
+
+def parse_roi(text):
+    if text == 'full':
+        return None
+    values = tuple(int(v) for v in text.split('x'))
+    if len(values) not in (2, 4):
+        raise argparse.ArgumentTypeError(f'Invalid ROI: {text}')
+    return values
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Camera configuration tuning')
+    parser.add_argument('--rois', type=parse_roi, nargs='+', required=False,
+                        default=[None], help='Regions of interest to measure (default: full)')
+    parser.add_argument('--frames', type=int, required=False,
+                        default=30, help='Frames measured per configuration')
+    parser.add_argument('--camera_cache', type=str, required=False,
+                        default=DEFAULT_CACHE_DIR, help='Directory caching tuned camera configurations')
+    args = parser.parse_args()
+
+# Ensure sufficient cameras are found
+    bus = PyCapture2.BusManager()
+    num_cams = bus.getNumOfCameras()
+    print('Number of cameras detected: ', num_cams)
+    if not num_cams:
+        print('Insufficient number of cameras. Exiting...')
+        exit()
+
+    for i in range(num_cams):
+        c = PyCapture2.Camera()
+        c.connect(bus.getCameraFromIndex(i))
+        serial = bus.getCameraSerialNumberFromIndex(i)
+        print(f'Camera {serial}:')
+        try:
+            results, best = tune(c, args.rois, args.frames)
+        except (RuntimeError, ValueError) as err:
+            print(err)
+            c.disconnect()
+            continue
+        print_format7_capabilities(results[0].fmt7_info)
+        for roi in args.rois:
+            setup = best[roi_key(roi)]
+            save_setup(serial, roi, setup, args.camera_cache)
+            print(f'\tBest for {roi or "full"}: {setup}')
+        c.disconnect()
+
+    print('DONE')
@@ -0,0 +1,99 @@
+"""
+This script captures from every Bumblebee2 on the bus at once.
+Frames are matched across cameras by their embedded timestamps and the left
+images of each aligned set are shown side by side.
+Each camera can be recorded to its own session directory (Utils/recording.py).
+
+Example:
+    python multi_cap.py --tolerance 5 --record ./output/multi
+
+The capturing process ceases when user press 'q'.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.acquisition import MODES, CALLBACK
+from Utils.camera_setup import add_setup_arguments
+from Utils.display import Display, add_display_arguments, display_from_args
+from Utils.deinterleave import StereoDeinterleaver
+from Utils.metrics import MetricsExporter, add_metrics_arguments
+from Utils.multi_camera import CameraManager
+from Utils.recording import RecordingWriter
+
+
+def grab_sets(manager, recorders=None, display=None):
+    splitters = [StereoDeinterleaver() for _ in manager.cameras]
+    display = display or Display()
+    while True:
+        frame_set = manager.next_set(timeout=0.1)
+        if frame_set is not None:
+            lefts = {}
+            for i, frame in enumerate(frame_set):
+                left, right = splitters[i].split(frame.raw, frame.rows, frame.cols)
+                lefts[str(manager.serials[i])] = left
+                if recorders:
+                    recorders[i].write(frame.raw, frame.timestamp)
+            display.show(**lefts)
+            manager.release(frame_set)
+    # Quit when user press q
+        if display.key() == ord('q'):
+            break
+    display.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Multi-camera capture setting')
+    parser.add_argument('--cameras', type=int, required=False,
+                        default=None, help='Number of cameras to use (default: all)')
+    parser.add_argument('--tolerance', type=float, required=False,
+                        default=None, help='Maximum timestamp difference within a frame set, in ms (default: half a frame)')
+    parser.add_argument('--acquisition', type=str, required=False, choices=MODES,
+                        default=CALLBACK, help='Deliver frames from the SDK callback or a polling thread')
+    parser.add_argument('--record', type=str, required=False,
+                        default=None, help='Record every camera to a session under this directory')
+    add_metrics_arguments(parser)
+    add_setup_arguments(parser)
+    add_display_arguments(parser)
+    args = parser.parse_args()
+
+# Connect and configure every camera
+    tolerance = args.tolerance / 1000.0 if args.tolerance is not None else None
+    if args.roi and len(args.roi) not in (2, 4):
+        parser.error('--roi takes WIDTH HEIGHT or WIDTH HEIGHT OFFSET_X OFFSET_Y')
+    manager = CameraManager(args.cameras, args.acquisition, tolerance=tolerance,
+                            roi=tuple(args.roi) if args.roi else None, packet_size=args.packet_size,
+                            tune=args.tune, cache_dir=args.camera_cache)
+    print('Cameras: ', ', '.join(str(serial) for serial in manager.serials))
+
+# Prepare raw recordings
+    recorders = None
+    if args.record:
+        recorders = [RecordingWriter(os.path.join(args.record, str(serial)), setup.height, setup.width)
+                     for serial, setup in zip(manager.serials, manager.setups)]
+
+    exporter = None
+    if args.metrics_file or args.metrics_port:
+        exporter = MetricsExporter(manager.metrics, args.metrics_file, args.metrics_port)
+
+# Capturing
+    manager.start()
+    grab_sets(manager, recorders, display_from_args(args))
+    manager.stop()
+    if exporter:
+        exporter.close()
+    if recorders:
+        for recorder in recorders:
+            recorder.close()
+
+    report = manager.report()
+    print('Frame sets: {sets} ({set_fps:.1f} fps), skew mean {skew_mean_ms:.3f} ms, max {skew_max_ms:.3f} ms'.format(**report))
+    for camera in report['cameras']:
+        print('\t{serial}: {frames} frames ({fps:.1f} fps), dropped on the bus: {bus_dropped}, '
+              'by the host: {host_dropped}, unmatched: {unmatched}'.format(**camera))
+
+    manager.disconnect()
+    print('DONE')
@@ -4,35 +4,48 @@ The capturing process will continue until user press 'q'.
 The resulting images can be found in output/press
 """
 
-import PyCapture2
 from sys import exit
-import numpy as np
-import cv2
 import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.backend import PyCapture2
+from Utils.camera_setup import add_setup_arguments, setup_from_args
+from Utils.display import Display, add_display_arguments, display_from_args
+from Utils.deinterleave import StereoDeinterleaver, raw_view
+from Utils.frame_codecs import add_codec_arguments, codec_from_args
+from Utils.image_writer import AsyncImageWriter
+from Utils.recording import RecordingWriter, PropertySampler
+from Utils.timestamps import enable_embedded_timestamp
 
 save_path = './output/press'
 if not os.path.exists(save_path):
     os.makedirs(save_path)
 
 
-def grab_images(cam):
+def grab_images(cam, writer, recorder=None, display=None):
+    splitter = StereoDeinterleaver()
+    display = display or Display()
+    if recorder:
+        properties = PropertySampler(cam)
     i = 0
     while True:
     # for i in range(number_of_images):
-        k = cv2.waitKey(1)
+        k = display.key()
         try:
             image = cam.retrieveBuffer()
-            array = np.array(image.getData(), dtype=np.uint8)
-            left = array[1::2].reshape((image.getRows(), image.getCols()))
-            right = array[0::2].reshape((image.getRows(), image.getCols()))
+            left, right = splitter(image)
 
         # Display captured images and write
-            cv2.imshow(f'left', left)
-            cv2.imshow(f'right', right)
+            display.show(left=left, right=right)
             if k%256 ==32: 
-                cv2.imwrite(f'{save_path}/left_{i:04}.png', left)
-                cv2.imwrite(f'{save_path}/right_{i:04}.png', right)
-                print(f'Frame {i} written.')
+                if recorder:
+                    recorder.write(raw_view(image), image.getTimeStamp(), *properties.values())
+                else:
+                    writer.write(f'{save_path}/left_{i:04}{writer.extension}', left)
+                    writer.write(f'{save_path}/right_{i:04}{writer.extension}', right)
+                print(f'Frame {i} queued for writing.')
                 i += 1
 
         except PyCapture2.Fc2error as fc2Err:
@@ -41,10 +54,19 @@ def grab_images(cam):
 
         if k & 0xFF == ord('q'):
             break
+    display.close()
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Press capture setting')
+    parser.add_argument('--record', type=str, required=False,
+                        default=None, help='Record the selected raw frames to this session directory instead of image files')
+    add_codec_arguments(parser)
+    add_setup_arguments(parser)
+    add_display_arguments(parser)
+    args = parser.parse_args()
+
 # Ensure sufficient cameras are found
     bus = PyCapture2.BusManager()
     num_cams = bus.getNumOfCameras()
@@ -56,29 +78,34 @@ if __name__ == '__main__':
 # Select camera on 0th index
     c = PyCapture2.Camera()
     c.connect(bus.getCameraFromIndex(0))
-    fmt7_info, supported = c.getFormat7Info(PyCapture2.MODE.MODE_3)
-
-# Check whether the chosen format is supported
-    if PyCapture2.PIXEL_FORMAT.RAW16 & fmt7_info.pixelFormatBitField == 0:
-        print('Pixel format is not supported\n')
-        exit()
 
 # Configure camera format7 settings
-    fmt7_image_set = PyCapture2.Format7ImageSettings(PyCapture2.MODE.MODE_3, 0, 0, fmt7_info.maxWidth, fmt7_info.maxHeight, PyCapture2.PIXEL_FORMAT.RAW16)
-    fmt7_pkt_inf, isValid = c.validateFormat7Settings(fmt7_image_set)
-    if not isValid:
-        print('Format7 settings are not valid!')
+    try:
+        setup = setup_from_args(c, bus.getCameraSerialNumberFromIndex(0), args)
+    except (RuntimeError, ValueError) as err:
+        print(err)
         exit()
-    c.setFormat7ConfigurationPacket(fmt7_pkt_inf.maxBytesPerPacket, fmt7_image_set)
 
 # Capturing
     print('Starting image capture...')
     c.startCapture()
     print('Ready!')
     print("Press 'SPACE' to capture or press 'q' to quit.")
-    grab_images(c)
+    recorder = None
+    if args.record:
+        enable_embedded_timestamp(c, True)
+        recorder = RecordingWriter(args.record, setup.height, setup.width)
+    writer = AsyncImageWriter(codec=codec_from_args(args))
+    grab_images(c, writer, recorder, display_from_args(args))
     c.stopCapture()
     print('Stopped image capture...')
+    if recorder:
+        recorder.close()
+        print(f'Frames recorded: {recorder.frames}')
+
+# Wait for pending writes
+    writer.close()
+    print('Images written: {written}, dropped: {dropped}, failed: {failed}'.format(**writer.stats()))
 
 # Disconnect the camera
     c.disconnect()
@@ -7,18 +7,34 @@ The images are defaultly written, but can be adjust to show only.
 Example: 
     python custom_cap.py --write_img 0
 
+Frames are saved as PNG by default; `--codec` trades disk space for CPU (Utils/frame_codecs.py), e.g.
+    python processible_cap.py --codec npy
+    python processible_cap.py --codec zlib --codec_level 1
+
 The capturing process ceases when user press 'q'.
 """
 
-import PyCapture2
-import numpy as np
-import cv2
 import argparse
 from sys import exit
 import os
-
-
-def grab_images(cam, opt_write):
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.backend import PyCapture2
+from Utils.acquisition import Acquisition, MODES, CALLBACK
+from Utils.camera_setup import add_setup_arguments, setup_from_args
+from Utils.display import Display, add_display_arguments, display_from_args
+from Utils.deinterleave import StereoDeinterleaver
+from Utils.demosaic import Demosaicer, QUALITIES, PATTERNS
+from Utils.frame_codecs import add_codec_arguments, codec_from_args
+from Utils.image_writer import AsyncImageWriter
+from Utils.metrics import add_metrics_arguments, start_metrics
+from Utils.recording import RecordingWriter, PropertySampler
+from Utils.timestamps import enable_embedded_timestamp
+from Utils.video_sink import BLOCK, DROP
+
+
+def grab_images(acquisition, opt_write, writer=None, demosaicer=None, recorder=None, display=None):
     if opt_write:
         # Prepare save directories
         left_save_path = './output/left'
@@ -31,43 +47,38 @@ def grab_images(cam, opt_write):
         if not os.path.exists(color_save_path):
             os.makedirs(color_save_path)
 
+    splitter = StereoDeinterleaver()
+    demosaicer = demosaicer or Demosaicer()
+    display = display or Display()
+    if recorder:
+        properties = PropertySampler(acquisition.cam)
     i = 0
 # Capture image
     while (True):
-        try:
-            image = cam.retrieveBuffer()
-        except PyCapture2.Fc2error as fc2Err:
-            print('Error retrieving buffer : %s' % fc2Err)
-
-    # Convert Pycapture2 raw image to processible raw image
-        rawarray = np.array(image.getData(), dtype=np.uint8)
-        left = rawarray[1::2].reshape((image.getRows(), image.getCols()))
-        right = rawarray[0::2].reshape((image.getRows(), image.getCols()))
-        # Key determine L/R is here: left starts from byte 1
-
-    # Convert Pycapture2 raw image to Pycapture2 BGR image
-        color = image.convert(PyCapture2.PIXEL_FORMAT.BGR)
-    # Convert Pycapture2 BGR image to processible BGR image
-        colorarray = np.array(color.getData(), dtype=np.uint8)
-        imgcolorB = colorarray[0::3].reshape((image.getRows(), image.getCols()))
-        imgcolorG = colorarray[1::3].reshape((image.getRows(), image.getCols()))
-        imgcolorR = colorarray[2::3].reshape((image.getRows(), image.getCols()))
-        imgcolor_merged = cv2.merge([imgcolorB, imgcolorG, imgcolorR])
-
-    # Display images
-        cv2.imshow('Left', left)
-        cv2.imshow('right', right)
-        cv2.imshow('color', imgcolor_merged)
-
-        if opt_write:
-            cv2.imwrite(f'{left_save_path}/{i:08}.png', left)
-            cv2.imwrite(f'{right_save_path}/{i:08}.png', right)
-            cv2.imwrite(f'{color_save_path}/{i:08}.png', imgcolor_merged)
-
-        i += 1
+        frame = acquisition.get(timeout=0.1)
+        if frame is not None:
+        # Convert the raw frame to processible left/right images
+            left, right = splitter.split(frame.raw, frame.rows, frame.cols)
+            # Key determine L/R is here: left starts from byte 1
+
+        # Demosaic the left Bayer plane into a processible BGR image
+            imgcolor_merged = demosaicer(left)
+
+        # Display images
+            display.show(Left=left, right=right, color=imgcolor_merged)
+
+            if recorder:
+                recorder.write(frame.raw, frame.timestamp, *properties.values())
+            if opt_write:
+                writer.write(f'{left_save_path}/{i:08}{writer.extension}', left)
+                writer.write(f'{right_save_path}/{i:08}{writer.extension}', right)
+                writer.write(f'{color_save_path}/{i:08}{writer.extension}', imgcolor_merged)
+            acquisition.release(frame)
+            i += 1
     # Quit when user press q
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if display.key() == ord('q'):
             break
+    display.close()
 
 
 if __name__ == '__main__':
@@ -76,6 +87,24 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Save output setting')
     parser.add_argument('--write_img', type=int, required=False,
                         default=df_write, help='Whether to save images')
+    parser.add_argument('--write_workers', type=int, required=False,
+                        default=2, help='Number of image writing threads')
+    parser.add_argument('--max_pending', type=int, required=False,
+                        default=64, help='Maximum number of images waiting to be written')
+    parser.add_argument('--drop_writes', type=int, required=False,
+                        default=0, help='Drop images instead of stalling capture when writing falls behind')
+    parser.add_argument('--demosaic', type=str, required=False, choices=QUALITIES,
+                        default='bilinear', help='Color reconstruction quality')
+    parser.add_argument('--bayer', type=str, required=False, choices=PATTERNS,
+                        default='BG', help='OpenCV Bayer pattern code of the sensor')
+    parser.add_argument('--record', type=str, required=False,
+                        default=None, help='Also record raw frames to this session directory')
+    parser.add_argument('--acquisition', type=str, required=False, choices=MODES,
+                        default=CALLBACK, help='Deliver frames from the SDK callback or a polling thread')
+    add_codec_arguments(parser)
+    add_metrics_arguments(parser)
+    add_setup_arguments(parser)
+    add_display_arguments(parser)
     args = parser.parse_args()
 
 # Ensure sufficient cameras are found
@@ -90,26 +119,41 @@ if __name__ == '__main__':
     c = PyCapture2.Camera()
     c.connect(bus.getCameraFromIndex(0))
 
-# Get format7 info for image settings
-    fmt7_info, supported = c.getFormat7Info(PyCapture2.MODE.MODE_3)
-
-# Check whether pixel format mono8 is supported
-    if PyCapture2.PIXEL_FORMAT.RAW16 & fmt7_info.pixelFormatBitField == 0:
-        print('Pixel format is not supported\n')
-        exit()
-
 # Configure camera format7 settings
-    fmt7_image_set = PyCapture2.Format7ImageSettings(PyCapture2.MODE.MODE_3, 0, 0, fmt7_info.maxWidth, fmt7_info.maxHeight, PyCapture2.PIXEL_FORMAT.RAW16)
-    fmt7_pkt_inf, isValid = c.validateFormat7Settings(fmt7_image_set)
-    if not isValid:
-        print('Format7 settings are not valid!')
+    try:
+        setup = setup_from_args(c, bus.getCameraSerialNumberFromIndex(0), args)
+    except (RuntimeError, ValueError) as err:
+        print(err)
         exit()
-    c.setFormat7ConfigurationPacket(fmt7_pkt_inf.maxBytesPerPacket, fmt7_image_set)
 
 # Capturing
-    c.startCapture()
-    grab_images(c, args.write_img)
-    c.stopCapture()
+    writer = AsyncImageWriter(args.write_workers, args.max_pending,
+                              DROP if args.drop_writes else BLOCK, codec_from_args(args))
+    recorder = None
+    if args.record:
+        enable_embedded_timestamp(c, True)
+        recorder = RecordingWriter(args.record, setup.height, setup.width)
+    metrics, exporter = start_metrics(c, args, bus.getCameraSerialNumberFromIndex(0))
+    acquisition = Acquisition(c, args.acquisition, metrics=metrics).start()
+    metrics.add_counter('acquisition_dropped_frames_total', lambda: acquisition.dropped,
+                        'Frames dropped by the host acquisition queue')
+    metrics.add_counter('writer_dropped_images_total', lambda: writer.dropped,
+                        'Images dropped by the host image writer')
+    grab_images(acquisition, args.write_img, writer, Demosaicer(args.bayer, args.demosaic), recorder,
+                display_from_args(args))
+    acquisition.stop()
+    if exporter:
+        exporter.close()
+    print('Frames dropped on the bus: {bus_dropped}, jitter: {jitter:.6f} s'.format(**metrics.summary()))
+    print(f'Frames dropped by the host: {acquisition.dropped}')
+    if recorder:
+        recorder.close()
+        print(f'Frames recorded: {recorder.frames}')
+
+# Wait for pending writes
+    writer.close()
+    if args.write_img:
+        print('Images written: {written}, dropped: {dropped}, failed: {failed}'.format(**writer.stats()))
 
 # Disable camera embedded timestamp
     c.disconnect()
@@ -1,53 +1,65 @@
-import PyCapture2
 from sys import exit
-import numpy as np
-import cv2
 import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.backend import PyCapture2
+from Utils.acquisition import Acquisition, MODES, CALLBACK
+from Utils.camera_setup import add_setup_arguments, setup_from_args, print_format7_capabilities
+from Utils.display import Display, add_display_arguments, display_from_args
+from Utils.deinterleave import StereoDeinterleaver
+from Utils.frame_codecs import add_codec_arguments, codec_from_args
+from Utils.image_writer import AsyncImageWriter
+from Utils.metrics import add_metrics_arguments, start_metrics
+from Utils.recording import RecordingWriter, PropertySampler
+from Utils.timestamps import enable_embedded_timestamp
 
 save_path = './output/stereo'
 
 
-def print_format7_capabilities(fmt7_info):
-    print('\nFormat 7 original capabilities:')
-    print(f'\tMode: {fmt7_info.mode}')
-    print('\tMax image pixels ({}, {}):'.format(fmt7_info.maxWidth, fmt7_info.maxHeight))
-    print('\tImage unit size: (imageHStepSize, imageVStepSize) ({}, {})'.format(fmt7_info.imageHStepSize, fmt7_info.imageVStepSize))
-    print('\tOffset unit size (offsetHStepSize, offsetVStepSize): ({}, {})'.format(fmt7_info.offsetHStepSize, fmt7_info.offsetVStepSize))
-    print('\tPixel format bitfield: 0x{}'.format(fmt7_info.pixelFormatBitField))
-    print()
+def capture(acquisition, writer, recorder=None, display=None):
 
+    if recorder:
+        properties = PropertySampler(acquisition.cam)
+    elif not os.path.exists(save_path):
+        os.makedirs(save_path)
 
-def capture(cam):
-
+    splitter = StereoDeinterleaver()
+    display = display or Display()
     i = 0
     while True:
-        try:
-            image = cam.retrieveBuffer()
-        except PyCapture2.Fc2error as fc2Err:
-            print('Error retrieving buffer : %s' % fc2Err)
-
-        # color = image.convert(PyCapture2.PIXEL_FORMAT.BGR)
-        array = np.array(image.getData(), dtype=np.uint8)
-        
-        left = array[1::2].reshape((image.getRows(), image.getCols()))
-        right = array[0::2].reshape((image.getRows(), image.getCols()))
-        cv2.imshow('left', left)
-        cv2.imshow('right', right)
-
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-
-        cv2.imwrite(f'{save_path}/left_{i}.png', left)
-        cv2.imwrite(f'{save_path}/right_{i}.png', right)
-        
-        i += 1
+        frame = acquisition.get(timeout=0.1)
+        if frame is not None:
+            left, right = splitter.split(frame.raw, frame.rows, frame.cols)
+            display.show(left=left, right=right)
+
+            if recorder:
+                recorder.write(frame.raw, frame.timestamp, *properties.values())
+            else:
+                writer.write(f'{save_path}/left_{i}{writer.extension}', left)
+                writer.write(f'{save_path}/right_{i}{writer.extension}', right)
+            acquisition.release(frame)
+            i += 1
     # Quit when user press q
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if display.key() == ord('q'):
             break
+    display.close()
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Stereo capture setting')
+    parser.add_argument('--record', type=str, required=False,
+                        default=None, help='Record raw frames to this session directory instead of image files')
+    parser.add_argument('--acquisition', type=str, required=False, choices=MODES,
+                        default=CALLBACK, help='Deliver frames from the SDK callback or a polling thread')
+    add_codec_arguments(parser)
+    add_metrics_arguments(parser)
+    add_setup_arguments(parser)
+    add_display_arguments(parser)
+    args = parser.parse_args()
+
 # Ensure sufficient cameras are found
     bus = PyCapture2.BusManager()
     num_cams = bus.getNumOfCameras()
@@ -60,31 +72,45 @@ if __name__ == '__main__':
     c = PyCapture2.Camera()
     c.connect(bus.getCameraFromIndex(0))
 
-# Print camera details
-    fmt7_info, supported = c.getFormat7Info(PyCapture2.MODE.MODE_3)
-
-# Print details of Format 7 
-    print_format7_capabilities(fmt7_info)
-
-# Check whether pixel format mono8 is supported
-    if PyCapture2.PIXEL_FORMAT.RAW16 & fmt7_info.pixelFormatBitField == 0:
-        print('Pixel format is not supported\n')
-        exit()
-
 # Configure camera format7 settings
-    fmt7_image_set = PyCapture2.Format7ImageSettings(PyCapture2.MODE.MODE_3, 0, 0, fmt7_info.maxWidth, fmt7_info.maxHeight, PyCapture2.PIXEL_FORMAT.RAW16)
-    fmt7_pkt_inf, isValid = c.validateFormat7Settings(fmt7_image_set)
-    if not isValid:
-        print('Format7 settings are not valid!')
+    try:
+        setup = setup_from_args(c, bus.getCameraSerialNumberFromIndex(0), args)
+    except (RuntimeError, ValueError) as err:
+        print(err)
         exit()
-    c.setFormat7ConfigurationPacket(fmt7_pkt_inf.maxBytesPerPacket, fmt7_image_set)
+    print_format7_capabilities(setup.fmt7_info)
+
+# Prepare raw recording
+    recorder = None
+    if args.record:
+        enable_embedded_timestamp(c, True)
+        recorder = RecordingWriter(args.record, setup.height, setup.width)
+
+# Frame timing metrics from the embedded timestamps
+    metrics, exporter = start_metrics(c, args, bus.getCameraSerialNumberFromIndex(0))
 
 # Capture
     print('Starting image capture...')
-    c.startCapture()
-    capture(c)
-    c.stopCapture()
+    acquisition = Acquisition(c, args.acquisition, metrics=metrics).start()
+    writer = AsyncImageWriter(codec=codec_from_args(args))
+    metrics.add_counter('acquisition_dropped_frames_total', lambda: acquisition.dropped,
+                        'Frames dropped by the host acquisition queue')
+    metrics.add_counter('writer_dropped_images_total', lambda: writer.dropped,
+                        'Images dropped by the host image writer')
+    capture(acquisition, writer, recorder, display_from_args(args))
+    acquisition.stop()
+    if exporter:
+        exporter.close()
+    print('Frames dropped on the bus: {bus_dropped}, jitter: {jitter:.6f} s'.format(**metrics.summary()))
+    print(f'Frames dropped by the host: {acquisition.dropped}')
     print('Stopped image capture...')
+    if recorder:
+        recorder.close()
+        print(f'Frames recorded: {recorder.frames}')
+
+# Wait for pending writes
+    writer.close()
+    print('Images written: {written}, dropped: {dropped}, failed: {failed}'.format(**writer.stats()))
 
 # Disconnect camera 
     c.disconnect()
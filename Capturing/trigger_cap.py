@@ -0,0 +1,111 @@
+"""
+This script captures software-triggered stereo frames from the Bumblebee2.
+Triggers are fired at a fixed rate, on every space key press, or as fast as
+the camera accepts them (Utils/trigger.py), and the trigger-to-frame latency
+is reported at the end.
+
+Example:
+    python trigger_cap.py --rate 10 --write_img 1
+    python trigger_cap.py --on_key 1
+
+The capturing process ceases when user press 'q'.
+"""
+
+import argparse
+import threading
+import os
+import sys
+from sys import exit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.backend import PyCapture2
+from Utils.acquisition import MODES, CALLBACK
+from Utils.camera_setup import add_setup_arguments, setup_from_args
+from Utils.display import Display, add_display_arguments, display_from_args
+from Utils.deinterleave import StereoDeinterleaver
+from Utils.frame_codecs import add_codec_arguments, codec_from_args
+from Utils.image_writer import AsyncImageWriter
+from Utils.trigger import TriggerScheduler
+
+save_path = './output/trigger'
+
+
+def grab_images(scheduler, writer=None, key_event=None, display=None):
+    if writer and not os.path.exists(save_path):
+        os.makedirs(save_path)
+
+    splitter = StereoDeinterleaver()
+    display = display or Display()
+    while True:
+        frame = scheduler.get(timeout=0.01)
+        if frame is not None:
+            left, right = splitter.split(frame.raw, frame.rows, frame.cols)
+            display.show(left=left, right=right)
+            if writer:
+                writer.write(f'{save_path}/left_{frame.index:08}{writer.extension}', left)
+                writer.write(f'{save_path}/right_{frame.index:08}{writer.extension}', right)
+            scheduler.release(frame)
+
+        key = display.key()
+    # Fire on space when triggering from the keyboard
+        if key_event is not None and key == ord(' '):
+            key_event.set()
+    # Quit when user press q
+        if key == ord('q'):
+            break
+    display.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Software trigger setting')
+    parser.add_argument('--rate', type=float, required=False,
+                        default=0, help='Trigger rate in Hz (0: as fast as the camera allows)')
+    parser.add_argument('--on_key', type=int, required=False,
+                        default=0, help='Fire one trigger per space key press instead')
+    parser.add_argument('--acquisition', type=str, required=False, choices=MODES,
+                        default=CALLBACK, help='Deliver frames from the SDK callback or a polling thread')
+    parser.add_argument('--write_img', type=int, required=False,
+                        default=0, help='Whether to save images')
+    add_codec_arguments(parser)
+    add_setup_arguments(parser)
+    add_display_arguments(parser)
+    args = parser.parse_args()
+
+# Ensure sufficient cameras are found
+    bus = PyCapture2.BusManager()
+    num_cams = bus.getNumOfCameras()
+    print('Number of cameras detected: ', num_cams)
+    if not num_cams:
+        print('Insufficient number of cameras. Exiting...')
+        exit()
+
+# Select camera on 0th index
+    c = PyCapture2.Camera()
+    c.connect(bus.getCameraFromIndex(0))
+
+# Configure camera format7 settings
+    try:
+        setup = setup_from_args(c, bus.getCameraSerialNumberFromIndex(0), args)
+    except (RuntimeError, ValueError) as err:
+        print(err)
+        exit()
+
+# Triggered capture
+    key_event = threading.Event() if args.on_key else None
+    writer = AsyncImageWriter(codec=codec_from_args(args)) if args.write_img else None
+    scheduler = TriggerScheduler(c, rate=args.rate or None, event=key_event, mode=args.acquisition)
+    scheduler.start()
+    grab_images(scheduler, writer, key_event, display_from_args(args))
+    scheduler.stop()
+
+    print('Triggers fired: {fired}, frames: {frames}, missed slots: {missed}, rate: {trigger_rate:.1f} Hz, '
+          'register reads: {register_reads}'.format(**scheduler.stats()))
+    print('Trigger to frame latency: mean {latency_mean_ms:.2f} ms, p95 {latency_p95_ms:.2f} ms, '
+          'max {latency_max_ms:.2f} ms'.format(**scheduler.stats()))
+    if writer:
+        writer.close()
+        print('Images written: {written}, dropped: {dropped}, failed: {failed}'.format(**writer.stats()))
+
+    c.disconnect()
+    print('DONE')
@@ -0,0 +1,303 @@
+"""
+This script computes disparity offline for frames saved by processible_cap.py
+(`output/left` and `output/right`, any --codec) or for a raw session recorded with `--record`.
+Left and right images are paired by frame index, then decoded and matched in a process pool;
+every worker keeps its own StereoEngine for the whole run. Examples:
+    `python batch_depth.py ./output --maxd 4`
+    `python batch_depth.py ./output --output video --workers 8`
+    `python batch_depth.py ./session --output recording`
+
+Outputs, stored at ./output/batch/ unless `--out` is given:
+    png        disparity/NNNNNNNN.png, 16-bit fixed-point disparity (pixels * 16, invalid = 0),
+               and heatmap/NNNNNNNN.png with `--heatmap 1`; written by the workers
+    recording  one session of int16 disparity maps in frame order (Utils/recording.py,
+               pixel_format DISPARITY16): RecordingReader(out).raw(i).view(np.int16)
+    video      disparity and heatmap videos in frame order, colored over the fixed --maxd range
+Running the same command again after an interruption continues where it stopped:
+existing PNGs are skipped and the recording is appended to; after a Ctrl-C, videos
+continue in a new segment file. `--restart 1` starts over.
+A frame that fails to decode or match is reported and skipped: it gets no PNG, so the
+next run retries it, and an all-invalid map in a recording or video keeps later frames
+in step with their index.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.buffer_pool import BufferPool
+from Utils.disparity_colormap import DisparityColorizer
+from Utils.frame_codecs import codec_for_path, list_frames, read_frame
+from Utils.recording import RecordingReader, RecordingWriter
+from Utils.stereo_engine import StereoEngine
+from Utils.video_sink import StreamingVideoWriter
+
+OUTPUTS = ('png', 'recording', 'video')
+PROGRESS_FILE = 'progress.json'
+INVALID_DISPARITY = -16  # (min_disparity - 1) * 16, what the matcher writes where nothing matched
+
+
+def frame_index(path):
+    """Frame index from a file name such as 00000042.png."""
+    name = os.path.basename(path)[:-len(codec_for_path(path).extension)]
+    return int(name) if name.isdigit() else name
+
+
+def frame_name(index):
+    return f'{index:08}' if isinstance(index, int) else index
+
+
+def pair_frames(source):
+    """Sorted (index, left_path, right_path) of the frames saved in both eyes."""
+    lefts = {frame_index(path): path for path in list_frames(os.path.join(source, 'left'))}
+    rights = {frame_index(path): path for path in list_frames(os.path.join(source, 'right'))}
+    unpaired = len(lefts.keys() ^ rights.keys())
+    if unpaired:
+        print(f'{unpaired} frames have no partner in the other eye and are skipped.')
+    return [(index, lefts[index], rights[index]) for index in sorted(lefts.keys() & rights.keys())]
+
+
+# Worker process state -------------------
+_engine = None
+_reader = None
+_colorize = None
+_png_path = None
+
+
+def _init_worker(md, session, png_path, heatmap):
+    global _engine, _reader, _colorize, _png_path
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent
+    cv2.setNumThreads(1)  # Parallelism comes from the pool, avoid oversubscription
+    _engine = StereoEngine(md)
+    _reader = RecordingReader(session) if session else None
+    _colorize = DisparityColorizer(md) if heatmap else None
+    _png_path = png_path
+
+
+def _write_png(path, img):
+    # Write then rename, so an interrupted run never leaves a partial PNG behind
+    tmp = f'{path}.tmp.png'
+    cv2.imwrite(tmp, img)
+    os.replace(tmp, path)
+
+
+def _match(task):
+    index, left_path, right_path = task
+    if _reader is not None:
+        left, right = _reader[index].planes()
+    else:
+        left, right = read_frame(left_path), read_frame(right_path)
+        if left is None or right is None:
+            raise RuntimeError(f'cannot decode {left_path if left is None else right_path}')
+    disp16 = _engine.disparity(left, right)
+    if _png_path is None:
+        return index, disp16
+    name = frame_name(index)
+    _write_png(os.path.join(_png_path, 'disparity', f'{name}.png'), np.maximum(disp16, 0).astype(np.uint16))
+    if _colorize is not None:
+        _write_png(os.path.join(_png_path, 'heatmap', f'{name}.png'), _colorize(disp16)[1])
+    return index, None
+
+
+class RecordingOutput(object):
+    """Ordered int16 disparity maps in a recording session, appended to on resume."""
+
+    def __init__(self, path, rows, cols, settings, restart=False):
+        self.invalid = np.full((rows, cols), INVALID_DISPARITY, dtype=np.int16)
+        if restart and os.path.exists(path):
+            for name in os.listdir(path):
+                if name in ('session.json', 'index.bin') or name.startswith('data_'):
+                    os.remove(os.path.join(path, name))
+        self.writer = RecordingWriter(path, rows, cols, pixel_format='DISPARITY16', append=True,
+                                      metadata=dict(settings, scale=16))
+        if any(self.writer.session['metadata'].get(k) != v for k, v in settings.items()):
+            self.writer.close()
+            raise RuntimeError(f'{path} holds results of other settings, pass --restart 1 to start over')
+        self.done = self.writer.frames
+
+    def write(self, index, disp16):
+        """Append `disp16`, or an all-invalid map for a failed frame (None)."""
+        if disp16 is None:
+            disp16 = self.invalid
+        self.writer.write(disp16.view(np.uint8).ravel())
+
+    def close(self):
+        self.writer.close()
+
+
+class VideoOutput(object):
+    """Ordered disparity and heatmap videos; every run writes a new segment after the frames already done."""
+
+    def __init__(self, path, rows, cols, settings, fps, restart=False):
+        self.path = path
+        self.progress_path = os.path.join(path, PROGRESS_FILE)
+        progress = {'settings': settings, 'frames': 0, 'segments': []}
+        if os.path.exists(self.progress_path) and not restart:
+            with open(self.progress_path) as f:
+                progress = json.load(f)
+            if progress['settings'] != settings:
+                raise RuntimeError(f'{path} holds results of other settings, pass --restart 1 to start over')
+        self.progress = progress
+        self.done = progress['frames']
+        suffix = f'_{self.done:08}' if self.done else ''
+        progress['segments'].append(suffix)
+        self.colorize = DisparityColorizer(settings['maxd'])
+        self.invalid = np.full((rows, cols), INVALID_DISPARITY, dtype=np.int16)
+        # Frames are queued to the encoder by reference, it hands the buffers back once written
+        self.pool = BufferPool()
+        self.video_out = StreamingVideoWriter(path, [
+            ('disparity', f'disparity{suffix}.avi', False),
+            ('heatmap', f'heatmap{suffix}.avi', True),
+        ], (cols, rows), fps=fps, on_written=lambda frames: self.pool.release(*frames.values()))
+
+    def write(self, index, disp16):
+        """Append `disp16`, or an all-invalid map for a failed frame (None)."""
+        if disp16 is None:
+            disp16 = self.invalid
+        disparity, heatmap = self.colorize(disp16, self.pool)
+        self.video_out.write(disparity=disparity, heatmap=heatmap)
+        self.progress['frames'] += 1
+
+    def close(self):
+        self.video_out.close()
+        tmp = f'{self.progress_path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.progress, f, indent=2)
+        os.replace(tmp, self.progress_path)
+
+
+def batch(tasks, md, workers, output, out_path, rows, cols, session=None, heatmap=False, fps=30,
+          restart=False, settings=None):
+    """
+    Match every (index, left_path, right_path) task; returns the number of frames computed.
+    `settings` identify the task list, an ordered output only resumes a run with the same ones.
+    """
+    settings = dict(settings or {}, maxd=md)
+    png_path = None
+    sink = None
+    if output == 'png':
+        png_path = out_path
+        for name in ('disparity', 'heatmap') if heatmap else ('disparity',):
+            os.makedirs(os.path.join(out_path, name), exist_ok=True)
+        if not restart:
+            tasks = [task for task in tasks
+                     if not os.path.exists(os.path.join(out_path, 'disparity', f'{frame_name(task[0])}.png'))]
+    elif output == 'recording':
+        sink = RecordingOutput(out_path, rows, cols, settings, restart)
+    else:
+        sink = VideoOutput(out_path, rows, cols, settings, fps, restart)
+    if sink is not None:
+        tasks = tasks[sink.done:]
+        if sink.done:
+            print(f'Resuming after {sink.done} frames already written.')
+    print(f'{len(tasks)} frames to compute with {workers} workers.')
+
+    count = 0
+    failed = []
+    start = time.monotonic()
+    pending = deque()
+
+    def collect():
+        nonlocal count
+        index, future = pending.popleft()
+        try:
+            disp16 = future.result()[1]
+        except BrokenProcessPool:
+            raise  # Every frame still in flight is lost, stop here and resume later
+        except Exception as err:
+            # One bad frame must not end the run; ordered sinks still get a placeholder
+            print(f'Frame {frame_name(index)} failed and is skipped: {err}')
+            failed.append(index)
+            disp16 = None
+        else:
+            count += 1
+            if count % 100 == 0:
+                print(f'Frame {index} done, {count / (time.monotonic() - start):.1f} fps.')
+        if sink:
+            sink.write(index, disp16)
+
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(md, session, png_path, heatmap))
+    try:
+        # A bounded window of frames in flight keeps memory flat; results are consumed in submission order
+        for task in tasks:
+            pending.append((task[0], executor.submit(_match, task)))
+            if len(pending) >= 2 * workers:
+                collect()
+        while pending:
+            collect()
+    except KeyboardInterrupt:
+        print(f'Interrupted after {count} frames, run again to resume.')
+    except BrokenProcessPool as err:
+        print(f'Worker pool failed after {count} frames, run again to resume: {err}')
+    finally:
+        # Drop the frames not started yet (shutdown(cancel_futures=True) needs Python 3.9)
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        if sink:
+            sink.close()
+    elapsed = time.monotonic() - start
+    print(f'{count} frames computed in {elapsed:.1f} s ({count / max(elapsed, 1e-9):.1f} fps).')
+    if failed:
+        print(f'{len(failed)} frames failed: {", ".join(frame_name(index) for index in failed)}')
+    return count
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Offline batch disparity')
+    parser.add_argument('source', type=str, help='Directory with left/ and right/ frames, or a recorded session')
+    parser.add_argument('--maxd', type=int, required=False, default=1, help='Maximum disparity coefficient')
+    parser.add_argument('--output', type=str, required=False, choices=OUTPUTS,
+                        default='png', help='Write disparity PNGs, a recording session or videos')
+    parser.add_argument('--out', type=str, required=False,
+                        default='./output/batch', help='Output directory')
+    parser.add_argument('--workers', type=int, required=False,
+                        default=os.cpu_count() or 1, help='Number of matching processes')
+    parser.add_argument('--heatmap', type=int, required=False,
+                        default=0, help='Also write heatmap PNGs (png output)')
+    parser.add_argument('--start', type=int, required=False, default=0, help='First frame')
+    parser.add_argument('--stop', type=int, required=False, default=None, help='Frame to stop before')
+    parser.add_argument('--step', type=int, required=False, default=1, help='Process every Nth frame')
+    parser.add_argument('--fps', type=int, required=False, default=30, help='Output video frame rate')
+    parser.add_argument('--restart', type=int, required=False,
+                        default=0, help='Discard the results of a previous run instead of resuming')
+    args = parser.parse_args()
+
+    session = None
+    if os.path.exists(os.path.join(args.source, 'session.json')):
+        session = args.source
+        reader = RecordingReader(session)
+        rows, cols = reader.rows, reader.cols
+        tasks = [(i, None, None) for i in range(len(reader))]
+    else:
+        tasks = pair_frames(args.source)
+        for _, left_path, _ in tasks:
+            first = read_frame(left_path)
+            if first is not None:
+                rows, cols = first.shape[:2]
+                break
+        else:
+            tasks = []  # Not a single frame decodes
+    tasks = tasks[args.start:args.stop:args.step]
+    if not tasks:
+        print(f'No frames found in {args.source}')
+        sys.exit()
+
+    try:
+        batch(tasks, args.maxd, args.workers, args.output, args.out, rows, cols, session,
+              bool(args.heatmap), args.fps, bool(args.restart),
+              {'source': os.path.abspath(args.source), 'start': args.start, 'stop': args.stop, 'step': args.step})
+    except (RuntimeError, IOError) as err:
+        print(err)
+        sys.exit()
+    print('DONE')
@@ -5,121 +5,207 @@ User can adjust the factor of maximum disparity (default 1) via argument, exampl
     `python live_depth.py --maxd 4`
 
 The resulting video from the capturing process is stored at ./output/videos/
+Videos are encoded while capturing; when the encoder falls behind, frames either wait
+(`--backpressure block`, default) or are dropped (`--backpressure drop`).
+Capture, stereo matching and display run in separate threads connected by a ring of
+preallocated frame slots; `--ring_policy` decides which frames are dropped when
+processing falls behind the camera (default: drop-oldest, the latest frame wins).
+Pass a stereo calibration (`--calib calib.yml`) to rectify the pair before matching, which
+allows a smaller `--maxd`; the rectification tables are cached on disk after the first run.
+Disparity and heatmap are scaled over the matcher's fixed range by default so colors stay
+stable between frames (`--vis_mode`); `--vis_decimate 2` visualizes them at half resolution.
 Uncomment the image writing command to save images.
 """
 
-import PyCapture2
-import numpy as np
-import cv2
 import argparse
 import os
+import sys
+import threading
 from sys import exit
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.backend import PyCapture2
+from Utils.stereo_engine import StereoEngine
+from Utils.parallel_disparity import ParallelStereoEngine, BACKENDS
+from Utils.pyramid_disparity import PyramidStereoEngine
+from Utils.incremental_disparity import IncrementalStereoEngine
+from Utils.camera_setup import add_setup_arguments, setup_from_args
+from Utils.calibration import load_calibration, Rectifier, DEFAULT_CACHE_DIR
+from Utils.pointcloud import PointCloudProjector, PointCloudWriter, FORMATS
+from Utils.disparity_colormap import DisparityColorizer, add_colormap_arguments
+from Utils.demosaic import Demosaicer, QUALITIES, PATTERNS
+from Utils.video_sink import StreamingVideoWriter, POLICIES, BLOCK
+from Utils.display import add_display_arguments, display_from_args
+from Utils.metrics import add_metrics_arguments, start_metrics
+from Utils.pipeline import FrameRing, CaptureThread, ProcessingWorker, LatestResult, ReorderBuffer, \
+    RING_POLICIES, DROP_OLDEST
+from Utils.buffer_pool import BufferPool
+
 video_save_path = './output/videos'
+cloud_save_path = './output/clouds'
+_engine = None
+_colorizer = None
+
+def grab_video(cam, setup, args, rectifier=None, metrics=None):
+    # `setup` is the camera's Utils.camera_setup configuration, `args` the parsed command line
+    md = args.maxd
 
-def grab_video(cam, md):
+    # Per-frame output arrays are recycled through the pool, see Utils/buffer_pool.py
+    pool = BufferPool()
 
     # Setting for video writing
-    size = (fmt7_info.maxWidth, fmt7_info.maxHeight)
-    color_img_array = []
-    disp_img_array = []
-    heatmap_img_array = []
+    size = (setup.width, setup.height)
+    color_shape = Demosaicer(args.bayer, args.demosaic).output_shape(setup.height, setup.width)
+    vis_size = DisparityColorizer(md, decimate=args.vis_decimate).output_shape(setup.height, setup.width)[::-1]
+    video_out = StreamingVideoWriter(video_save_path, [
+        ('color', 'color.avi', True, color_shape[1::-1]),
+        ('disparity', 'disparity.avi', False, vis_size),
+        ('heatmap', 'heatmap.avi', True, vis_size),
+    ], size, fps=30, max_queue=args.queue_size, policy=args.backpressure,
+        on_written=lambda frames: pool.release(*frames.values()))
+
+    results = LatestResult(pool)
+    # Workers finish out of order, the videos get the frames in capture order
+    ordered = ReorderBuffer(lambda frames: video_out.write(
+        color=frames[0], disparity=frames[1], heatmap=frames[2]))
+    engines = []
+    cloud_out = None
+    if args.cloud:
+        cloud_out = PointCloudWriter(cloud_save_path, args.cloud, args.voxel)
+    cloud_lock = threading.Lock()
+
+    def make_processor():
+        # Matchers are not thread-safe, one engine per worker
+        if args.incremental:
+            factory = StereoEngine
+            if args.pyramid > 0:
+                factory = lambda md: PyramidStereoEngine(md, levels=args.pyramid, refine_width=args.refine_width)
+            engine = IncrementalStereoEngine(md, refresh_interval=args.refresh_interval, engine_factory=factory)
+        elif args.pyramid > 0:
+            engine = PyramidStereoEngine(md, levels=args.pyramid, refine_width=args.refine_width)
+        elif args.stripes > 1:
+            engine = ParallelStereoEngine(md, stripes=args.stripes, backend=args.stripe_backend)
+        else:
+            engine = StereoEngine(md)
+        engines.append(engine)
+        demosaicer = Demosaicer(args.bayer, args.demosaic)
+        colorize = DisparityColorizer(md, mode=args.vis_mode, decimate=args.vis_decimate)
+        worker_rectifier = rectifier.clone() if rectifier else None
+        if worker_rectifier and _shared_inputs(engine):
+            # Rectify straight into the stripe workers' shared memory
+            worker_rectifier.left, worker_rectifier.right = engine.input_buffers(setup.height, setup.width)
+        projector = PointCloudProjector(rectifier.Q, args.max_depth) if cloud_out else None
+
+        def process(slot):
+            frames = None
+            try:
+                left, right = slot.left, slot.right
+                if worker_rectifier:
+                    left, right = worker_rectifier.rectify(left, right)
+            # Generate disparity image
+                disp16 = engine.disparity(left, right)  # Get the disparity map
+                disparity, heatmap = colorize(disp16, pool)
+                # Color comes from the left plane, the same eye the disparity is aligned to
+                color_image = demosaicer(slot.left, pool.acquire(color_shape))
 
-    # Capture & display
-    i = 0
+                if projector:
+                    cloud_color = None
+                    if color_image.shape[:2] == disp16.shape:
+                        cloud_color = worker_rectifier.rectify_left(color_image, pool.acquire(color_shape))
+                    points = projector(disp16, cloud_color)
+                    with cloud_lock:
+                        cloud_out.write(slot.index, points)
+                    if cloud_color is not None:
+                        pool.release(cloud_color)
+                # One reference for the video encoder, the worker's own goes to the display
+                pool.retain(color_image, disparity, heatmap)
+                frames = color_image, disparity, heatmap
+            finally:
+                # A failed frame still takes its turn, or the later ones would wait forever
+                ordered.put(slot.sequence, frames)
+
+        ## temp: Image writing
+            # cv2.imwrite(f'./output/frames/depth/{slot.index:08d}.png', heatmap)
+            # cv2.imwrite(f'./output/frames/color/{slot.index:08d}.png', color_image)
+            # cv2.imwrite(f'./output/frames/disparity/{slot.index:08d}.png', disparity)
+            return color_image, disparity, heatmap
+        return process
+
+    processes = [make_processor() for _ in range(args.workers)]
+    # Capture thread -> frame ring -> processing workers -> latest result -> display
+    allocate = None
+    if not rectifier and _shared_inputs(engines[0]):
+        # Deinterleave straight into the stripe workers' shared memory
+        allocate = engines[0].input_buffers
+    ring = FrameRing(args.ring_size, setup.height, setup.width, args.ring_policy, allocate)
+    capture = CaptureThread(cam, ring, metrics)
+    if metrics:
+        metrics.add_counter('ring_dropped_frames_total', lambda: ring.dropped + ring.skipped,
+                            'Frames dropped by the host before processing')
+        metrics.add_counter('encoder_dropped_frames_total', lambda: video_out.dropped,
+                            'Frames dropped by the host video encoder')
+    # Only drop-oldest may skip queued frames, the other policies process every frame in the ring
+    processors = [ProcessingWorker(ring, process, results, latest=(args.ring_policy == DROP_OLDEST),
+                                   name=f'processing-{n}')
+                  for n, process in enumerate(processes)]
+    capture.start()
+    for processor in processors:
+        processor.start()
+
+    # Offer the newest result to the display thread, it draws at its own rate
+    display = display_from_args(args)
+    delay = 1.0 / display.refresh
+    shown = -1
     while (True):
-        try:
-            image = cam.retrieveBuffer()
-            color = image.convert(PyCapture2.PIXEL_FORMAT.BGR)
-        except PyCapture2.Fc2error as fc2Err:
-            print('Error retrieving buffer : %s' % fc2Err)
-
-    # Convert Pycapture2 raw image to processible raw image
-        rawarray = np.array(image.getData(), dtype=np.uint8)
-        left = rawarray[1::2].reshape((image.getRows(), image.getCols()))
-        right = rawarray[0::2].reshape((image.getRows(), image.getCols()))
-        # Key determine L/R is here: left starts from byte 1
-
-        color_array = np.array(color.getData(), dtype=np.uint8)
-        imgcolorB = color_array[0::3].reshape((image.getRows(), image.getCols()))
-        imgcolorG = color_array[1::3].reshape((image.getRows(), image.getCols()))
-        imgcolorR = color_array[2::3].reshape((image.getRows(), image.getCols()))
-        color_image = cv2.merge([imgcolorB, imgcolorG, imgcolorR])
-    # Generate disparity image
-        disparity, heatmap = depth_map(
-            left, right, md)  # Get the disparity map
-
-    # Display images
-        cv2.imshow('Color', color_image)
-        cv2.imshow('Disparity', disparity)
-        cv2.imshow('Heatmap', heatmap)
-
-        color_img_array.append(color_image)
-        disp_img_array.append(disparity)
-        heatmap_img_array.append(disparity)
+        index, frames = results.get()
+        if index != shown:
+            color_image, disparity, heatmap = frames
+            display.show(Color=color_image, Disparity=disparity, Heatmap=heatmap)
+            shown = index
+        results.release(frames)
 
     # Quit when user press q
-        if cv2.waitKey(10) & 0xFF == ord('q'):
+        if display.wait_key(delay) == ord('q'):
             break
-        
-    ## temp: Image writing
-        # cv2.imwrite(f'./output/frames/depth/{i:08d}.png', heatmap)
-        # cv2.imwrite(f'./output/frames/color/{i:08d}.png', color_image)
-        # cv2.imwrite(f'./output/frames/disparity/{i:08d}.png', disparity)
-        i += 1
-
-    # Video writing
-    if not os.path.exists(video_save_path):
-        os.makedirs(video_save_path)
-    out_color = cv2.VideoWriter(f'{video_save_path}/color.avi',cv2.VideoWriter_fourcc(*'DIVX'), 30, size)
-    out_disp = cv2.VideoWriter(f'{video_save_path}/disparity.avi',cv2.VideoWriter_fourcc(*'DIVX'), 30, size)
-    out_heat = cv2.VideoWriter(f'{video_save_path}/heatmap.avi',cv2.VideoWriter_fourcc(*'DIVX'), 30, size)
-
-    for i in range(len(color_img_array)):
-        out_color.write(color_img_array[i])
-        out_disp.write(disp_img_array[i])
-        out_heat.write(heatmap_img_array[i])
-
-def depth_map(imgL, imgR, md):
-    # SGBM Parameters -----------------
-    window_size = 3
-
-    left_matcher = cv2.StereoSGBM_create(
-        minDisparity = 0,
-        numDisparities = md * 16,  # max_disp has to be dividable by 16 f. E. HH 192, 256
-        blockSize = 3,
-        P1 = 8 * 3 * window_size**2,
-        P2= 32 * 3 * window_size**2,
-        disp12MaxDiff = 12,
-        uniquenessRatio = 10,
-        speckleWindowSize = 64,
-        speckleRange = 2,
-        preFilterCap = 63,
-        mode = cv2.STEREO_SGBM_MODE_SGBM_3WAY
-    )
-    right_matcher = cv2.ximgproc.createRightMatcher(left_matcher)
-    # FILTER Parameters
-    lmbda = 8000
-    sigma = 3
-    visual_multiplier = 6
-
-    wls_filter = cv2.ximgproc.createDisparityWLSFilter(
-        matcher_left=left_matcher)
-    wls_filter.setLambda(lmbda)
-    wls_filter.setSigmaColor(sigma)
-
-    displ = left_matcher.compute(imgL, imgR)  # .astype(np.float32)/16
-    dispr = right_matcher.compute(imgR, imgL)  # .astype(np.float32)/16
-    displ = np.int16(displ)
-    dispr = np.int16(dispr)
-    # important to put "imgL" here!!!
-    filteredImg = wls_filter.filter(displ, imgL, None, dispr)
-
-    filteredImg = cv2.normalize(
-        src=filteredImg, dst=filteredImg, beta=0, alpha=255, norm_type=cv2.NORM_MINMAX)
-    filteredImg = np.uint8(filteredImg)
-    heatmap = cv2.applyColorMap(filteredImg, cv2.COLORMAP_JET)
-    return filteredImg, heatmap
+    display.close()
+
+    capture.stop()
+    for processor in processors:
+        processor.stop()
+    for engine in engines:
+        if isinstance(engine, ParallelStereoEngine):
+            engine.close()
+        elif isinstance(engine, IncrementalStereoEngine):
+            print(f'Incremental mode recomputed {engine.recompute_ratio():.1%} of the tiles')
+    print(f'Frames captured: {capture.captured}, dropped by the ring: {ring.dropped + ring.skipped}')
+
+    if cloud_out:
+        cloud_out.close()
+        print(f'Point clouds written: {cloud_out.frames}, {cloud_out.points} points')
+
+    # Flush the remaining frames to the videos
+    video_out.close()
+    if video_out.dropped:
+        print(f'{video_out.dropped} frames dropped by the video encoder.')
+    print('Buffer pool hits: {hits}, misses: {misses}'.format(**pool.stats()))
+    if metrics:
+        print('Frames dropped on the bus: {bus_dropped}, jitter: {jitter:.6f} s'.format(**metrics.summary()))
+
+def _shared_inputs(engine):
+    return isinstance(engine, ParallelStereoEngine) and engine.backend == 'process'
+
+def depth_map(imgL, imgR, md, pool=None):
+    # Reuse one engine across calls so the matchers are only built once
+    # With a BufferPool the outputs come from it, release them when done;
+    # without one they are reused buffers, overwritten by the next call
+    global _engine, _colorizer
+    if _engine is None:
+        _engine = StereoEngine(md)
+        _colorizer = DisparityColorizer(md)
+    elif md != _engine.md:
+        _engine.set_max_disparity(md)
+        _colorizer.set_range(md)
+    return _colorizer(_engine.disparity(imgL, imgR), pool)
 
 
 if __name__ == '__main__':
@@ -128,7 +214,49 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Disparity setting')
     parser.add_argument('--maxd', type=int, required=False,
                         default=df_maxd, help='Maximum disparity coefficient')
+    parser.add_argument('--queue_size', type=int, required=False,
+                        default=32, help='Maximum number of frames waiting for the video encoder')
+    parser.add_argument('--backpressure', type=str, required=False, choices=POLICIES,
+                        default=BLOCK, help='Policy when the video encoder falls behind')
+    parser.add_argument('--ring_size', type=int, required=False,
+                        default=3, help='Number of preallocated frame slots between capture and processing')
+    parser.add_argument('--ring_policy', type=str, required=False, choices=RING_POLICIES,
+                        default=DROP_OLDEST, help='Policy when processing falls behind the camera')
+    parser.add_argument('--workers', type=int, required=False,
+                        default=1, help='Number of processing threads')
+    parser.add_argument('--demosaic', type=str, required=False, choices=QUALITIES,
+                        default='bilinear', help='Color reconstruction quality')
+    parser.add_argument('--bayer', type=str, required=False, choices=PATTERNS,
+                        default='BG', help='OpenCV Bayer pattern code of the sensor')
+    parser.add_argument('--stripes', type=int, required=False,
+                        default=1, help='Split disparity computation into this many parallel stripes')
+    parser.add_argument('--stripe_backend', type=str, required=False, choices=BACKENDS,
+                        default='thread', help='Pool used for stripe-parallel disparity')
+    parser.add_argument('--pyramid', type=int, required=False,
+                        default=0, help='Coarse-to-fine pyramid levels (0 disables the pyramid mode)')
+    parser.add_argument('--refine_width', type=int, required=False,
+                        default=16, help='Per-pixel refinement search width of the pyramid mode')
+    parser.add_argument('--calib', type=str, required=False,
+                        default=None, help='Stereo calibration file (.yml/.xml/.npz) to rectify frames with')
+    parser.add_argument('--calib_cache', type=str, required=False,
+                        default=DEFAULT_CACHE_DIR, help='Directory caching the rectification tables')
+    parser.add_argument('--cloud', type=str, required=False, choices=FORMATS,
+                        default=None, help='Stream point clouds to ./output/clouds (requires --calib)')
+    parser.add_argument('--voxel', type=float, required=False,
+                        default=0, help='Voxel size for point cloud downsampling, in calibration units')
+    parser.add_argument('--max_depth', type=float, required=False,
+                        default=None, help='Discard points farther than this, in calibration units')
+    parser.add_argument('--incremental', type=int, required=False,
+                        default=0, help='Only recompute disparity where the scene changed (static rigs)')
+    parser.add_argument('--refresh_interval', type=int, required=False,
+                        default=30, help='Force a full disparity refresh every N frames in incremental mode')
+    add_colormap_arguments(parser)
+    add_metrics_arguments(parser)
+    add_display_arguments(parser)
+    add_setup_arguments(parser)
     args = parser.parse_args()
+    if args.cloud and not args.calib:
+        parser.error('--cloud requires --calib for the reprojection matrix')
 
     # Ensure sufficient cameras are found
     bus = PyCapture2.BusManager()
@@ -142,26 +270,30 @@ if __name__ == '__main__':
     c = PyCapture2.Camera()
     c.connect(bus.getCameraFromIndex(0))
 
-# Get format7 info for image settings
-    fmt7_info, supported = c.getFormat7Info(PyCapture2.MODE.MODE_3)
-
-# Check whether pixel format mono8 is supported
-    if PyCapture2.PIXEL_FORMAT.RAW16 & fmt7_info.pixelFormatBitField == 0:
-        print('Pixel format is not supported\n')
-        exit()
-
 # Configure camera format7 settings
-    fmt7_image_set = PyCapture2.Format7ImageSettings(PyCapture2.MODE.MODE_3, 0, 0, fmt7_info.maxWidth, fmt7_info.maxHeight, PyCapture2.PIXEL_FORMAT.RAW16)
-    fmt7_pkt_inf, isValid = c.validateFormat7Settings(fmt7_image_set)
-    if not isValid:
-        print('Format7 settings are not valid!')
+    try:
+        setup = setup_from_args(c, bus.getCameraSerialNumberFromIndex(0), args)
+    except (RuntimeError, ValueError) as err:
+        print(err)
         exit()
-    c.setFormat7ConfigurationPacket(fmt7_pkt_inf.maxBytesPerPacket, fmt7_image_set)
+
+# Load calibration and rectification tables
+    rectifier = None
+    if args.calib:
+        calibration = load_calibration(args.calib)
+        if setup.offset_x or setup.offset_y:
+            calibration = calibration.cropped(setup.offset_x, setup.offset_y, (setup.width, setup.height))
+        rectifier = Rectifier(calibration, (setup.width, setup.height), cache_dir=args.calib_cache)
+
+# Frame timing metrics from the embedded timestamps
+    metrics, exporter = start_metrics(c, args, bus.getCameraSerialNumberFromIndex(0))
 
 # Capturing
     c.startCapture()
-    grab_video(c, args.maxd)
+    grab_video(c, setup, args, rectifier, metrics)
     c.stopCapture()
+    if exporter:
+        exporter.close()
 
 # Disable camera embedded timestamp
     c.disconnect()
@@ -0,0 +1,80 @@
+"""
+This script computes disparity and heatmap videos from a raw session recorded with `--record`.
+Frames are read straight from the memory-mapped recording, no image decoding involved.
+A subset can be selected by frame number or by camera time (seconds since the first frame), example:
+    `python replay_depth.py ./session --maxd 4 --step 5`
+    `python replay_depth.py ./session --start_time 10 --stop_time 20`
+    `python replay_depth.py ./session --vis_mode percentile --vis_decimate 2`
+
+The resulting videos are stored at ./output/replay/
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Utils.buffer_pool import BufferPool
+from Utils.recording import RecordingReader
+from Utils.disparity_colormap import DisparityColorizer, FIXED, add_colormap_arguments
+from Utils.stereo_engine import StereoEngine
+from Utils.video_sink import StreamingVideoWriter
+
+video_save_path = './output/replay'
+
+
+def replay(reader, frames, md, fps, vis_mode=FIXED, vis_decimate=1):
+    colorize = DisparityColorizer(md, mode=vis_mode, decimate=vis_decimate)
+    size = colorize.output_shape(reader.rows, reader.cols)[::-1]
+    # Frames are queued to the encoder by reference, it hands the buffers back once written
+    pool = BufferPool()
+    video_out = StreamingVideoWriter(video_save_path, [
+        ('disparity', 'disparity.avi', False),
+        ('heatmap', 'heatmap.avi', True),
+    ], size, fps=fps, on_written=lambda frames: pool.release(*frames.values()))
+    engine = StereoEngine(md)
+
+    count = 0
+    for frame in frames:
+        left, right = frame.planes()
+        disparity, heatmap = colorize(engine.disparity(left, right), pool)
+        video_out.write(disparity=disparity, heatmap=heatmap)
+        count += 1
+        if count % 100 == 0:
+            print(f'Frame {frame.index} processed.')
+
+    video_out.close()
+    return count
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Replay a recorded session')
+    parser.add_argument('session', type=str, help='Recorded session directory')
+    parser.add_argument('--maxd', type=int, required=False, default=1, help='Maximum disparity coefficient')
+    parser.add_argument('--start', type=int, required=False, default=0, help='First frame')
+    parser.add_argument('--stop', type=int, required=False, default=None, help='Frame to stop before')
+    parser.add_argument('--step', type=int, required=False, default=1, help='Process every Nth frame')
+    parser.add_argument('--start_time', type=float, required=False, default=None,
+                        help='Start at this camera time, in seconds from the first frame')
+    parser.add_argument('--stop_time', type=float, required=False, default=None,
+                        help='Stop at this camera time, in seconds from the first frame')
+    parser.add_argument('--fps', type=int, required=False, default=30, help='Output video frame rate')
+    add_colormap_arguments(parser)
+    args = parser.parse_args()
+
+    reader = RecordingReader(args.session)
+    print(f'{len(reader)} frames recorded at {reader.cols}x{reader.rows}')
+    if not len(reader):
+        sys.exit()
+
+    start, stop = args.start, args.stop
+    t0 = reader[0].camera_time
+    if args.start_time is not None:
+        start = reader.find_time(t0 + args.start_time)
+    if args.stop_time is not None:
+        stop = reader.find_time(t0 + args.stop_time)
+
+    count = replay(reader, reader[start:stop:args.step], args.maxd, args.fps, args.vis_mode, args.vis_decimate)
+    print(f'{count} frames processed.')
+    print('DONE')
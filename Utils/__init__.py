@@ -0,0 +1,5 @@
+"""
+Shared helpers for the PythonBee capturing and processing scripts.
+The scripts in Capturing/ and Processing/ add the repository root to sys.path
+so these modules can be imported as `from Utils.<module> import ...`.
+"""
@@ -0,0 +1,174 @@
+"""
+Camera acquisition decoupled from the consumer loop.
+
+In CALLBACK mode the SDK delivers every image to startCapture(callback); the
+callback copies the raw buffer into a free preallocated frame, hands it over on
+a deque and returns. POLLING mode runs the classic retrieveBuffer() loop on its
+own thread and feeds the same queue, for comparison.
+Either way the consumer's processing and cv2.waitKey delays no longer stall
+the capture path: when it falls behind, the oldest queued frame is dropped.
+
+collections.deque append/popleft are atomic, so the handover needs no lock;
+an Event only wakes a consumer that found the queue empty.
+"""
+
+import threading
+import time
+from collections import deque
+import numpy as np
+
+from Utils.backend import PyCapture2
+from Utils.deinterleave import raw_view, deinterleave
+
+CALLBACK = 'callback'
+POLLING = 'polling'
+MODES = (CALLBACK, POLLING)
+
+
+class AcquiredFrame(object):
+    """One preallocated copy of an interleaved RAW16 buffer and its metadata."""
+
+    def __init__(self):
+        self.raw = None
+        self.rows = 0
+        self.cols = 0
+        self.index = -1
+        self.host_time = 0.0
+        self.timestamp = None
+
+    def fill(self, image):
+        rows, cols = image.getRows(), image.getCols()
+        data = raw_view(image)
+        size = rows * cols * 2
+        if self.raw is None or self.raw.size != size:
+            self.raw = np.empty(size, dtype=np.uint8)
+        np.copyto(self.raw, data[:size])
+        self.rows, self.cols = rows, cols
+        self.timestamp = image.getTimeStamp()
+
+    def split(self, out=None):
+        """Deinterleave into (left, right) planes, see Utils/deinterleave.py."""
+        return deinterleave(self.raw, self.rows, self.cols, out)
+
+
+class Acquisition(object):
+    """
+    Start capturing on `cam` and hand frames to consumers through get()/release().
+    `depth` frames are preallocated; a consumer holding all of them makes new
+    images drop. Frame timing is fed to `metrics` (Utils/metrics.py) when given.
+    """
+
+    def __init__(self, cam, mode=CALLBACK, depth=4, metrics=None):
+        if mode not in MODES:
+            raise ValueError(f'Unknown acquisition mode: {mode}')
+        if depth < 2:
+            raise ValueError('Acquisition needs at least two frames')
+        self.cam = cam
+        self.mode = mode
+        self.metrics = metrics
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self._free = deque(AcquiredFrame() for _ in range(depth))
+        self._ready = deque()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        if self.mode == CALLBACK:
+            self.cam.startCapture(self._on_image)
+        else:
+            self.cam.startCapture()
+            self._thread = threading.Thread(target=self._poll, name='acquisition', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        # Stopping the capture also wakes a polling thread blocked in retrieveBuffer()
+        self.cam.stopCapture()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self._wake.set()
+
+    def _poll(self):
+        while self._running:
+            try:
+                image = self.cam.retrieveBuffer()
+            except PyCapture2.Fc2error as fc2Err:
+                if self._running:
+                    print('Error retrieving buffer : %s' % fc2Err)
+                    self.errors += 1
+                    if self.metrics:
+                        self.metrics.error()
+                continue
+            self._on_image(image)
+
+    def _on_image(self, image, *args):
+        # Runs on the SDK thread: copy, enqueue, return
+        host_time = time.monotonic()
+        if self.metrics:
+            self.metrics.update(image.getTimeStamp())
+        try:
+            frame = self._free.popleft()
+        except IndexError:
+            try:
+                # Consumer is behind: recycle the oldest frame it has not taken yet
+                frame = self._ready.popleft()
+            except IndexError:
+                self.dropped += 1
+                return
+            self.dropped += 1
+        frame.fill(image)
+        frame.index = self.delivered
+        frame.host_time = host_time
+        self.delivered += 1
+        self._ready.append(frame)
+        self._wake.set()
+
+    def get(self, timeout=None, latest=False):
+        """
+        Next frame in capture order, or the newest one with `latest` (older
+        queued frames are released). Returns None on timeout or after stop().
+        Hand the frame back with release() once done with it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                frame = self._ready.popleft()
+            except IndexError:
+                frame = None
+            if frame is not None:
+                if latest:
+                    while True:
+                        try:
+                            newer = self._ready.popleft()
+                        except IndexError:
+                            break
+                        self._free.append(frame)
+                        frame = newer
+                return frame
+            if not self._running:
+                return None
+            self._wake.clear()
+            if self._ready:
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            self._wake.wait(remaining)
+
+    def release(self, frame):
+        self._free.append(frame)
+
+    def pending(self):
+        return len(self._ready)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,16 @@
+"""
+PyCapture2 backend selection.
+
+Scripts import `PyCapture2` from here instead of importing the SDK directly.
+Setting PYTHONBEE_BACKEND=sim swaps in the simulated camera from
+Utils/sim_capture.py, so everything runs without a physical Bumblebee2.
+"""
+
+import os
+
+if os.environ.get('PYTHONBEE_BACKEND', '').lower() == 'sim':
+    from Utils import sim_capture as PyCapture2
+else:
+    import PyCapture2
+
+SIMULATED = PyCapture2.__name__ != 'PyCapture2'
@@ -0,0 +1,72 @@
+"""
+Reusable frame buffers keyed by (shape, dtype).
+
+Stages acquire their output arrays from the pool and pass them to OpenCV as
+`dst=`, so steady-state processing makes no large allocations. Buffers are
+reference counted: every party that keeps an array (video encoder, display,
+...) retains it and releases it when done, and the array returns to the pool
+once the last reference is gone. Hit/miss counters show whether the pool has
+reached steady state.
+"""
+
+import threading
+from collections import defaultdict
+import numpy as np
+
+
+class BufferPool(object):
+
+    def __init__(self, max_free=8):
+        self.max_free = max_free  # Free buffers kept per (shape, dtype)
+        self.hits = 0
+        self.misses = 0
+        self._free = defaultdict(list)
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(shape, dtype):
+        return tuple(shape), np.dtype(dtype).str
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Return an uninitialized array of `shape` and `dtype`, with one reference."""
+        key = self._key(shape, dtype)
+        with self._lock:
+            free = self._free[key]
+            if free:
+                array = free.pop()
+                self.hits += 1
+            else:
+                array = None
+                self.misses += 1
+        if array is None:
+            array = np.empty(shape, dtype=dtype)
+        with self._lock:
+            self._refs[id(array)] = [array, 1]
+        return array
+
+    def retain(self, *arrays):
+        with self._lock:
+            for array in arrays:
+                self._refs[id(array)][1] += 1
+
+    def release(self, *arrays):
+        """Drop one reference to each array; unreferenced arrays go back to the pool."""
+        with self._lock:
+            for array in arrays:
+                ref = self._refs[id(array)]
+                ref[1] -= 1
+                if ref[1] == 0:
+                    del self._refs[id(array)]
+                    free = self._free[self._key(array.shape, array.dtype)]
+                    if len(free) < self.max_free:
+                        free.append(array)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'in_use': len(self._refs),
+                'free': sum(len(free) for free in self._free.values()),
+            }
@@ -0,0 +1,173 @@
+"""
+Stereo calibration loading and cached rectification.
+
+A calibration file holds the intrinsics (K1, D1, K2, D2) and extrinsics (R, T)
+of the Bumblebee2 pair, either as an OpenCV FileStorage file (.yml/.yaml/.xml)
+or a NumPy .npz archive. The legacy OpenCV names M1/M2 and
+cameraMatrix1/2, distCoeffs1/2 are accepted too.
+
+The undistort/rectify lookup tables are computed once with
+cv2.initUndistortRectifyMap, optionally in the fixed-point CV_16SC2 form, and
+cached on disk keyed by the calibration hash and the image size. Every frame
+then costs one cv2.remap per eye into reused buffers.
+"""
+
+import copy
+import hashlib
+import os
+import numpy as np
+import cv2
+
+_ALIASES = {
+    'K1': ('K1', 'M1', 'cameraMatrix1'),
+    'D1': ('D1', 'distCoeffs1'),
+    'K2': ('K2', 'M2', 'cameraMatrix2'),
+    'D2': ('D2', 'distCoeffs2'),
+    'R': ('R',),
+    'T': ('T',),
+    'size': ('size', 'image_size', 'imageSize'),
+}
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pythonbee', 'rectify')
+
+
+class StereoCalibration(object):
+
+    def __init__(self, K1, D1, K2, D2, R, T, size=None):
+        self.K1 = np.asarray(K1, dtype=np.float64).reshape(3, 3)
+        self.D1 = np.asarray(D1, dtype=np.float64).ravel()
+        self.K2 = np.asarray(K2, dtype=np.float64).reshape(3, 3)
+        self.D2 = np.asarray(D2, dtype=np.float64).ravel()
+        self.R = np.asarray(R, dtype=np.float64).reshape(3, 3)
+        self.T = np.asarray(T, dtype=np.float64).reshape(3, 1)
+        self.size = tuple(int(v) for v in np.ravel(size)) if size is not None else None
+
+    def hash(self):
+        digest = hashlib.sha1()
+        for array in (self.K1, self.D1, self.K2, self.D2, self.R, self.T):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()[:16]
+
+    def cropped(self, offset_x, offset_y, size):
+        """Calibration of a Format7 ROI of the calibrated sensor: shift both principal points."""
+        K1, K2 = self.K1.copy(), self.K2.copy()
+        for K in (K1, K2):
+            K[0, 2] -= offset_x
+            K[1, 2] -= offset_y
+        return StereoCalibration(K1, self.D1, K2, self.D2, self.R, self.T, size)
+
+    def save(self, path):
+        if path.endswith('.npz'):
+            np.savez(path, K1=self.K1, D1=self.D1, K2=self.K2, D2=self.D2, R=self.R, T=self.T,
+                     size=np.array(self.size or (0, 0)))
+            return
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+        for name in ('K1', 'D1', 'K2', 'D2', 'R', 'T'):
+            fs.write(name, getattr(self, name))
+        if self.size:
+            fs.write('size', np.array(self.size, dtype=np.int32))
+        fs.release()
+
+
+def load_calibration(path):
+    """Load a StereoCalibration from a .yml/.yaml/.xml FileStorage or .npz file."""
+    if not os.path.exists(path):
+        raise IOError(f'Calibration file not found: {path}')
+    values = {}
+    if path.endswith('.npz'):
+        with np.load(path) as archive:
+            for key, names in _ALIASES.items():
+                for name in names:
+                    if name in archive.files:
+                        values[key] = archive[name]
+                        break
+    else:
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+        for key, names in _ALIASES.items():
+            for name in names:
+                node = fs.getNode(name)
+                if not node.empty():
+                    if node.isSeq():
+                        values[key] = np.array([node.at(i).real() for i in range(node.size())])
+                    else:
+                        values[key] = node.mat()
+                    break
+        fs.release()
+    missing = [key for key in _ALIASES if key != 'size' and key not in values]
+    if missing:
+        raise ValueError(f'Calibration file {path} is missing: {", ".join(missing)}')
+    size = values.get('size')
+    if size is not None and not np.any(size):
+        size = None
+    return StereoCalibration(values['K1'], values['D1'], values['K2'], values['D2'],
+                             values['R'], values['T'], size)
+
+
+class Rectifier(object):
+    """
+    Rectify stereo pairs with precomputed remap tables.
+    `fixed_point` selects the compact CV_16SC2 maps, which remap faster than
+    float maps at a negligible precision cost.
+    """
+
+    def __init__(self, calibration, size, alpha=0, fixed_point=True, cache_dir=DEFAULT_CACHE_DIR):
+        self.calibration = calibration
+        self.size = tuple(size)  # (width, height)
+        self.alpha = alpha
+        self.fixed_point = fixed_point
+        self.cache_dir = cache_dir
+        self._load_or_build()
+        self.left = np.empty(self.size[::-1], dtype=np.uint8)
+        self.right = np.empty(self.size[::-1], dtype=np.uint8)
+
+    def cache_path(self):
+        kind = '16sc2' if self.fixed_point else '32f'
+        width, height = self.size
+        return os.path.join(self.cache_dir,
+                            f'{self.calibration.hash()}_{width}x{height}_a{self.alpha:g}_{kind}.npz')
+
+    def _load_or_build(self):
+        path = self.cache_path() if self.cache_dir else None
+        if path and os.path.exists(path):
+            with np.load(path) as cache:
+                self.maps = [(cache['l1'], cache['l2']), (cache['r1'], cache['r2'])]
+                self.R1, self.R2, self.P1, self.P2, self.Q = (
+                    cache['R1'], cache['R2'], cache['P1'], cache['P2'], cache['Q'])
+                self.roi = (tuple(cache['roi1']), tuple(cache['roi2']))
+            return
+
+        c = self.calibration
+        self.R1, self.R2, self.P1, self.P2, self.Q, roi1, roi2 = cv2.stereoRectify(
+            c.K1, c.D1, c.K2, c.D2, self.size, c.R, c.T,
+            flags=cv2.CALIB_ZERO_DISPARITY, alpha=self.alpha)
+        self.roi = (tuple(roi1), tuple(roi2))
+        m1type = cv2.CV_16SC2 if self.fixed_point else cv2.CV_32FC1
+        self.maps = [
+            cv2.initUndistortRectifyMap(c.K1, c.D1, self.R1, self.P1, self.size, m1type),
+            cv2.initUndistortRectifyMap(c.K2, c.D2, self.R2, self.P2, self.size, m1type),
+        ]
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename so concurrent startups never read a partial cache
+            tmp = path + f'.{os.getpid()}.tmp.npz'
+            np.savez(tmp, l1=self.maps[0][0], l2=self.maps[0][1], r1=self.maps[1][0], r2=self.maps[1][1],
+                     R1=self.R1, R2=self.R2, P1=self.P1, P2=self.P2, Q=self.Q,
+                     roi1=np.array(roi1), roi2=np.array(roi2))
+            os.replace(tmp, path)
+
+    def clone(self):
+        """A rectifier sharing the remap tables but with its own output buffers, for another thread."""
+        other = copy.copy(self)
+        other.left = np.empty_like(self.left)
+        other.right = np.empty_like(self.right)
+        return other
+
+    def rectify(self, left, right):
+        """Return the rectified (left, right) pair; the buffers are reused between calls."""
+        cv2.remap(left, self.maps[0][0], self.maps[0][1], cv2.INTER_LINEAR, dst=self.left)
+        cv2.remap(right, self.maps[1][0], self.maps[1][1], cv2.INTER_LINEAR, dst=self.right)
+        return self.left, self.right
+
+    def rectify_left(self, image, dst=None):
+        """Remap any full-size image taken by the left eye, e.g. its demosaiced color."""
+        return cv2.remap(image, self.maps[0][0], self.maps[0][1], cv2.INTER_LINEAR, dst=dst)
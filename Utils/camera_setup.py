@@ -0,0 +1,230 @@
+"""
+Format7 MODE_3 / RAW16 camera setup shared by all scripts.
+
+A region of interest is aligned to the camera's image and offset step sizes;
+cropping to the region used for matching sends fewer bytes per frame and so
+raises the frame rate the 1394 bus allows. tune() sweeps packet sizes (and
+optionally several ROIs), measures the frame rate each achieves and stores
+the best validated configuration per camera serial in `cache_dir`, so later
+startups apply it without probing.
+"""
+
+import json
+import os
+import time
+
+from Utils.backend import PyCapture2
+from Utils.timestamps import CycleClock, enable_embedded_timestamp
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pythonbee', 'camera')
+
+
+def print_format7_capabilities(fmt7_info):
+    print('\nFormat 7 original capabilities:')
+    print(f'\tMode: {fmt7_info.mode}')
+    print('\tMax image pixels ({}, {}):'.format(fmt7_info.maxWidth, fmt7_info.maxHeight))
+    print('\tImage unit size: (imageHStepSize, imageVStepSize) ({}, {})'.format(fmt7_info.imageHStepSize, fmt7_info.imageVStepSize))
+    print('\tOffset unit size (offsetHStepSize, offsetVStepSize): ({}, {})'.format(fmt7_info.offsetHStepSize, fmt7_info.offsetVStepSize))
+    print('\tPixel format bitfield: 0x{}'.format(fmt7_info.pixelFormatBitField))
+    print()
+
+
+def _align(value, step):
+    step = max(int(step), 1)
+    return int(value) // step * step
+
+
+def aligned_roi(fmt7_info, roi=None):
+    """
+    (offset_x, offset_y, width, height) aligned to the Format7 step sizes.
+    `roi` is None for the full sensor, (width, height) for a centered crop,
+    or (width, height, offset_x, offset_y).
+    """
+    if not roi:
+        return 0, 0, fmt7_info.maxWidth, fmt7_info.maxHeight
+    width = min(_align(roi[0], fmt7_info.imageHStepSize), fmt7_info.maxWidth)
+    height = min(_align(roi[1], fmt7_info.imageVStepSize), fmt7_info.maxHeight)
+    if width <= 0 or height <= 0:
+        raise ValueError(f'ROI {roi} is smaller than one Format7 step')
+    if len(roi) >= 4:
+        offset_x, offset_y = roi[2], roi[3]
+    else:
+        offset_x, offset_y = (fmt7_info.maxWidth - width) // 2, (fmt7_info.maxHeight - height) // 2
+    offset_x = min(_align(offset_x, fmt7_info.offsetHStepSize), fmt7_info.maxWidth - width)
+    offset_y = min(_align(offset_y, fmt7_info.offsetVStepSize), fmt7_info.maxHeight - height)
+    return offset_x, offset_y, width, height
+
+
+def packet_sizes(packet_info, count=4):
+    """Candidate packet sizes from the validated maximum down, in unitBytesPerPacket steps."""
+    unit = max(packet_info.unitBytesPerPacket, 1)
+    sizes = {_align(packet_info.maxBytesPerPacket * (count - i) / count, unit) for i in range(count)}
+    sizes.add(packet_info.recommendedBytesPerPacket)
+    return sorted((size for size in sizes if size > 0), reverse=True)
+
+
+class CameraSetup(object):
+    """The applied Format7 configuration of one camera."""
+
+    def __init__(self, fmt7_info, offset_x, offset_y, width, height, packet_size, fps=None):
+        self.fmt7_info = fmt7_info
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.width = width
+        self.height = height
+        self.packet_size = packet_size
+        self.fps = fps
+
+    @property
+    def roi(self):
+        return self.offset_x, self.offset_y, self.width, self.height
+
+    def __repr__(self):
+        fps = f', {self.fps:.1f} fps' if self.fps else ''
+        return (f'{self.width}x{self.height}+{self.offset_x}+{self.offset_y}, '
+                f'{self.packet_size} bytes/packet{fps}')
+
+
+def apply_format7(cam, roi=None, packet_size=None):
+    """
+    Validate and apply MODE_3 / RAW16 with the given ROI (see aligned_roi) and
+    packet size (default: the largest valid one). Returns (CameraSetup, packet info).
+    """
+    fmt7_info, supported = cam.getFormat7Info(PyCapture2.MODE.MODE_3)
+    if PyCapture2.PIXEL_FORMAT.RAW16 & fmt7_info.pixelFormatBitField == 0:
+        raise RuntimeError('Pixel format is not supported')
+    offset_x, offset_y, width, height = aligned_roi(fmt7_info, roi)
+    fmt7_image_set = PyCapture2.Format7ImageSettings(PyCapture2.MODE.MODE_3, offset_x, offset_y,
+                                                     width, height, PyCapture2.PIXEL_FORMAT.RAW16)
+    fmt7_pkt_inf, isValid = cam.validateFormat7Settings(fmt7_image_set)
+    if not isValid:
+        raise RuntimeError('Format7 settings are not valid!')
+    if packet_size is None or packet_size > fmt7_pkt_inf.maxBytesPerPacket:
+        packet_size = fmt7_pkt_inf.maxBytesPerPacket
+    cam.setFormat7ConfigurationPacket(packet_size, fmt7_image_set)
+    return CameraSetup(fmt7_info, offset_x, offset_y, width, height, packet_size), fmt7_pkt_inf
+
+
+def measure_frame_rate(cam, frames=30, timeout=5.0):
+    """Frame rate achieved by the current configuration, from embedded timestamps when available."""
+    embedded = enable_embedded_timestamp(cam, True)
+    clock = CycleClock()
+    times = []
+    cam.startCapture()
+    deadline = time.monotonic() + timeout
+    try:
+        while len(times) < frames + 1 and time.monotonic() < deadline:
+            try:
+                image = cam.retrieveBuffer()
+            except PyCapture2.Fc2error:
+                continue
+            times.append(clock.update(image.getTimeStamp()) if embedded else time.monotonic())
+    finally:
+        cam.stopCapture()
+    if len(times) < 2:
+        return 0.0
+    return (len(times) - 1) / (times[-1] - times[0])
+
+
+def _cache_path(serial, cache_dir):
+    return os.path.join(cache_dir, f'{serial}.json')
+
+
+def roi_key(roi):
+    return 'full' if not roi else 'x'.join(str(int(v)) for v in roi)
+
+
+def load_setup(serial, roi=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Cached (packet_size, fps) for this camera and ROI request, or None."""
+    path = _cache_path(serial, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        entry = json.load(f).get(roi_key(roi))
+    return (entry['packet_size'], entry['fps']) if entry else None
+
+
+def save_setup(serial, roi, setup, cache_dir=DEFAULT_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(serial, cache_dir)
+    entries = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            entries = json.load(f)
+    entries[roi_key(roi)] = {'roi': list(setup.roi), 'packet_size': setup.packet_size, 'fps': setup.fps}
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp, path)
+
+
+def tune(cam, rois=(None,), frames=30, verbose=True):
+    """
+    Measure every ROI request with every candidate packet size.
+    Returns the results (CameraSetup with fps) and the best one per ROI request.
+    """
+    results, best = [], {}
+    for roi in rois:
+        setup, packet_info = apply_format7(cam, roi)
+        for packet_size in packet_sizes(packet_info):
+            setup, _ = apply_format7(cam, roi, packet_size)
+            setup.fps = measure_frame_rate(cam, frames)
+            results.append(setup)
+            if verbose:
+                print(f'\t{setup}')
+            # Prefer the smallest packet reaching the best rate, it leaves bus bandwidth for others
+            current = best.get(roi_key(roi))
+            if current is None or setup.fps > current.fps * 1.02 or (
+                    setup.fps >= current.fps * 0.98 and setup.packet_size < current.packet_size):
+                best[roi_key(roi)] = setup
+    return results, best
+
+
+def configure_camera(cam, serial, roi=None, packet_size=None, tune_packets=False,
+                     cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Apply MODE_3 / RAW16 with `roi`. The packet size is, in order: the one
+    given, the cached one for this serial and ROI, a freshly tuned one
+    (tune_packets) or the largest valid one. Returns the CameraSetup.
+    """
+    if packet_size is None and cache_dir:
+        cached = load_setup(serial, roi, cache_dir)
+        if cached:
+            try:
+                setup, _ = apply_format7(cam, roi, cached[0])
+                setup.fps = cached[1]
+                return setup
+            except RuntimeError:
+                print('Cached camera configuration is no longer valid, probing again.')
+    if packet_size is None and tune_packets:
+        print(f'Tuning packet size for camera {serial}...')
+        _, best = tune(cam, (roi,))
+        packet_size = best[roi_key(roi)].packet_size
+        setup, _ = apply_format7(cam, roi, packet_size)
+        setup.fps = best[roi_key(roi)].fps
+        if cache_dir:
+            save_setup(serial, roi, setup, cache_dir)
+        return setup
+    setup, _ = apply_format7(cam, roi, packet_size)
+    return setup
+
+
+def add_setup_arguments(parser):
+    parser.add_argument('--roi', type=int, nargs='+', required=False,
+                        default=None, help='Region of interest: WIDTH HEIGHT [OFFSET_X OFFSET_Y] (default: full sensor, centered without offsets)')
+    parser.add_argument('--packet_size', type=int, required=False,
+                        default=None, help='Format7 bytes per packet (default: cached tuning or the largest valid)')
+    parser.add_argument('--tune', type=int, required=False,
+                        default=0, help='Measure packet sizes on first use and cache the best per camera serial')
+    parser.add_argument('--camera_cache', type=str, required=False,
+                        default=DEFAULT_CACHE_DIR, help='Directory caching tuned camera configurations')
+
+
+def setup_from_args(cam, serial, args):
+    """configure_camera() with the options of add_setup_arguments()."""
+    if args.roi and len(args.roi) not in (2, 4):
+        raise ValueError('--roi takes WIDTH HEIGHT or WIDTH HEIGHT OFFSET_X OFFSET_Y')
+    setup = configure_camera(cam, serial, tuple(args.roi) if args.roi else None, args.packet_size,
+                             args.tune, args.camera_cache)
+    print(f'Camera {serial}: {setup}')
+    return setup
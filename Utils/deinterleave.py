@@ -0,0 +1,61 @@
+"""
+Zero-copy RAW16 stereo deinterleaving for the Bumblebee2.
+
+In Format7 MODE_3 / RAW16 every 16-bit pixel carries one byte from each sensor:
+byte 0 belongs to the right camera and byte 1 to the left camera.
+The PyCapture2 buffer is viewed in place with np.frombuffer and split into
+both planes with a single np.copyto into a preallocated (2, rows, cols) buffer.
+"""
+
+import numpy as np
+
+LEFT = 0
+RIGHT = 1
+
+
+def raw_view(image):
+    """Return a flat uint8 view of a PyCapture2 image buffer without copying it."""
+    data = image.getData()
+    try:
+        return np.frombuffer(data, dtype=np.uint8)
+    except (TypeError, ValueError):
+        # Non-contiguous or non-buffer data, fall back to a single conversion
+        return np.ascontiguousarray(data, dtype=np.uint8).ravel()
+
+
+def deinterleave(raw, rows, cols, out=None):
+    """
+    Split interleaved RAW16 bytes into left/right planes.
+    `out` must be a C-contiguous uint8 array of shape (2, rows, cols) if given.
+    Returns (left, right), both views into `out`.
+    """
+    if out is None:
+        out = np.empty((2, rows, cols), dtype=np.uint8)
+    pairs = raw[:rows * cols * 2].reshape((rows, cols, 2))
+    # Reverse the byte order so plane 0 is left, then copy both planes at once
+    np.copyto(out, pairs[:, :, ::-1].transpose(2, 0, 1))
+    return out[LEFT], out[RIGHT]
+
+
+class StereoDeinterleaver(object):
+    """
+    Reusable deinterleaver that keeps its output buffer between frames.
+    The returned planes are overwritten by the next call, copy them if they
+    must outlive the current frame.
+    """
+
+    def __init__(self, rows=None, cols=None):
+        self.planes = None
+        if rows and cols:
+            self._allocate(rows, cols)
+
+    def _allocate(self, rows, cols):
+        self.planes = np.empty((2, rows, cols), dtype=np.uint8)
+
+    def split(self, raw, rows, cols):
+        if self.planes is None or self.planes.shape[1:] != (rows, cols):
+            self._allocate(rows, cols)
+        return deinterleave(raw, rows, cols, self.planes)
+
+    def __call__(self, image):
+        return self.split(raw_view(image), image.getRows(), image.getCols())
@@ -0,0 +1,98 @@
+"""
+Bayer demosaicing of the deinterleaved left plane with OpenCV.
+
+Replaces `image.convert(PIXEL_FORMAT.BGR)` followed by the per-channel copies
+and cv2.merge: one cv2.cvtColor pass writes straight into a reused BGR buffer.
+Quality modes:
+    bilinear  COLOR_Bayer*2BGR      fastest full-resolution mode
+    edge      COLOR_Bayer*2BGR_EA   edge-aware, fewer zipper artifacts
+    vng       COLOR_Bayer*2BGR_VNG  variable number of gradients, slowest
+    half      one BGR pixel per 2x2 Bayer cell, half width and height
+"""
+
+import numpy as np
+import cv2
+
+QUALITIES = ('bilinear', 'edge', 'vng', 'half')
+PATTERNS = ('BG', 'GB', 'RG', 'GR')
+
+_SUFFIX = {'bilinear': '', 'edge': '_EA', 'vng': '_VNG', 'half': ''}
+
+
+def _conversion_code(pattern, quality):
+    return getattr(cv2, f'COLOR_Bayer{pattern}2BGR{_SUFFIX[quality]}')
+
+
+def _cell_offsets(code):
+    """Locate the blue, red and both green cells of the 2x2 Bayer tile for `code`."""
+    probe = np.tile(np.array([[10, 20], [30, 40]], dtype=np.uint8), (4, 4))
+    bgr = cv2.cvtColor(probe, code)
+    offsets = {}
+    for dy in (0, 1):
+        for dx in (0, 1):
+            value = probe[2 + dy, 2 + dx]
+            if bgr[2 + dy, 2 + dx, 0] == value and 'b' not in offsets:
+                offsets['b'] = (dy, dx)
+            elif bgr[2 + dy, 2 + dx, 2] == value and 'r' not in offsets:
+                offsets['r'] = (dy, dx)
+            else:
+                offsets.setdefault('g', []).append((dy, dx))
+    return offsets
+
+
+class Demosaicer(object):
+    """
+    Convert a Bayer plane to BGR into a buffer that is reused between frames.
+    The returned image is overwritten by the next call, unless a `dst` array of
+    output_shape() is passed in.
+    """
+
+    def __init__(self, pattern='BG', quality='bilinear'):
+        if pattern not in PATTERNS:
+            raise ValueError(f'Unknown Bayer pattern: {pattern}')
+        if quality not in QUALITIES:
+            raise ValueError(f'Unknown demosaic quality: {quality}')
+        self.pattern = pattern
+        self.quality = quality
+        self.code = _conversion_code(pattern, quality)
+        if quality == 'half':
+            self._offsets = _cell_offsets(self.code)
+            self._green = None
+        self.out = None
+
+    def output_shape(self, rows, cols):
+        if self.quality == 'half':
+            return (rows // 2, cols // 2, 3)
+        return (rows, cols, 3)
+
+    def output_size(self, rows, cols):
+        """(width, height) of the BGR output, as expected by cv2.VideoWriter."""
+        shape = self.output_shape(rows, cols)
+        return (shape[1], shape[0])
+
+    def __call__(self, bayer, dst=None):
+        shape = self.output_shape(*bayer.shape[:2])
+        if dst is None:
+            if self.out is None or self.out.shape != shape:
+                self.out = np.empty(shape, dtype=np.uint8)
+            dst = self.out
+        if self.quality == 'half':
+            if self._green is None or self._green.shape != shape[:2]:
+                self._green = np.empty(shape[:2], dtype=np.uint8)
+            return self._half(bayer, dst)
+        return cv2.cvtColor(bayer, self.code, dst=dst)
+
+    @staticmethod
+    def _cell(bayer, offset, shape):
+        rows, cols = shape[:2]
+        dy, dx = offset
+        return bayer[dy:rows * 2:2, dx:cols * 2:2]
+
+    def _half(self, bayer, dst):
+        (g1, g2) = self._offsets['g']
+        cv2.addWeighted(self._cell(bayer, g1, dst.shape), 0.5,
+                        self._cell(bayer, g2, dst.shape), 0.5, 0, dst=self._green)
+        np.copyto(dst[:, :, 0], self._cell(bayer, self._offsets['b'], dst.shape))
+        np.copyto(dst[:, :, 1], self._green)
+        np.copyto(dst[:, :, 2], self._cell(bayer, self._offsets['r'], dst.shape))
+        return dst
@@ -0,0 +1,118 @@
+"""
+Disparity visualization with a stable range and a precomputed colormap.
+
+visualize() in Utils/stereo_engine.py min/max-normalizes every frame and
+runs applyColorMap on the result, so the colors flicker whenever the range
+changes. DisparityColorizer maps the int16 fixed-point disparity (scaled by
+16) to uint8 with one clamp and one saturating scale pass over the range of
+`mode`:
+    fixed       the matcher's [min_disparity, min_disparity + md * 16) pixels
+    percentile  running low/high percentiles of a subsample, smoothed over frames
+    frame       per-frame min/max, like visualize()
+and colors it with a 256-entry BGR table built once from the colormap
+(applyColorMap with a named colormap rebuilds that table on every call).
+With `decimate` > 1 only every n-th pixel of every n-th row is visualized.
+Without a BufferPool the outputs are reused buffers, overwritten by the next call.
+"""
+
+import numpy as np
+import cv2
+
+FIXED = 'fixed'
+PERCENTILE = 'percentile'
+FRAME = 'frame'
+MODES = (FIXED, PERCENTILE, FRAME)
+
+
+class DisparityColorizer(object):
+
+    def __init__(self, md=1, min_disparity=0, mode=FIXED, decimate=1, colormap=cv2.COLORMAP_JET,
+                 percentiles=(2, 98), smoothing=0.9, sample_step=8):
+        if mode not in MODES:
+            raise ValueError(f'Unknown normalization mode {mode}, expected one of {MODES}')
+        self.mode = mode
+        self.decimate = max(int(decimate), 1)
+        self.percentiles = percentiles
+        self.smoothing = smoothing
+        self.sample_step = sample_step
+        self.set_range(md, min_disparity)
+
+        self._table = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), colormap)
+
+        # Work and output buffers, (re)allocated only when the frame size changes
+        self._shape = None
+        self._clamped = None
+        self.disparity = None
+        self.heatmap = None
+
+    def set_range(self, md, min_disparity=0):
+        """Fixed range of a matcher with numDisparities = md * 16, in fixed-point units."""
+        self.md = md
+        self.min_disparity = min_disparity
+        self.low = min_disparity * 16
+        self.high = (min_disparity + md * 16) * 16
+        self._running = None
+
+    def output_shape(self, rows, cols):
+        return -(-rows // self.decimate), -(-cols // self.decimate)
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._clamped = np.empty(shape, dtype=np.int16)
+        self.disparity = np.empty(shape, dtype=np.uint8)
+        self.heatmap = np.empty(shape + (3,), dtype=np.uint8)
+
+    def _range(self, disp16):
+        if self.mode == FIXED:
+            return self.low, self.high
+        if self.mode == FRAME:
+            low, high, _, _ = cv2.minMaxLoc(disp16)
+            return low, high
+        sample = disp16[::self.sample_step, ::self.sample_step]
+        sample = sample[sample >= self.low]
+        if not sample.size:
+            return self._running or (self.low, self.high)
+        low, high = np.percentile(sample, self.percentiles)
+        if self._running is not None:
+            # Exponential smoothing keeps the colors steady from one frame to the next
+            a = self.smoothing
+            low = a * self._running[0] + (1 - a) * low
+            high = a * self._running[1] + (1 - a) * high
+        self._running = (low, high)
+        return low, high
+
+    def __call__(self, disp16, pool=None):
+        """
+        Return the uint8 disparity image and its colored heatmap.
+        With a BufferPool (Utils/buffer_pool.py) both outputs are acquired
+        from it and the caller owns one reference to each.
+        """
+        if self.decimate > 1:
+            disp16 = disp16[::self.decimate, ::self.decimate]
+        shape = disp16.shape[:2]
+        if shape != self._shape:
+            self._allocate(shape)
+        if pool is not None:
+            disparity = pool.acquire(shape, np.uint8)
+            heatmap = pool.acquire(shape + (3,), np.uint8)
+        else:
+            disparity, heatmap = self.disparity, self.heatmap
+
+        low, high = self._range(disp16)
+        alpha = 255.0 / max(high - low, 1)
+        # Clamp below so invalid (negative) disparities do not fold back through the absolute value
+        cv2.max(disp16, int(low), dst=self._clamped)
+        cv2.convertScaleAbs(self._clamped, disparity, alpha, -low * alpha)
+        cv2.applyColorMap(disparity, self._table, heatmap)
+        return disparity, heatmap
+
+
+def add_colormap_arguments(parser):
+    parser.add_argument('--vis_mode', type=str, required=False, choices=MODES,
+                        default=FIXED, help='Disparity visualization range: the matcher range, running percentiles or per-frame min/max')
+    parser.add_argument('--vis_decimate', type=int, required=False,
+                        default=1, help='Visualize every Nth pixel of every Nth row')
+
+
+def colorizer_from_args(args, md, min_disparity=0):
+    return DisparityColorizer(md, min_disparity, args.vis_mode, args.vis_decimate)
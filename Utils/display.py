@@ -0,0 +1,149 @@
+"""
+Live viewer decoupled from capture and processing.
+
+Display.show() is cheap enough to call for every frame: it returns at once
+unless a refresh is due, and then only downscales the images into new
+thumbnails and hands them over. A display thread tiles the thumbnails into
+one window at `refresh` Hz and services cv2.waitKey(1), so the producer never
+pays for imshow or waitKey. In headless mode nothing is drawn and keys are
+read from stdin (type the key and Enter).
+Key presses from either source are read with key() or wait_key().
+
+Note: HighGUI runs on the display thread; this works with the GTK and Qt
+backends on Linux and Windows, not with the macOS Cocoa backend.
+"""
+
+import math
+import queue
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+
+class Display(object):
+
+    def __init__(self, refresh=15, scale=0.5, columns=None, headless=False, window='PythonBee'):
+        self.refresh = refresh
+        self.scale = scale
+        self.columns = columns
+        self.headless = headless
+        self.window = window
+        self.shown = 0
+        self.skipped = 0
+        self._keys = queue.Queue()
+        self._latest = None
+        self._drawn = None
+        self._next_time = 0.0
+        self._stop_event = threading.Event()
+        target = self._read_stdin if headless else self._run
+        self._thread = threading.Thread(target=target, name='display', daemon=True)
+        self._thread.start()
+
+    def show(self, **images):
+        """Offer named images (gray or BGR) for display; returns immediately when no refresh is due."""
+        if self.headless:
+            return False
+        now = time.monotonic()
+        if now < self._next_time:
+            self.skipped += 1
+            return False
+        self._next_time = now + 1.0 / self.refresh
+        thumbnails = []
+        for name, image in images.items():
+            if self.scale != 1:
+                image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_NEAREST)
+            else:
+                image = image.copy()
+            thumbnails.append((name, image))
+        # A reference swap hands the thumbnails over, the display thread only reads them
+        self._latest = thumbnails
+        return True
+
+    def key(self):
+        """Next pressed key code, or -1 without waiting."""
+        try:
+            return self._keys.get_nowait()
+        except queue.Empty:
+            return -1
+
+    def wait_key(self, timeout):
+        """Next pressed key code, or -1 after `timeout` seconds."""
+        try:
+            return self._keys.get(timeout=timeout)
+        except queue.Empty:
+            return -1
+
+    def compose(self, thumbnails):
+        """Tile the thumbnails into one labelled BGR canvas."""
+        columns = self.columns or math.ceil(math.sqrt(len(thumbnails)))
+        rows = math.ceil(len(thumbnails) / columns)
+        height = max(image.shape[0] for _, image in thumbnails)
+        width = max(image.shape[1] for _, image in thumbnails)
+        canvas = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        for i, (name, image) in enumerate(thumbnails):
+            y, x = (i // columns) * height, (i % columns) * width
+            tile = canvas[y:y + image.shape[0], x:x + image.shape[1]]
+            if image.ndim == 2:
+                cv2.cvtColor(image, cv2.COLOR_GRAY2BGR, dst=tile)
+            else:
+                tile[:] = image
+            cv2.putText(canvas, name, (x + 8, y + 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        return canvas
+
+    def _run(self):
+        period = 1.0 / self.refresh
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            thumbnails = self._latest
+            try:
+                if thumbnails is not None and thumbnails is not self._drawn:
+                    cv2.imshow(self.window, self.compose(thumbnails))
+                    self._drawn = thumbnails
+                    self.shown += 1
+                key = cv2.waitKey(1)
+            except cv2.error:
+                print('No GUI support in this OpenCV build, continuing headless.')
+                self.headless = True
+                self._read_stdin()
+                return
+            if key != -1:
+                self._keys.put(key & 0xFF)
+            remaining = period - (time.monotonic() - start)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+        if self.shown:
+            cv2.destroyWindow(self.window)
+
+    def _read_stdin(self):
+        # Blocking reads stay on this daemon thread; EOF simply ends keyboard control
+        for line in sys.stdin:
+            for char in line.strip()[:1] or ' ':
+                self._keys.put(ord(char))
+            if self._stop_event.is_set():
+                break
+
+    def close(self):
+        self._stop_event.set()
+        if not self.headless:
+            self._thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_display_arguments(parser, refresh=15):
+    parser.add_argument('--display_fps', type=int, required=False,
+                        default=refresh, help='Display refresh rate')
+    parser.add_argument('--display_scale', type=float, required=False,
+                        default=0.5, help='Scale of the displayed thumbnails')
+    parser.add_argument('--headless', type=int, required=False,
+                        default=0, help='Do not display anything, read keys from stdin instead')
+
+
+def display_from_args(args):
+    return Display(args.display_fps, args.display_scale, headless=bool(args.headless))
@@ -0,0 +1,178 @@
+"""
+Image codecs for frame dumps.
+
+Every codec turns one image array into one file and back:
+    png   cv2 PNG at a chosen zlib level (default: OpenCV's default level)
+    npy   uncompressed .npy, shape and dtype in the header, no CPU spent
+    zlib  .npy compressed with stdlib zlib in a gzip container (level 0-9, gunzip-able)
+    lzma  .npy compressed with stdlib lzma in an xz container (preset 0-9, unxz-able)
+All of them release the GIL while compressing, so AsyncImageWriter
+(Utils/image_writer.py) can run them on its worker threads.
+Benchmarks/codec_bench.py measures throughput and ratio of each one.
+"""
+
+import io
+import lzma
+import os
+import zlib
+import cv2
+import numpy as np
+
+CODECS = ('png', 'npy', 'zlib', 'lzma')
+
+
+class FrameCodec(object):
+    """Base class: encode() an array to bytes, decode() it back; write()/read() files."""
+
+    name = None
+    extension = None
+
+    def encode(self, img):
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+    def write(self, path, img):
+        data = self.encode(img)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return True
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return self.decode(f.read())
+
+    def __repr__(self):
+        level = getattr(self, 'level', None)
+        return self.name if level is None else f'{self.name}:{level}'
+
+
+def _npy_bytes(img):
+    buffer = io.BytesIO()
+    np.save(buffer, img, allow_pickle=False)
+    return buffer.getbuffer()
+
+
+def _npy_array(data):
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+class PngCodec(FrameCodec):
+
+    name = 'png'
+    extension = '.png'
+
+    def __init__(self, level=None):
+        self.level = level
+        self.params = [cv2.IMWRITE_PNG_COMPRESSION, level] if level is not None else []
+
+    def encode(self, img):
+        ok, data = cv2.imencode(self.extension, img, self.params)
+        if not ok:
+            raise RuntimeError('PNG encoding failed')
+        return data
+
+    def decode(self, data):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+
+    def write(self, path, img):
+        # imwrite encodes straight to the file, no intermediate buffer
+        return cv2.imwrite(path, img, self.params)
+
+    def read(self, path):
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+
+class NpyCodec(FrameCodec):
+
+    name = 'npy'
+    extension = '.npy'
+
+    def encode(self, img):
+        return _npy_bytes(img)
+
+    def decode(self, data):
+        return _npy_array(data)
+
+    def write(self, path, img):
+        np.save(path, img, allow_pickle=False)
+        return True
+
+    def read(self, path):
+        return np.load(path, allow_pickle=False)
+
+
+class ZlibCodec(FrameCodec):
+
+    name = 'zlib'
+    extension = '.npy.gz'
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def encode(self, img):
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(_npy_bytes(img)) + compressor.flush()
+
+    def decode(self, data):
+        return _npy_array(zlib.decompress(data, wbits=31))
+
+
+class LzmaCodec(FrameCodec):
+
+    name = 'lzma'
+    extension = '.npy.xz'
+
+    def __init__(self, level=0):
+        self.level = level
+
+    def encode(self, img):
+        return lzma.compress(_npy_bytes(img), preset=self.level)
+
+    def decode(self, data):
+        return _npy_array(lzma.decompress(data))
+
+
+_CLASSES = {codec.name: codec for codec in (PngCodec, NpyCodec, ZlibCodec, LzmaCodec)}
+
+
+def make_codec(name='png', level=None):
+    """Codec by name; `level` is the compression level, None for the codec's default."""
+    if name not in _CLASSES:
+        raise ValueError(f'Unknown codec {name}, expected one of {CODECS}')
+    if name == 'npy':
+        return NpyCodec()
+    return _CLASSES[name]() if level is None else _CLASSES[name](level)
+
+
+def codec_for_path(path):
+    """Codec able to read `path`, chosen by its extension."""
+    for codec in sorted(_CLASSES.values(), key=lambda c: -len(c.extension)):
+        if path.endswith(codec.extension):
+            return codec()
+    raise ValueError(f'No codec for {path}')
+
+
+def read_frame(path):
+    return codec_for_path(path).read(path)
+
+
+def list_frames(directory):
+    """Sorted paths of the frames in `directory` written by any codec."""
+    extensions = tuple(codec.extension for codec in _CLASSES.values())
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(extensions))
+
+
+def add_codec_arguments(parser):
+    parser.add_argument('--codec', type=str, required=False, choices=CODECS,
+                        default='png', help='Image format of saved frames')
+    parser.add_argument('--codec_level', type=int, required=False,
+                        default=None, help='Compression level of --codec (png/zlib: 0-9, lzma: 0-9)')
+
+
+def codec_from_args(args):
+    return make_codec(args.codec, args.codec_level)
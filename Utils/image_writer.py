@@ -0,0 +1,103 @@
+"""
+Asynchronous image writer backed by a thread pool.
+
+Capture loops only enqueue arrays; encoding and disk I/O happen on worker
+threads (cv2.imwrite, zlib and lzma release the GIL), so the capture cadence no
+longer depends on disk speed. The image format is a codec from
+Utils/frame_codecs.py, PNG at OpenCV's default level unless given; build paths
+with `writer.extension` to match it. The number of in-flight writes is bounded:
+when the limit is reached, write() either waits ('block') or drops the image
+('drop').
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Utils.frame_codecs import PngCodec
+from Utils.video_sink import BLOCK, POLICIES
+
+
+class AsyncImageWriter(object):
+
+    def __init__(self, workers=2, max_pending=64, policy=BLOCK, codec=None):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown backpressure policy: {policy}')
+        self.policy = policy
+        self.codec = codec or PngCodec()
+        self.extension = self.codec.extension
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.pending = 0
+        self.peak_pending = 0
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imwrite')
+
+    def write(self, path, img, copy=True):
+        """
+        Queue `img` to be written to `path`. Returns False if it was dropped.
+        The array is copied unless `copy` is False, so reused capture buffers
+        can be passed directly.
+        """
+        if not self._slots.acquire(blocking=self.policy == BLOCK):
+            with self._lock:
+                self.dropped += 1
+            return False
+        if copy:
+            img = img.copy()
+        with self._lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        self._pool.submit(self._write, path, img)
+        return True
+
+    def _write(self, path, img):
+        ok = False
+        try:
+            ok = self.codec.write(path, img)
+        except Exception as err:
+            # Any failure counts as a failed write, flush() must never wait for it
+            print('Error writing %s : %s' % (path, err))
+        finally:
+            with self._lock:
+                self.pending -= 1
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                self._idle.notify_all()
+            self._slots.release()
+
+    def queue_depth(self):
+        with self._lock:
+            return self.pending
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'peak_pending': self.peak_pending,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+    def flush(self):
+        """Block until every queued image has been written."""
+        with self._idle:
+            while self.pending:
+                self._idle.wait()
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,108 @@
+"""
+Incremental disparity for mostly static scenes.
+
+The left frame is compared tile by tile against the frame each tile was last
+computed from (a mean absolute difference via one cv2.absdiff and one area
+resize), so slow drifts accumulate until they cross the threshold. Only the
+changed tiles, grown by one tile, are recomputed: each row of tiles becomes
+one crop padded by the matching margin (plus the disparity range on the left,
+which SGBM needs to search). Everything else reuses the cached disparity.
+A full refresh is forced every `refresh_interval` frames, or when too many
+tiles changed for partial updates to pay off.
+"""
+
+import numpy as np
+import cv2
+
+from Utils.stereo_engine import StereoEngine
+
+
+class IncrementalStereoEngine(object):
+
+    def __init__(self, md=1, tile=64, threshold=6.0, refresh_interval=30, max_dirty=0.5,
+                 margin=16, engine_factory=StereoEngine):
+        self.md = md
+        self.tile = tile
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.max_dirty = max_dirty
+        self.margin = margin
+        # Separate engines so crops of varying size don't thrash the full-frame buffers
+        self.full_engine = engine_factory(md)
+        self.tile_engine = engine_factory(md)
+
+        self._shape = None
+        self.frames = 0
+        self.full_updates = 0
+        self.recomputed_tiles = 0
+        self.total_tiles = 0
+
+    def set_max_disparity(self, md):
+        self.md = md
+        self.full_engine.set_max_disparity(md)
+        self.tile_engine.set_max_disparity(md)
+        self._shape = None  # Cached disparities no longer match the new range
+
+    def _allocate(self, shape):
+        self._shape = shape
+        rows, cols = shape
+        self.grid = (-(-rows // self.tile), -(-cols // self.tile))
+        self.reference = np.empty(shape, dtype=np.uint8)
+        self.diff = np.empty(shape, dtype=np.uint8)
+        self.filtered = np.empty(shape, dtype=np.int16)
+        self._since_refresh = None
+
+    def dirty_tiles(self, imgL):
+        """Boolean (tile rows, tile cols) map of tiles that changed since they were last computed."""
+        cv2.absdiff(imgL, self.reference, dst=self.diff)
+        rows, cols = self.grid
+        # INTER_AREA over a tile-sized cell is the tile mean
+        means = cv2.resize(self.diff, (cols, rows), interpolation=cv2.INTER_AREA)
+        dirty = means > self.threshold
+        # Grow by one tile so moving edges and the matching window are covered
+        return cv2.dilate(dirty.view(np.uint8), np.ones((3, 3), np.uint8)).astype(bool)
+
+    def _full(self, imgL, imgR):
+        np.copyto(self.filtered, self.full_engine.disparity(imgL, imgR))
+        np.copyto(self.reference, imgL)
+        self._since_refresh = 0
+        self.full_updates += 1
+        self.recomputed_tiles += self.grid[0] * self.grid[1]
+
+    def disparity(self, imgL, imgR):
+        """Return the int16 disparity (fixed-point, scaled by 16), recomputing only changed regions."""
+        shape = imgL.shape[:2]
+        if shape != self._shape:
+            self._allocate(shape)
+        self.frames += 1
+        self.total_tiles += self.grid[0] * self.grid[1]
+
+        if self._since_refresh is None or self._since_refresh + 1 >= self.refresh_interval:
+            self._full(imgL, imgR)
+            return self.filtered
+        self._since_refresh += 1
+
+        dirty = self.dirty_tiles(imgL)
+        if dirty.mean() > self.max_dirty:
+            self._full(imgL, imgR)
+            return self.filtered
+
+        rows, cols = shape
+        reach = self.md * 16 + self.margin
+        for tile_row in np.flatnonzero(dirty.any(axis=1)):
+            dirty_cols = np.flatnonzero(dirty[tile_row])
+            y0, y1 = tile_row * self.tile, min(rows, (tile_row + 1) * self.tile)
+            x0, x1 = dirty_cols[0] * self.tile, min(cols, (dirty_cols[-1] + 1) * self.tile)
+            # Crop with halo: SGBM needs the disparity range to the left of x0
+            h0, h1 = max(0, y0 - self.margin), min(rows, y1 + self.margin)
+            w0, w1 = max(0, x0 - reach), min(cols, x1 + self.margin)
+            crop = self.tile_engine.disparity(imgL[h0:h1, w0:w1], imgR[h0:h1, w0:w1])
+            self.filtered[y0:y1, x0:x1] = crop[y0 - h0:y1 - h0, x0 - w0:x1 - w0]
+            self.reference[y0:y1, x0:x1] = imgL[y0:y1, x0:x1]
+            # The whole span between the outermost dirty tiles is matched, clean tiles inside it too
+            self.recomputed_tiles += int(dirty_cols[-1] - dirty_cols[0]) + 1
+        return self.filtered
+
+    def recompute_ratio(self):
+        """Fraction of tiles recomputed so far, 1.0 meaning every frame was computed in full."""
+        return self.recomputed_tiles / self.total_tiles if self.total_tiles else 0.0
@@ -0,0 +1,201 @@
+"""
+Frame timing and drop metrics from embedded camera timestamps.
+
+FrameMetrics unwraps the 128 s cycle timer (Utils/timestamps.py) of every
+retrieved image and tracks the inter-frame interval, its jitter and the
+frames lost on the bus (gaps in the camera timestamps). Host-side drops
+(frame ring, encoders, ...) are registered as extra counters. An exporter
+publishes everything in the Prometheus text format, either as a textfile for
+node_exporter's textfile collector or on a local HTTP endpoint.
+"""
+
+import math
+import os
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import numpy as np
+
+from Utils.timestamps import CycleClock, enable_embedded_timestamp
+
+
+class FrameMetrics(object):
+
+    def __init__(self, camera='0', expected_fps=None, window=300):
+        self.camera = str(camera)
+        self.period = 1.0 / expected_fps if expected_fps else None
+        self.clock = CycleClock()
+        self.frames = 0
+        self.errors = 0
+        self.bus_dropped = 0
+        self.last_time = None
+        self.intervals = deque(maxlen=window)
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_counter(self, name, read, help_text=''):
+        """Export `read()` as pythonbee_<name>, e.g. host-side drop counters."""
+        self.counters[name] = (read, help_text)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def update(self, timestamp):
+        """Feed the PyCapture2 timestamp of every retrieved image, in capture order."""
+        t = self.clock.update(timestamp)
+        with self._lock:
+            self.frames += 1
+            if self.last_time is not None:
+                interval = t - self.last_time
+                self.intervals.append(interval)
+                period = self.period or self._median_interval()
+                if period and interval > 1.5 * period:
+                    self.bus_dropped += int(round(interval / period)) - 1
+            self.last_time = t
+        return t
+
+    def _median_interval(self):
+        if len(self.intervals) < 10:
+            return None
+        return float(np.median(self.intervals))
+
+    def summary(self):
+        with self._lock:
+            intervals = np.array(self.intervals) if self.intervals else np.zeros(0)
+            return {
+                'frames': self.frames,
+                'errors': self.errors,
+                'bus_dropped': self.bus_dropped,
+                'interval_mean': float(intervals.mean()) if intervals.size else math.nan,
+                'interval_max': float(intervals.max()) if intervals.size else math.nan,
+                'jitter': float(intervals.std()) if intervals.size > 1 else math.nan,
+                'fps': float(1.0 / intervals.mean()) if intervals.size and intervals.mean() > 0 else math.nan,
+            }
+
+    def samples(self):
+        """(name, type, help, value) of every metric, labelled with this camera."""
+        summary = self.summary()
+        samples = [
+            ('frames_total', 'counter', 'Frames retrieved from the camera', summary['frames']),
+            ('retrieve_errors_total', 'counter', 'Failed retrieveBuffer calls', summary['errors']),
+            ('bus_dropped_frames_total', 'counter', 'Frames missing from the camera timestamp sequence',
+             summary['bus_dropped']),
+            ('frame_interval_seconds', 'gauge', 'Mean inter-frame interval from camera timestamps',
+             summary['interval_mean']),
+            ('frame_interval_max_seconds', 'gauge', 'Longest recent inter-frame interval',
+             summary['interval_max']),
+            ('frame_jitter_seconds', 'gauge', 'Standard deviation of the recent inter-frame intervals',
+             summary['jitter']),
+            ('frame_rate', 'gauge', 'Frame rate measured from camera timestamps', summary['fps']),
+        ]
+        for name, (read, help_text) in self.counters.items():
+            samples.append((name, 'counter', help_text or name, read()))
+        return samples
+
+
+def render(sources):
+    """Prometheus text exposition of several FrameMetrics, one HELP/TYPE per metric."""
+    families = {}
+    for source in sources:
+        for name, kind, help_text, value in source.samples():
+            family = families.setdefault(name, (kind, help_text, []))
+            family[2].append(f'pythonbee_{name}{{camera="{source.camera}"}} {value}')
+    lines = []
+    for name, (kind, help_text, values) in families.items():
+        lines.append(f'# HELP pythonbee_{name} {help_text}')
+        lines.append(f'# TYPE pythonbee_{name} {kind}')
+        lines.extend(values)
+    return '\n'.join(lines) + '\n'
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer only exists from Python 3.7 on
+    daemon_threads = True
+
+
+class MetricsExporter(object):
+    """
+    Serve the metrics of one or more FrameMetrics: rewrite `textfile` every
+    `interval` seconds (atomically), and/or answer GET /metrics on `port`.
+    """
+
+    def __init__(self, sources, textfile=None, port=None, interval=5.0, host='127.0.0.1'):
+        self.sources = sources if isinstance(sources, (list, tuple)) else [sources]
+        self.textfile = textfile
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._server = None
+
+        if textfile:
+            thread = threading.Thread(target=self._write_loop, name='metrics-textfile', daemon=True)
+            self._threads.append(thread)
+        if port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip('/') not in ('', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = exporter.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = _ThreadingHTTPServer((host, port), Handler)
+            thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+            self._threads.append(thread)
+        for thread in self._threads:
+            thread.start()
+
+    def render(self):
+        return render(self.sources)
+
+    def write(self):
+        tmp = f'{self.textfile}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, self.textfile)
+
+    def _write_loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop_event.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.textfile:
+            self.write()
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics_file', type=str, required=False,
+                        default=None, help='Write Prometheus metrics to this textfile')
+    parser.add_argument('--metrics_port', type=int, required=False,
+                        default=None, help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics')
+
+
+def start_metrics(cam, args, camera='0'):
+    """
+    Enable embedded timestamps and start the exporters requested on the command line.
+    Returns (metrics, exporter); the exporter is None when no output was requested.
+    """
+    from Utils.backend import PyCapture2
+    if not enable_embedded_timestamp(cam, True):
+        print('Embedded timestamps are not available, frame metrics will be meaningless.')
+    fps = cam.getProperty(PyCapture2.PROPERTY_TYPE.FRAME_RATE).absValue
+    metrics = FrameMetrics(camera, expected_fps=fps or None)
+    exporter = None
+    if args.metrics_file or args.metrics_port:
+        exporter = MetricsExporter(metrics, args.metrics_file, args.metrics_port)
+    return metrics, exporter
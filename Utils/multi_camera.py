@@ -0,0 +1,170 @@
+"""
+Several Bumblebee2 heads on one host.
+
+CameraManager connects every camera on the bus with the same Format7
+MODE_3 / RAW16 setup and runs one Utils.acquisition.Acquisition per camera,
+so each camera has its own SDK callback (or polling) thread and frame queue.
+next_set() pulls from the per-camera queues and matches frames whose embedded
+cycle timestamps lie within `tolerance`; frames with no partner are released.
+Only the consumer touches the matching state, the capture paths share nothing.
+"""
+
+import time
+import numpy as np
+
+from Utils.backend import PyCapture2
+from Utils.acquisition import Acquisition, CALLBACK
+from Utils.camera_setup import configure_camera, DEFAULT_CACHE_DIR
+from Utils.metrics import FrameMetrics
+from Utils.timestamps import CYCLE_WRAP, cycle_time, enable_embedded_timestamp
+
+
+def time_difference(a, b):
+    """a - b in seconds for two cycle times, across the 128 s wrap."""
+    return (a - b + CYCLE_WRAP / 2) % CYCLE_WRAP - CYCLE_WRAP / 2
+
+
+class FrameSet(object):
+    """Frames of all cameras for one instant, in camera order."""
+
+    def __init__(self, index, frames, skew):
+        self.index = index
+        self.frames = frames
+        self.skew = skew
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, i):
+        return self.frames[i]
+
+
+class CameraManager(object):
+    """
+    Connect all cameras (or the first `count`) and deliver aligned FrameSets.
+    `tolerance` defaults to half a frame period. `roi`, `packet_size` and
+    `tune` apply to every camera, see Utils/camera_setup.py.
+    """
+
+    def __init__(self, count=None, mode=CALLBACK, depth=4, tolerance=None, roi=None, packet_size=None,
+                 tune=False, cache_dir=DEFAULT_CACHE_DIR):
+        self.mode = mode
+        self.depth = depth
+        self.bus = PyCapture2.BusManager()
+        num_cams = self.bus.getNumOfCameras()
+        if not num_cams:
+            raise RuntimeError('No camera detected')
+        count = min(count or num_cams, num_cams)
+
+        self.cameras = []
+        self.serials = []
+        self.setups = []
+        for i in range(count):
+            cam = PyCapture2.Camera()
+            cam.connect(self.bus.getCameraFromIndex(i))
+            serial = self.bus.getCameraSerialNumberFromIndex(i)
+            self.setups.append(configure_camera(cam, serial, roi, packet_size, tune, cache_dir))
+            if not enable_embedded_timestamp(cam, True):
+                raise RuntimeError(f'Camera {i} cannot embed timestamps, frames cannot be aligned')
+            self.cameras.append(cam)
+            self.serials.append(serial)
+
+        fps = min(cam.getProperty(PyCapture2.PROPERTY_TYPE.FRAME_RATE).absValue for cam in self.cameras)
+        self.tolerance = tolerance if tolerance is not None else 0.5 / fps
+        self.metrics = [FrameMetrics(serial, expected_fps=fps) for serial in self.serials]
+        self.acquisitions = [Acquisition(cam, mode, depth, metrics)
+                             for cam, metrics in zip(self.cameras, self.metrics)]
+        self._heads = [None] * count
+        self.sets = 0
+        self.unmatched = [0] * count
+        self.skews = []
+        self._start = None
+
+    def start(self):
+        for acquisition in self.acquisitions:
+            acquisition.start()
+        self._start = time.monotonic()
+        return self
+
+    def stop(self):
+        for acquisition in self.acquisitions:
+            acquisition.stop()
+        for i, frame in enumerate(self._heads):
+            if frame is not None:
+                self.acquisitions[i].release(frame)
+        self._heads = [None] * len(self.cameras)
+
+    def disconnect(self):
+        for cam in self.cameras:
+            cam.disconnect()
+
+    def _fill(self, deadline):
+        """Make sure every camera has a head frame; False on timeout."""
+        for i, acquisition in enumerate(self.acquisitions):
+            while self._heads[i] is None:
+                remaining = max(0.0, deadline - time.monotonic())
+                self._heads[i] = acquisition.get(timeout=remaining)
+                if self._heads[i] is None and remaining <= 0:
+                    return False
+        return True
+
+    def next_set(self, timeout=1.0):
+        """
+        Next FrameSet of frames within `tolerance` of each other, or None on timeout.
+        Release it with release() once done.
+        """
+        deadline = time.monotonic() + timeout
+        while self._fill(deadline):
+            times = [cycle_time(frame.timestamp) for frame in self._heads]
+            newest = max(range(len(times)), key=lambda i: time_difference(times[i], times[0]))
+            stale = [i for i, t in enumerate(times) if time_difference(times[newest], t) > self.tolerance]
+            if not stale:
+                offsets = [time_difference(t, times[newest]) for t in times]
+                skew = max(offsets) - min(offsets)
+                frame_set = FrameSet(self.sets, self._heads, skew)
+                self._heads = [None] * len(self.cameras)
+                self.sets += 1
+                self.skews.append(skew)
+                return frame_set
+            # Older frames have no partner from the newest camera, drop them
+            for i in stale:
+                self.acquisitions[i].release(self._heads[i])
+                self._heads[i] = None
+                self.unmatched[i] += 1
+        return None
+
+    def release(self, frame_set):
+        for acquisition, frame in zip(self.acquisitions, frame_set.frames):
+            acquisition.release(frame)
+
+    def report(self):
+        """Per-camera throughput and drops, and the sync skew of the emitted sets."""
+        elapsed = time.monotonic() - self._start if self._start else float('nan')
+        cameras = []
+        for i, acquisition in enumerate(self.acquisitions):
+            summary = self.metrics[i].summary()
+            cameras.append({
+                'serial': self.serials[i],
+                'frames': acquisition.delivered,
+                'fps': acquisition.delivered / elapsed,
+                'bus_dropped': summary['bus_dropped'],
+                'host_dropped': acquisition.dropped,
+                'unmatched': self.unmatched[i],
+            })
+        skews = np.array(self.skews) * 1000.0 if self.skews else np.full(1, np.nan)
+        return {
+            'sets': self.sets,
+            'set_fps': self.sets / elapsed,
+            'skew_mean_ms': float(skews.mean()),
+            'skew_max_ms': float(skews.max()),
+            'cameras': cameras,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,222 @@
+"""
+Stripe-parallel disparity computation.
+
+The stereo pair is split into horizontal stripes. Each stripe is matched and
+WLS-filtered with extra rows above and below (the overlap margin), and only
+its core rows are copied into the output, so the stitched map has no seams.
+SGBM aggregates costs along vertical paths and the WLS filter smooths across
+rows, so the margin is sized from blockSize plus a path length in rows.
+
+Two backends are available:
+    thread   a thread pool with one StereoEngine per stripe (OpenCV releases the GIL)
+    process  a process pool with one StereoEngine per stripe height in every worker
+             process; inputs and output live in multiprocessing.shared_memory so frames
+             are never pickled (Python 3.8+), and frames written straight into a block
+             of input_buffers() are not even copied. Workers are started with forkserver
+             (spawn where it is not available): the pool is created lazily, when capture,
+             encoder and display threads already run, and forking a threaded process can
+             deadlock the child.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
+import numpy as np
+import cv2
+
+from Utils.stereo_engine import StereoEngine
+
+BACKENDS = ('thread', 'process')
+
+# Shared left/right blocks of this process: data address -> (shared memory name, (rows, cols))
+_shared_planes = {}
+
+
+def stripe_bounds(rows, stripes, margin):
+    """Yield (core_start, core_end, halo_start, halo_end) row ranges for every stripe."""
+    edges = np.linspace(0, rows, stripes + 1).astype(int)
+    for y0, y1 in zip(edges[:-1], edges[1:]):
+        yield y0, y1, max(0, y0 - margin), min(rows, y1 + margin)
+
+
+def _shared_array(shape, dtype, owner):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    owner.append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+# Process backend worker state ------------
+_worker_kwargs = None
+_worker_frame = None
+_worker_engines = {}
+_worker_shm = {}
+
+
+def _init_worker(engine_kwargs):
+    global _worker_kwargs
+    cv2.setNumThreads(1)  # Parallelism comes from the pool, avoid oversubscription
+    _worker_kwargs = engine_kwargs
+
+
+def _set_frame_shape(shape):
+    """Drop the engines and the mappings of the previous frame size."""
+    global _worker_frame
+    if shape == _worker_frame:
+        return
+    mapped = [shm for shm, _ in _worker_shm.values()]
+    _worker_shm.clear()
+    for shm in mapped:
+        shm.close()
+    _worker_engines.clear()
+    _worker_frame = shape
+
+
+def _engine_for(shape):
+    # The edge stripes are shorter than the middle ones, so every stripe height
+    # keeps its own engine and no engine reallocates its buffers between tasks
+    if shape not in _worker_engines:
+        _worker_engines[shape] = StereoEngine(**_worker_kwargs)
+    return _worker_engines[shape]
+
+
+def _attach(name, shape, dtype):
+    if name not in _worker_shm:
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_shm[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    return _worker_shm[name][1]
+
+
+def _process_stripe(planes_name, out_name, shape, md, bounds):
+    y0, y1, h0, h1 = bounds
+    _set_frame_shape(shape)
+    left, right = _attach(planes_name, (2,) + shape, np.uint8)
+    out = _attach(out_name, shape, np.int16)
+    engine = _engine_for((h1 - h0, shape[1]))
+    engine.set_max_disparity(md)
+    disparity = engine.disparity(left[h0:h1], right[h0:h1])
+    out[y0:y1] = disparity[y0 - h0:y1 - h0]
+
+
+class ParallelStereoEngine(object):
+
+    def __init__(self, md=1, stripes=4, workers=None, backend='thread', path_length=32, timeout=30.0,
+                 **engine_kwargs):
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown parallel backend: {backend}')
+        if stripes < 1:
+            raise ValueError('At least one stripe is required')
+        self.md = md
+        self.stripes = stripes
+        self.workers = workers or min(stripes, os.cpu_count() or 1)
+        self.backend = backend
+        self.timeout = timeout  # Seconds to wait for one frame's stripes
+        self.engine_kwargs = dict(engine_kwargs, md=md)
+        self.margin = engine_kwargs.get('block_size', 3) // 2 + path_length
+
+        self._shape = None
+        self._shm = []     # Own input block and output, reallocated with the frame size
+        self._inputs = []  # Blocks handed out by input_buffers(), kept until close()
+        self._stalled = False
+        if backend == 'thread':
+            self.engines = [StereoEngine(**self.engine_kwargs) for _ in range(stripes)]
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stripe')
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(self.engine_kwargs,))
+
+    def set_max_disparity(self, md):
+        self.md = md
+        if self.backend == 'thread':
+            for engine in self.engines:
+                engine.set_max_disparity(md)
+
+    def _allocate(self, shape):
+        self._release_shared(self._shm)
+        self._shape = shape
+        if self.backend == 'thread':
+            self.filtered = np.empty(shape, dtype=np.int16)
+            return
+        self.planes = self._shared_planes(shape, self._shm)
+        self.left, self.right = self.planes
+        self.filtered = _shared_array(shape, np.int16, self._shm)
+
+    def _shared_planes(self, shape, owner):
+        planes = _shared_array((2,) + shape, np.uint8, owner)
+        _shared_planes[planes.ctypes.data] = (owner[-1].name, shape)
+        return planes
+
+    def input_buffers(self, rows, cols):
+        """
+        A new (2, rows, cols) uint8 left/right block, freed by close(). With the
+        process backend it lives in shared memory: frames deinterleaved or rectified
+        straight into it (Utils/pipeline.py, Utils/calibration.py) reach the stripe
+        workers without a copy, whichever ParallelStereoEngine of this process matches them.
+        """
+        if self.backend == 'thread':
+            return np.empty((2, rows, cols), dtype=np.uint8)
+        return self._shared_planes((rows, cols), self._inputs)
+
+    def _input_name(self, imgL, imgR, shape):
+        """Shared memory holding imgL and imgR as one left/right block, None if they are not."""
+        name, block_shape = _shared_planes.get(imgL.ctypes.data, (None, None))
+        if (block_shape != shape or not imgL.flags.c_contiguous or not imgR.flags.c_contiguous
+                or imgR.ctypes.data != imgL.ctypes.data + imgL.nbytes):
+            return None
+        return name
+
+    def disparity(self, imgL, imgR):
+        """Return the stitched WLS-filtered int16 disparity (fixed-point, scaled by 16)."""
+        shape = imgL.shape[:2]
+        if shape != self._shape:
+            self._allocate(shape)
+        bounds = list(stripe_bounds(shape[0], self.stripes, self.margin))
+
+        if self.backend == 'thread':
+            def run(engine, y0, y1, h0, h1):
+                disparity = engine.disparity(imgL[h0:h1], imgR[h0:h1])
+                self.filtered[y0:y1] = disparity[y0 - h0:y1 - h0]
+            futures = [self._pool.submit(run, engine, *b) for engine, b in zip(self.engines, bounds)]
+        else:
+            planes_name = self._input_name(imgL, imgR, shape)
+            if planes_name is None:
+                np.copyto(self.left, imgL)
+                np.copyto(self.right, imgR)
+                planes_name = self._shm[0].name
+            out_name = self._shm[1].name
+            futures = [self._pool.submit(_process_stripe, planes_name, out_name, shape, self.md, b)
+                       for b in bounds]
+        try:
+            for future in futures:
+                future.result(timeout=self.timeout)
+        except TimeoutError:
+            self._stalled = True
+            raise RuntimeError(f'Stripe workers did not answer within {self.timeout} s')
+        return self.filtered
+
+    def _release_shared(self, owner):
+        names = set(shm.name for shm in owner)
+        for address, (name, _) in list(_shared_planes.items()):
+            if name in names:
+                del _shared_planes[address]
+        for shm in owner:
+            shm.close()
+            shm.unlink()
+        del owner[:]
+
+    def close(self):
+        try:
+            # Stalled workers would block a waiting shutdown forever
+            self._pool.shutdown(wait=not self._stalled)
+        finally:
+            self._release_shared(self._shm)
+            self._release_shared(self._inputs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,260 @@
+"""
+Producer/consumer capture pipeline.
+
+A capture thread fills preallocated slots of a FrameRing, processing workers
+consume them, and the display reads whichever result is newest on its own
+cadence. When consumers fall behind, the ring's drop policy decides what
+happens to new frames:
+    drop-oldest  the oldest unprocessed frame is overwritten (latest frame wins)
+    drop-newest  the incoming frame is discarded
+    block        the capture thread waits for a free slot
+"""
+
+import threading
+import time
+from collections import deque
+import numpy as np
+
+from Utils.backend import PyCapture2
+from Utils.deinterleave import raw_view, deinterleave
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+RING_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class FrameSlot(object):
+    """One preallocated frame: both stereo planes and metadata."""
+
+    def __init__(self, rows, cols, planes=None):
+        self.planes = np.empty((2, rows, cols), dtype=np.uint8) if planes is None else planes
+        self.left = self.planes[0]
+        self.right = self.planes[1]
+        self.index = -1
+        self.sequence = -1
+        self.host_time = 0.0
+        self.timestamp = None
+
+
+class FrameRing(object):
+    """
+    `allocate(rows, cols)`, when given, provides the (2, rows, cols) uint8 planes
+    of every slot, e.g. ParallelStereoEngine.input_buffers for shared memory.
+    """
+
+    def __init__(self, size, rows, cols, policy=DROP_OLDEST, allocate=None):
+        if policy not in RING_POLICIES:
+            raise ValueError(f'Unknown ring policy: {policy}')
+        if size < 2:
+            raise ValueError('A frame ring needs at least two slots')
+        self.policy = policy
+        self.slots = [FrameSlot(rows, cols, allocate(rows, cols) if allocate else None) for _ in range(size)]
+        self._free = deque(self.slots)
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self.committed = 0
+        self.taken = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.closed = False
+
+    def acquire(self, timeout=None):
+        """
+        Take a slot for the producer to fill. Returns None if the frame has to
+        be dropped (drop-newest policy) or, when blocking, on timeout.
+        """
+        with self._cond:
+            if self._free:
+                return self._free.popleft()
+            if self.policy == DROP_OLDEST and self._ready:
+                self.dropped += 1
+                return self._ready.popleft()
+            if self.policy == BLOCK:
+                self._cond.wait_for(lambda: self._free or self.closed, timeout)
+                return self._free.popleft() if self._free else None
+            self.dropped += 1
+            return None
+
+    def commit(self, slot):
+        """Publish a filled slot to the consumers."""
+        with self._cond:
+            self._ready.append(slot)
+            self.committed += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None, latest=False):
+        """
+        Take the oldest ready slot, or the newest one if `latest` is set, in
+        which case the older ready slots are recycled. Returns None on timeout.
+        Taken slots are numbered in `sequence` without gaps, in frame order.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._ready or self.closed, timeout):
+                return None
+            if not self._ready:
+                return None
+            if latest:
+                while len(self._ready) > 1:
+                    self._free.append(self._ready.popleft())
+                    self.skipped += 1
+                self._cond.notify_all()
+            slot = self._ready.popleft()
+            slot.sequence = self.taken
+            self.taken += 1
+            return slot
+
+    def release(self, slot):
+        """Return a consumed slot to the producer."""
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CaptureThread(threading.Thread):
+    """
+    Retrieve camera buffers and deinterleave them straight into ring slots.
+    Color is left to the consumers (Utils/demosaic.py) to keep this thread lean.
+    Frame timing is fed to `metrics` (Utils/metrics.py) when given.
+    """
+
+    def __init__(self, cam, ring, metrics=None):
+        super().__init__(name='capture', daemon=True)
+        self.cam = cam
+        self.ring = ring
+        self.metrics = metrics
+        self.captured = 0
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                image = self.cam.retrieveBuffer()
+            except PyCapture2.Fc2error as fc2Err:
+                print('Error retrieving buffer : %s' % fc2Err)
+                self.errors += 1
+                if self.metrics:
+                    self.metrics.error()
+                continue
+            if self.metrics:
+                self.metrics.update(image.getTimeStamp())
+
+            slot = self.ring.acquire(timeout=0.1)
+            while slot is None and self.ring.policy == BLOCK and not self._stop_event.is_set():
+                slot = self.ring.acquire(timeout=0.1)
+            if slot is None:
+                continue
+            rows, cols = image.getRows(), image.getCols()
+            deinterleave(raw_view(image), rows, cols, slot.planes)
+            slot.index = self.captured
+            slot.host_time = time.monotonic()
+            slot.timestamp = image.getTimeStamp()
+            self.captured += 1
+            self.ring.commit(slot)
+
+    def stop(self):
+        self._stop_event.set()
+        self.ring.close()
+        self.join(timeout=1.0)
+
+
+class LatestResult(object):
+    """
+    Holds the newest processed result, keyed by frame index.
+    With a BufferPool, results are tuples of pooled arrays: publish() takes over
+    the caller's reference, get() adds one that the reader gives back with
+    release(), and replaced or stale results are released automatically.
+    """
+
+    def __init__(self, pool=None):
+        self._lock = threading.Lock()
+        self.pool = pool
+        self.index = -1
+        self.value = None
+
+    def publish(self, index, value):
+        with self._lock:
+            if index > self.index:
+                self.index, self.value, value = index, value, self.value
+        if self.pool is not None and value is not None:
+            self.pool.release(*value)
+
+    def get(self):
+        with self._lock:
+            if self.pool is not None and self.value is not None:
+                self.pool.retain(*self.value)
+            return self.index, self.value
+
+    def release(self, value):
+        if self.pool is not None and value is not None:
+            self.pool.release(*value)
+
+
+class ReorderBuffer(object):
+    """
+    Hand results to `emit` in the order their slots left the ring
+    (FrameSlot.sequence), whichever worker finishes first. A None result
+    keeps its place in the order but is not emitted.
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._next = 0
+
+    def put(self, sequence, value):
+        with self._lock:
+            self._pending[sequence] = value
+            while self._next in self._pending:
+                value = self._pending.pop(self._next)
+                self._next += 1
+                if value is not None:
+                    self.emit(value)
+
+
+class ProcessingWorker(threading.Thread):
+    """
+    Consume ring slots with `process(slot)` and publish its return value.
+    The slot is recycled as soon as `process` returns, so anything kept in the
+    result must not be a view into the slot.
+    """
+
+    def __init__(self, ring, process, results, latest=True, name='processing'):
+        super().__init__(name=name, daemon=True)
+        self.ring = ring
+        self.process = process
+        self.results = results
+        self.latest = latest
+        self.processed = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            slot = self.ring.get(timeout=0.1, latest=self.latest)
+            if slot is None:
+                if self.ring.closed:
+                    break
+                continue
+            index = slot.index
+            try:
+                value = self.process(slot)
+            finally:
+                self.ring.release(slot)
+            self.results.publish(index, value)
+            self.processed += 1
+
+    def stop(self, timeout=5.0):
+        """Ask the worker to finish; False if it is still busy after `timeout` seconds."""
+        self._stop_event.set()
+        self.join(timeout)
+        if self.is_alive():
+            print(f'{self.name} did not stop within {timeout} s')
+            return False
+        return True
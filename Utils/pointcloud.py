@@ -0,0 +1,164 @@
+"""
+Point-cloud output stage.
+
+Reprojects the int16 fixed-point disparity to 3D with the rectification Q
+matrix (see Utils/calibration.py) using preallocated float32 buffers, masks
+invalid pixels in one vectorized pass and packs the valid points into a
+reused structured array. Clouds can be voxel-downsampled and streamed to
+disk as binary PLY (one file per frame) or as a compact raw stream (one file
+per session, read back with read_raw_clouds).
+"""
+
+import os
+import struct
+import numpy as np
+import cv2
+
+POINT_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+COLOR_POINT_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                              ('blue', 'u1'), ('green', 'u1'), ('red', 'u1')])
+
+FORMATS = ('ply', 'raw')
+
+RAW_MAGIC = b'PBPC'
+RAW_VERSION = 1
+# magic, version, frame index, point count, has color
+RAW_HEADER = struct.Struct('<4sIqIB3x')
+
+
+class PointCloudProjector(object):
+    """
+    Turn disparity maps into point clouds. The returned structured array is a
+    view into a buffer reused by the next call; copy it to keep it longer.
+    """
+
+    def __init__(self, Q, max_depth=None):
+        self.Q = np.asarray(Q, dtype=np.float64)
+        self.max_depth = max_depth
+        self._shape = None
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self.disparity = np.empty(shape, dtype=np.float32)
+        self.xyz = np.empty(shape + (3,), dtype=np.float32)
+        self.mask = np.empty(shape, dtype=bool)
+        self._points = np.empty(shape[0] * shape[1], dtype=POINT_DTYPE)
+        self._color_points = None
+
+    def __call__(self, disparity, color=None):
+        """Project an int16 disparity (scaled by 16); `color` is an optional aligned BGR image."""
+        shape = disparity.shape[:2]
+        if shape != self._shape:
+            self._allocate(shape)
+
+        np.multiply(disparity, np.float32(1.0 / 16), out=self.disparity)
+        cv2.reprojectImageTo3D(self.disparity, self.Q, self.xyz)
+        z = self.xyz[:, :, 2]
+        np.greater(self.disparity, 0, out=self.mask)
+        self.mask &= np.isfinite(z)
+        if self.max_depth is not None:
+            self.mask &= np.abs(z) < self.max_depth
+
+        mask = self.mask.ravel()
+        count = int(np.count_nonzero(mask))
+        if color is not None:
+            if self._color_points is None:
+                self._color_points = np.empty(shape[0] * shape[1], dtype=COLOR_POINT_DTYPE)
+            points = self._color_points[:count]
+            flat = color.reshape(-1, 3)
+            for i, name in enumerate(('blue', 'green', 'red')):
+                np.compress(mask, flat[:, i], out=points[name])
+        else:
+            points = self._points[:count]
+        flat = self.xyz.reshape(-1, 3)
+        for i, name in enumerate(('x', 'y', 'z')):
+            np.compress(mask, flat[:, i], out=points[name])
+        return points
+
+
+def voxel_downsample(points, voxel_size):
+    """Average the points falling into each voxel of edge `voxel_size`."""
+    if voxel_size <= 0 or points.size == 0:
+        return points
+    # Pack the three voxel coordinates into one int64 key, a 1-D unique is much faster
+    key = np.zeros(points.size, dtype=np.int64)
+    for name in ('x', 'y', 'z'):
+        cell = np.floor(points[name] / voxel_size).astype(np.int64)
+        cell -= cell.min()
+        key *= int(cell.max()) + 1
+        key += cell
+    _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+    out = np.empty(counts.size, dtype=points.dtype)
+    for name in points.dtype.names:
+        sums = np.bincount(inverse, weights=points[name], minlength=counts.size)
+        out[name] = sums / counts if name in ('x', 'y', 'z') else np.round(sums / counts)
+    return out
+
+
+def ply_header(points):
+    lines = ['ply', 'format binary_little_endian 1.0', f'element vertex {points.size}',
+             'property float x', 'property float y', 'property float z']
+    if 'red' in points.dtype.names:
+        lines += ['property uchar blue', 'property uchar green', 'property uchar red']
+    return ('\n'.join(lines + ['end_header']) + '\n').encode('ascii')
+
+
+def write_ply(path, points):
+    with open(path, 'wb') as f:
+        f.write(ply_header(points))
+        points.tofile(f)
+
+
+class PointCloudWriter(object):
+    """
+    Stream clouds to disk: 'ply' writes <save_path>/cloud_<index>.ply per frame,
+    'raw' appends every frame to <save_path>/clouds.pbpc.
+    """
+
+    def __init__(self, save_path, fmt='ply', voxel_size=0):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown point cloud format: {fmt}')
+        if not os.path.exists(save_path):
+            os.makedirs(save_path)
+        self.save_path = save_path
+        self.fmt = fmt
+        self.voxel_size = voxel_size
+        self.frames = 0
+        self.points = 0
+        self._stream = open(os.path.join(save_path, 'clouds.pbpc'), 'ab') if fmt == 'raw' else None
+
+    def write(self, index, points):
+        if self.voxel_size:
+            points = voxel_downsample(points, self.voxel_size)
+        if self.fmt == 'ply':
+            write_ply(os.path.join(self.save_path, f'cloud_{index:08d}.ply'), points)
+        else:
+            has_color = 'red' in points.dtype.names
+            self._stream.write(RAW_HEADER.pack(RAW_MAGIC, RAW_VERSION, index, points.size, has_color))
+            points.tofile(self._stream)
+        self.frames += 1
+        self.points += points.size
+
+    def close(self):
+        if self._stream:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_raw_clouds(path):
+    """Yield (frame index, structured points) from a raw cloud stream, memory-mapped."""
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    offset = 0
+    while offset + RAW_HEADER.size <= data.size:
+        magic, version, index, count, has_color = RAW_HEADER.unpack_from(data, offset)
+        if magic != RAW_MAGIC or version != RAW_VERSION:
+            raise ValueError(f'Corrupt point cloud stream at byte {offset}')
+        offset += RAW_HEADER.size
+        dtype = COLOR_POINT_DTYPE if has_color else POINT_DTYPE
+        yield index, np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += count * dtype.itemsize
@@ -0,0 +1,140 @@
+"""
+Coarse-to-fine pyramid disparity.
+
+The full disparity range is searched only at the coarsest pyramid level, where
+SGBM is cheap. Each finer level then refines the upsampled estimate over a
+narrow window: the right image is warped by the current estimate so that the
+remaining per-pixel residual is small, and an SGBM pass with a small
+numDisparities centred on zero finds it. The residual is added back to the
+estimate. Cost at full resolution no longer grows with --maxd.
+"""
+
+import numpy as np
+import cv2
+
+
+def _sgbm(min_disparity, num_disparities, block_size, window_size):
+    return cv2.StereoSGBM_create(
+        minDisparity = min_disparity,
+        numDisparities = num_disparities,
+        blockSize = block_size,
+        P1 = 8 * 3 * window_size**2,
+        P2 = 32 * 3 * window_size**2,
+        disp12MaxDiff = 12,
+        uniquenessRatio = 10,
+        speckleWindowSize = 64,
+        speckleRange = 2,
+        preFilterCap = 63,
+        mode = cv2.STEREO_SGBM_MODE_SGBM_3WAY
+    )
+
+
+def _round16(value):
+    return max(16, int(np.ceil(value / 16.0)) * 16)
+
+
+class PyramidStereoEngine(object):
+    """
+    `levels` is the number of times the pair is halved before the full-range
+    search; `refine_width` is the residual search width in pixels at every finer
+    level (rounded up to a multiple of 16, as SGBM requires).
+    """
+
+    def __init__(self, md=1, levels=2, refine_width=16, window_size=3, block_size=3,
+                 lmbda=8000, sigma=3, wls=True):
+        self.levels = levels
+        self.block_size = block_size
+        self.window_size = window_size
+        self.refine_width = _round16(refine_width)
+        self.md = md
+        self.coarse_matcher = _sgbm(0, self._coarse_range(md), block_size, window_size)
+        self.refine_matcher = _sgbm(-(self.refine_width // 2), self.refine_width, block_size, window_size)
+
+        self.wls_filter = None
+        if wls:
+            # No right matcher here, so the filter runs without a confidence map
+            self.wls_filter = cv2.ximgproc.createDisparityWLSFilterGeneric(False)
+            self.wls_filter.setLambda(lmbda)
+            self.wls_filter.setSigmaColor(sigma)
+            self.wls_filter.setDepthDiscontinuityRadius(int(np.ceil(0.5 * block_size)))
+
+        self._shape = None
+
+    def _coarse_range(self, md):
+        return _round16(md * 16 / 2 ** self.levels)
+
+    def set_max_disparity(self, md):
+        """Set the maximum disparity coefficient; only the coarse search depends on it."""
+        if md == self.md:
+            return
+        self.md = md
+        self.coarse_matcher.setNumDisparities(self._coarse_range(md))
+
+    def set_refine_width(self, width):
+        self.refine_width = _round16(width)
+        self.refine_matcher.setMinDisparity(-(self.refine_width // 2))
+        self.refine_matcher.setNumDisparities(self.refine_width)
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._grids = []
+        self._buffers = []
+        for level in range(self.levels + 1):
+            rows, cols = self._level_shape(shape, level)
+            grid_x = np.tile(np.arange(cols, dtype=np.float32), (rows, 1))
+            grid_y = np.repeat(np.arange(rows, dtype=np.float32)[:, None], cols, axis=1)
+            self._grids.append((grid_x, grid_y))
+            self._buffers.append({
+                'map_x': np.empty((rows, cols), dtype=np.float32),
+                'warped': np.empty((rows, cols), dtype=np.uint8),
+                'residual': np.empty((rows, cols), dtype=np.int16),
+            })
+        self.filtered = np.empty(shape, dtype=np.int16)
+
+    @staticmethod
+    def _level_shape(shape, level):
+        rows, cols = shape
+        return rows >> level, cols >> level
+
+    def disparity(self, imgL, imgR):
+        """Return the int16 disparity (fixed-point, scaled by 16) at full resolution."""
+        shape = imgL.shape[:2]
+        if shape != self._shape:
+            self._allocate(shape)
+
+        # Image pyramids, level 0 is full resolution
+        lefts, rights = [imgL], [imgR]
+        for level in range(1, self.levels + 1):
+            size = self._level_shape(shape, level)[::-1]
+            lefts.append(cv2.resize(lefts[-1], size, interpolation=cv2.INTER_AREA))
+            rights.append(cv2.resize(rights[-1], size, interpolation=cv2.INTER_AREA))
+
+        # Full-range search at the coarsest level, in float pixels
+        disp = self.coarse_matcher.compute(lefts[-1], rights[-1]).astype(np.float32) / 16
+        valid = disp >= 0
+
+        for level in range(self.levels - 1, -1, -1):
+            rows, cols = self._level_shape(shape, level)
+            # Upsample the estimate; disparities double with the resolution
+            disp = cv2.resize(disp, (cols, rows), interpolation=cv2.INTER_LINEAR) * 2
+            valid = cv2.resize(valid.view(np.uint8), (cols, rows), interpolation=cv2.INTER_NEAREST) > 0
+            disp[~valid] = 0
+
+            grid_x, grid_y = self._grids[level]
+            buffers = self._buffers[level]
+            np.subtract(grid_x, disp, out=buffers['map_x'])
+            cv2.remap(rights[level], buffers['map_x'], grid_y, cv2.INTER_LINEAR,
+                      dst=buffers['warped'], borderMode=cv2.BORDER_REPLICATE)
+            residual = self.refine_matcher.compute(lefts[level], buffers['warped'], buffers['residual'])
+
+            refined = residual > (self.refine_matcher.getMinDisparity() - 1) * 16
+            disp += residual.astype(np.float32) / 16
+            valid &= refined
+
+        disp[~valid] = -1
+        np.multiply(disp, 16, out=disp)
+        result = disp.astype(np.int16)
+        if self.wls_filter is None:
+            np.copyto(self.filtered, result)
+            return self.filtered
+        return self.wls_filter.filter(result, imgL, self.filtered)
@@ -0,0 +1,351 @@
+"""
+Append-only, memory-mapped recording of raw RAW16 stereo frames.
+
+A session is a directory holding:
+    session.json      geometry, layout and, once closed, the frame count
+    data_NNNNN.bin    preallocated chunks of `chunk_frames` fixed-size frame slots
+    index.bin         one INDEX_DTYPE record per frame, appended as frames arrive
+
+Every slot is a FRAME_HEADER_DTYPE header (timestamp, frame counter,
+gain/shutter) followed by the untouched RAW16 payload, padded to 64 bytes.
+Frames are copied straight into the mapped chunk: sequential writes, no
+per-frame encoding and one file per chunk instead of one inode per image.
+camera_time is the unwrapped embedded camera time; frames written without a
+timestamp advance it by the host time elapsed since the previous frame, so the
+index stays monotonic for find_time().
+
+RecordingReader maps the chunks read-only and hands out NumPy views into them,
+so any number of processes can replay a session concurrently, even while it
+is still being recorded. A RecordingWriter opened with append=True continues
+an existing session after its last indexed frame, e.g. after an interruption.
+"""
+
+import json
+import math
+import mmap
+import os
+import time
+import numpy as np
+
+from Utils.timestamps import CycleClock, CYCLE_WRAP
+from Utils.deinterleave import deinterleave
+
+FORMAT_VERSION = 1
+FRAME_MAGIC = b'PBFR'
+ALIGNMENT = 64
+
+FRAME_HEADER_DTYPE = np.dtype({
+    'names': ['magic', 'version', 'frame', 'host_ns', 'camera_time', 'cycle_seconds',
+              'cycle_count', 'cycle_offset', 'gain', 'shutter', 'rows', 'cols'],
+    'formats': ['S4', '<u4', '<i8', '<i8', '<f8', '<u2', '<u2', '<u2', '<f4', '<f4', '<u4', '<u4'],
+    'offsets': [0, 4, 8, 16, 24, 32, 34, 36, 40, 44, 48, 52],
+    'itemsize': ALIGNMENT,
+})
+
+INDEX_DTYPE = np.dtype([('frame', '<i8'), ('chunk', '<u4'), ('slot', '<u4'),
+                        ('host_ns', '<i8'), ('camera_time', '<f8')])
+
+
+def frame_stride(rows, cols):
+    payload = rows * cols * 2
+    return int(math.ceil((FRAME_HEADER_DTYPE.itemsize + payload) / float(ALIGNMENT))) * ALIGNMENT
+
+
+def chunk_name(chunk):
+    return f'data_{chunk:05d}.bin'
+
+
+class RecordingWriter(object):
+
+    def __init__(self, path, rows, cols, chunk_frames=256, preallocate=True, metadata=None,
+                 pixel_format='RAW16', append=False):
+        """
+        `pixel_format` names the 2-byte-per-pixel payload, e.g. 'DISPARITY16' for
+        int16 disparity maps. With `append` an existing session of the same
+        geometry is continued instead of refused.
+        """
+        exists = os.path.exists(os.path.join(path, 'session.json'))
+        if exists and not append:
+            raise IOError(f'A recording already exists in {path}')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows, self.cols = rows, cols
+        self.payload = rows * cols * 2
+        self.stride = frame_stride(rows, cols)
+        self.chunk_frames = chunk_frames
+        self.preallocate = preallocate
+        self.frames = 0
+        if exists:
+            self._resume()
+        else:
+            self.session = {
+                'version': FORMAT_VERSION,
+                'rows': rows,
+                'cols': cols,
+                'pixel_format': pixel_format,
+                'header_size': FRAME_HEADER_DTYPE.itemsize,
+                'frame_stride': self.stride,
+                'chunk_frames': chunk_frames,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'frames': None,
+                'metadata': metadata or {},
+            }
+        self._write_session()
+
+        self.clock = CycleClock()
+        self._last_time = None
+        self._last_host_ns = None
+        if self.frames:
+            # Continue the unwrapped camera time where the session stopped
+            last = np.fromfile(os.path.join(path, 'index.bin'), dtype=INDEX_DTYPE,
+                               offset=(self.frames - 1) * INDEX_DTYPE.itemsize, count=1)[0]
+            if not math.isnan(last['camera_time']):
+                self._last_time = float(last['camera_time'])
+                self._last_host_ns = int(last['host_ns'])
+                self.clock.wraps = int(self._last_time // CYCLE_WRAP)
+                self.clock.last = self._last_time % CYCLE_WRAP
+        self._chunk = -1
+        self._file = None
+        self._map = None
+        # Unbuffered: every record reaches the file at once, so a reader's refresh() sees it
+        self._index = open(os.path.join(path, 'index.bin'), 'ab', buffering=0)
+
+    def _resume(self):
+        with open(os.path.join(self.path, 'session.json')) as f:
+            self.session = json.load(f)
+        if (self.session['version'], self.session['rows'], self.session['cols']) != \
+                (FORMAT_VERSION, self.rows, self.cols):
+            raise IOError(f'The recording in {self.path} has a different format or frame size')
+        self.chunk_frames = self.session['chunk_frames']
+        # Frames are indexed after their payload is copied, so indexed frames are complete
+        index_path = os.path.join(self.path, 'index.bin')
+        self.frames = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        os.truncate(index_path, self.frames * INDEX_DTYPE.itemsize)
+        self.session['frames'] = None
+
+    def _write_session(self):
+        tmp = os.path.join(self.path, 'session.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.session, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, 'session.json'))
+
+    def _close_chunk(self, used_frames):
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map.close()
+        if used_frames < self.chunk_frames:
+            self._file.truncate(used_frames * self.stride)
+        self._file.close()
+        self._map = self._file = None
+
+    def _open_chunk(self, chunk):
+        self._close_chunk(self.chunk_frames)
+        size = self.stride * self.chunk_frames
+        path = os.path.join(self.path, chunk_name(chunk))
+        # An appended session continues in its last, possibly truncated, chunk
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        if self.preallocate and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(self._file.fileno(), 0, size)
+        else:
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._chunk = chunk
+
+    def write(self, raw, timestamp=None, gain=float('nan'), shutter=float('nan')):
+        """
+        Append one frame of interleaved RAW16 bytes (e.g. Utils.deinterleave.raw_view(image))
+        with its PyCapture2 timestamp. Returns the frame number.
+        """
+        chunk, slot = divmod(self.frames, self.chunk_frames)
+        if chunk != self._chunk:
+            self._open_chunk(chunk)
+        offset = slot * self.stride
+        host_ns = int(time.time() * 1e9)
+        camera_time = self._camera_time(timestamp, host_ns)
+
+        header = np.ndarray(1, dtype=FRAME_HEADER_DTYPE, buffer=self._map, offset=offset)[0]
+        header['magic'] = FRAME_MAGIC
+        header['version'] = FORMAT_VERSION
+        header['frame'] = self.frames
+        header['host_ns'] = host_ns
+        header['camera_time'] = camera_time
+        if timestamp is not None:
+            header['cycle_seconds'] = timestamp.cycleSeconds
+            header['cycle_count'] = timestamp.cycleCount
+            header['cycle_offset'] = timestamp.cycleOffset
+        header['gain'] = gain
+        header['shutter'] = shutter
+        header['rows'] = self.rows
+        header['cols'] = self.cols
+        payload = np.ndarray(self.payload, dtype=np.uint8, buffer=self._map,
+                             offset=offset + FRAME_HEADER_DTYPE.itemsize)
+        np.copyto(payload, raw[:self.payload])
+
+        record = np.array((self.frames, chunk, slot, host_ns, camera_time), dtype=INDEX_DTYPE)
+        self._index.write(record.tobytes())
+        self.frames += 1
+        return self.frames - 1
+
+    def _camera_time(self, timestamp, host_ns):
+        if timestamp is not None:
+            camera_time = self.clock.update(timestamp)
+            # A camera restarted between appended runs starts over below the last time
+            while self._last_time is not None and camera_time < self._last_time:
+                self.clock.wraps += 1
+                camera_time += CYCLE_WRAP
+        elif self._last_time is None:
+            camera_time = 0.0
+        else:
+            camera_time = self._last_time + max(host_ns - self._last_host_ns, 0) / 1e9
+        self._last_time = camera_time
+        self._last_host_ns = host_ns
+        return camera_time
+
+    def close(self):
+        self._close_chunk(self.frames - self._chunk * self.chunk_frames)
+        self._index.close()
+        self.session['frames'] = self.frames
+        self._write_session()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PropertySampler(object):
+    """
+    Gain and shutter for the frame headers. Reading camera properties costs a
+    bus transaction, so they are refreshed at most every `interval` seconds.
+    """
+
+    def __init__(self, cam, interval=1.0):
+        from Utils.backend import PyCapture2
+        self.cam = cam
+        self.interval = interval
+        self._types = (PyCapture2.PROPERTY_TYPE.GAIN, PyCapture2.PROPERTY_TYPE.SHUTTER)
+        self._error = PyCapture2.Fc2error
+        self._next = 0.0
+        self.gain = self.shutter = float('nan')
+
+    def values(self):
+        now = time.monotonic()
+        if now >= self._next:
+            self._next = now + self.interval
+            try:
+                self.gain, self.shutter = (self.cam.getProperty(t).absValue for t in self._types)
+            except self._error:
+                pass
+        return self.gain, self.shutter
+
+
+class RecordedFrame(object):
+    """Zero-copy views of one recorded frame: its header, raw bytes and both eyes."""
+
+    def __init__(self, header, raw, rows, cols):
+        self.header = header
+        self.raw = raw
+        self.rows, self.cols = rows, cols
+        pairs = raw.reshape((rows, cols, 2))
+        # Strided views, byte 1 is the left eye; see planes() for contiguous copies
+        self.left = pairs[:, :, 1]
+        self.right = pairs[:, :, 0]
+
+    @property
+    def index(self):
+        return int(self.header['frame'])
+
+    @property
+    def camera_time(self):
+        return float(self.header['camera_time'])
+
+    @property
+    def host_ns(self):
+        return int(self.header['host_ns'])
+
+    def planes(self, out=None):
+        """Contiguous (left, right) planes, deinterleaved into `out` if given."""
+        return deinterleave(self.raw, self.rows, self.cols, out)
+
+
+class RecordingReader(object):
+    """
+    Random access to a recorded session.
+
+    reader[i] returns a RecordedFrame, reader[a:b:step] an iterator over frames.
+    Frames can be looked up by camera or host time through the index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'session.json')) as f:
+            self.session = json.load(f)
+        if self.session['version'] != FORMAT_VERSION:
+            raise IOError(f'Unsupported recording version {self.session["version"]}')
+        self.rows = self.session['rows']
+        self.cols = self.session['cols']
+        self.stride = self.session['frame_stride']
+        self.chunk_frames = self.session['chunk_frames']
+        self.payload = self.rows * self.cols * 2
+        self._chunks = {}
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the index, picking up frames appended by a writer still recording."""
+        index_path = os.path.join(self.path, 'index.bin')
+        count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        self.index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+        if self.session['frames'] is None:
+            # Chunks of a live session may still grow, map them again on demand
+            self._chunks.clear()
+        return len(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _chunk(self, chunk):
+        if chunk not in self._chunks:
+            self._chunks[chunk] = np.memmap(os.path.join(self.path, chunk_name(chunk)),
+                                            dtype=np.uint8, mode='r')
+        return self._chunks[chunk]
+
+    def frame(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f'Frame {i} out of range')
+        record = self.index[i]
+        data = self._chunk(int(record['chunk']))
+        offset = int(record['slot']) * self.stride
+        header = data[offset:offset + FRAME_HEADER_DTYPE.itemsize].view(FRAME_HEADER_DTYPE)[0]
+        start = offset + FRAME_HEADER_DTYPE.itemsize
+        return RecordedFrame(header, data[start:start + self.payload], self.rows, self.cols)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return (self.frame(i) for i in range(*key.indices(len(self))))
+        return self.frame(key)
+
+    def __iter__(self):
+        return self[:]
+
+    def raw(self, i):
+        """Interleaved RAW16 bytes of frame `i`, as returned by Image.getData()."""
+        return self.frame(i).raw
+
+    def find_time(self, t, clock='camera'):
+        """
+        Index of the first frame at or after time `t`: unwrapped camera seconds
+        (clock='camera') or host nanoseconds since the epoch (clock='host').
+        """
+        column = self.index['camera_time'] if clock == 'camera' else self.index['host_ns']
+        return int(np.searchsorted(column, t, side='left'))
+
+    def time_range(self, start, stop, step=1, clock='camera'):
+        """Iterate over the frames recorded between `start` and `stop`."""
+        return self[self.find_time(start, clock):self.find_time(stop, clock):step]
+
+    def close(self):
+        self._chunks.clear()
@@ -0,0 +1,495 @@
+"""
+Simulated PyCapture2 backend for hardware-free runs and benchmarking.
+
+Implements the subset of the PyCapture2 API used by this repository, emulating
+a Bumblebee2 in Format7 MODE_3 / RAW16 (left eye in byte 1, right eye in byte 0).
+Frames are either synthesized (a textured scene with known disparities) or
+replayed from recorded frames, paced at a configurable frame rate with
+1394 cycle timestamps.
+
+Select it with `PYTHONBEE_BACKEND=sim` (see Utils/backend.py) and tune it with:
+    PYTHONBEE_SIM_FPS         frame rate (default 30), capped by the bandwidth of the
+                              Format7 packet size like on a 1394 bus
+    PYTHONBEE_SIM_SIZE        WIDTHxHEIGHT (default 1024x768)
+    PYTHONBEE_SIM_SOURCE      a recorded session (Utils/recording.py), a directory of
+                              *.raw / *.npy RAW16 frames, or one with left/ and right/
+                              PNG subdirectories (processible_cap output)
+    PYTHONBEE_SIM_CAMERAS     number of cameras on the bus (default 1)
+    PYTHONBEE_SIM_ERROR_RATE  probability of retrieveBuffer raising Fc2error (default 0)
+    PYTHONBEE_SIM_DROP_RATE   probability of a frame being lost on the bus (default 0)
+or call configure() before connecting a camera.
+"""
+
+import collections
+import glob
+import os
+import random
+import threading
+import time
+import numpy as np
+import cv2
+
+from Utils.frame_codecs import list_frames, read_frame
+
+_config = {
+    'fps': float(os.environ.get('PYTHONBEE_SIM_FPS', 30)),
+    'size': tuple(int(v) for v in os.environ.get('PYTHONBEE_SIM_SIZE', '1024x768').split('x')),
+    'source': os.environ.get('PYTHONBEE_SIM_SOURCE') or None,
+    'num_cameras': int(os.environ.get('PYTHONBEE_SIM_CAMERAS', 1)),
+    'error_rate': float(os.environ.get('PYTHONBEE_SIM_ERROR_RATE', 0)),
+    'drop_rate': float(os.environ.get('PYTHONBEE_SIM_DROP_RATE', 0)),
+    'realtime': True,
+    'seed': 0,
+}
+
+BUS_CYCLES_PER_SECOND = 8000
+
+# Cameras on one bus share the 1394 cycle timer, timestamps count from here
+_bus_epoch = time.monotonic()
+
+
+def configure(**kwargs):
+    """Override simulator settings, e.g. configure(fps=60, source='./output')."""
+    for key, value in kwargs.items():
+        if key not in _config:
+            raise KeyError(f'Unknown simulator setting: {key}')
+        _config[key] = value
+
+
+def getLibraryVersion():
+    return (2, 13, 3, 0)
+
+
+class Fc2error(Exception):
+    pass
+
+
+class MODE:
+    MODE_0 = 0
+    MODE_1 = 1
+    MODE_2 = 2
+    MODE_3 = 3
+
+
+class PIXEL_FORMAT:
+    MONO8 = 0x80000000
+    RAW8 = 0x00400000
+    MONO16 = 0x04000000
+    RAW16 = 0x00200000
+    RGB = 0x40000000
+    BGR = 0x80000008
+
+
+class PROPERTY_TYPE:
+    BRIGHTNESS = 0
+    AUTO_EXPOSURE = 1
+    SHARPNESS = 2
+    WHITE_BALANCE = 3
+    HUE = 4
+    SATURATION = 5
+    GAMMA = 6
+    IRIS = 7
+    FOCUS = 8
+    ZOOM = 9
+    PAN = 10
+    TILT = 11
+    SHUTTER = 12
+    GAIN = 13
+    TRIGGER_MODE = 14
+    TRIGGER_DELAY = 15
+    FRAME_RATE = 16
+    TEMPERATURE = 17
+
+
+class IMAGE_FILE_FORMAT:
+    PGM = 0
+    PPM = 1
+    BMP = 2
+    JPEG = 3
+    JPEG2000 = 4
+    TIFF = 5
+    PNG = 6
+    RAW = 7
+
+
+class _Record(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Format7ImageSettings(object):
+
+    def __init__(self, mode=0, offsetX=0, offsetY=0, width=0, height=0, pixelFormat=0):
+        self.mode = mode
+        self.offsetX = offsetX
+        self.offsetY = offsetY
+        self.width = width
+        self.height = height
+        self.pixelFormat = pixelFormat
+
+
+class TimeStamp(object):
+
+    def __init__(self, camera_time, host_time):
+        self.seconds = int(host_time)
+        self.microSeconds = int((host_time % 1) * 1e6)
+        # 1394 cycle timer: 128 s wrap, 8000 cycles per second, 3072 offsets per cycle
+        self.cycleSeconds = int(camera_time) % 128
+        cycles = (camera_time % 1) * 8000
+        self.cycleCount = int(cycles)
+        self.cycleOffset = int((cycles % 1) * 3072)
+
+
+class Image(object):
+
+    def __init__(self, data=None, rows=0, cols=0, pixel_format=PIXEL_FORMAT.RAW16, timestamp=None):
+        self._data = data
+        self._rows = rows
+        self._cols = cols
+        self._pixel_format = pixel_format
+        self._timestamp = timestamp
+
+    def getData(self):
+        return self._data
+
+    def getRows(self):
+        return self._rows
+
+    def getCols(self):
+        return self._cols
+
+    def getStride(self):
+        return self._data.size // self._rows if self._rows else 0
+
+    def getDataSize(self):
+        return self._data.size
+
+    def getPixelFormat(self):
+        return self._pixel_format
+
+    def getTimeStamp(self):
+        return self._timestamp
+
+    def _left(self):
+        return self._data.reshape((self._rows, self._cols, 2))[:, :, 1]
+
+    def convert(self, pixel_format):
+        if self._pixel_format != PIXEL_FORMAT.RAW16:
+            raise Fc2error('Simulator only converts RAW16 images')
+        if pixel_format == PIXEL_FORMAT.BGR:
+            data = cv2.cvtColor(np.ascontiguousarray(self._left()), cv2.COLOR_BayerBG2BGR).ravel()
+        elif pixel_format == PIXEL_FORMAT.MONO8:
+            data = np.ascontiguousarray(self._left()).ravel()
+        else:
+            raise Fc2error(f'Unsupported conversion to pixel format {pixel_format}')
+        return Image(data, self._rows, self._cols, pixel_format, self._timestamp)
+
+    def save(self, filename, file_format=None):
+        if isinstance(filename, bytes):
+            filename = filename.decode('utf-8')
+        if self._pixel_format == PIXEL_FORMAT.BGR:
+            cv2.imwrite(filename, self._data.reshape((self._rows, self._cols, 3)))
+        elif self._pixel_format == PIXEL_FORMAT.MONO8:
+            cv2.imwrite(filename, self._data.reshape((self._rows, self._cols)))
+        else:
+            cv2.imwrite(filename, self._data.view(np.uint16).reshape((self._rows, self._cols)))
+
+
+class SyntheticSource(object):
+    """Textured stereo scene: background at 8 px disparity and a moving box at 24 px."""
+
+    def __init__(self, rows, cols, num_frames=16, seed=0):
+        rng = np.random.default_rng(seed)
+        self.rows, self.cols = rows, cols
+        self.frames = []
+        back = cv2.GaussianBlur(rng.integers(0, 256, (rows, cols + 64), dtype=np.uint8), (3, 3), 0)
+        front = cv2.GaussianBlur(rng.integers(0, 256, (rows // 3, cols // 4 + 32), dtype=np.uint8), (3, 3), 0)
+        for n in range(num_frames):
+            left = back[:, :cols].copy()
+            right = back[:, 8:cols + 8].copy()
+            y = rows // 3
+            x = cols // 8 + (n * cols // (2 * num_frames))
+            w = min(front.shape[1], cols - x)
+            left[y:y + front.shape[0], x:x + w] = front[:, :w]
+            right[y:y + front.shape[0], x - 24:x - 24 + w] = front[:, :w]
+            raw = np.empty((rows, cols, 2), dtype=np.uint8)
+            raw[:, :, 1] = left
+            raw[:, :, 0] = right
+            raw = raw.ravel()
+            raw.flags.writeable = False
+            self.frames.append(raw)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index % len(self.frames)]
+
+
+class ReplaySource(object):
+    """Replay a recorded session, RAW16 frames (*.raw / *.npy) or left/right image pairs (Utils/frame_codecs.py)."""
+
+    def __init__(self, path, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.recording = None
+        if os.path.exists(os.path.join(path, 'session.json')):
+            from Utils.recording import RecordingReader
+            self.recording = RecordingReader(path)
+            return
+        self.paths = sorted(glob.glob(os.path.join(path, '*.raw')) + glob.glob(os.path.join(path, '*.npy')))
+        self.pairs = []
+        if not self.paths:
+            lefts = list_frames(os.path.join(path, 'left'))
+            rights = list_frames(os.path.join(path, 'right'))
+            self.pairs = list(zip(lefts, rights))
+        if not self.paths and not self.pairs:
+            raise Fc2error(f'No recorded frames found in {path}')
+
+    def __len__(self):
+        if self.recording is not None:
+            return len(self.recording)
+        return len(self.paths) or len(self.pairs)
+
+    def __getitem__(self, index):
+        index %= len(self)
+        if self.recording is not None:
+            return self.recording.raw(index)
+        if self.paths:
+            path = self.paths[index]
+            if path.endswith('.npy'):
+                return np.load(path).astype(np.uint8, copy=False).ravel()
+            return np.fromfile(path, dtype=np.uint8)
+        left_path, right_path = self.pairs[index]
+        raw = np.empty((self.rows, self.cols, 2), dtype=np.uint8)
+        raw[:, :, 1] = read_frame(left_path)
+        raw[:, :, 0] = read_frame(right_path)
+        return raw.ravel()
+
+
+class BusManager(object):
+
+    def getNumOfCameras(self):
+        return _config['num_cameras']
+
+    def getCameraFromIndex(self, index):
+        if index >= _config['num_cameras']:
+            raise Fc2error('Camera index out of range')
+        return _Record(value=(index,), index=index)
+
+    def getCameraSerialNumberFromIndex(self, index):
+        return 10000000 + index
+
+
+class Camera(object):
+
+    def __init__(self):
+        self._index = None
+        self._registers = {0x530: 0x10000, 0x62C: 0, 0x610: 0x80000000}
+        self._properties = {
+            PROPERTY_TYPE.FRAME_RATE: _config['fps'],
+            PROPERTY_TYPE.SHUTTER: 1000.0 / _config['fps'] / 2,
+            PROPERTY_TYPE.GAIN: 0.0,
+        }
+        self._embedded = {'timestamp': False, 'gain': False, 'shutter': False, 'frameCounter': False}
+        self._trigger_mode = _Record(onOff=False, mode=0, parameter=0, source=0, polarity=0)
+        self._config = _Record(grabTimeout=-1, numBuffers=10)
+        self._trigger_ready = 0.0
+        self._capturing = False
+        self._callback = None
+        self._thread = None
+
+    # Connection ---------------------------
+    def connect(self, guid):
+        self._index = getattr(guid, 'index', 0)
+        cols, rows = _config['size']
+        self._format7 = Format7ImageSettings(MODE.MODE_3, 0, 0, cols, rows, PIXEL_FORMAT.RAW16)
+        self._rng = random.Random(_config['seed'] + self._index)
+
+    def disconnect(self):
+        self._index = None
+
+    def getCameraInfo(self):
+        cols, rows = _config['size']
+        return _Record(serialNumber=10000000 + self._index, modelName='Simulated Bumblebee2 BB2-08S2C',
+                       vendorName='PythonBee', sensorInfo='Simulated stereo sensor',
+                       sensorResolution=f'{cols}x{rows}', firmwareVersion='sim',
+                       firmwareBuildTime='sim')
+
+    # Format7 ------------------------------
+    def getFormat7Info(self, mode):
+        cols, rows = _config['size']
+        info = _Record(mode=mode, maxWidth=cols, maxHeight=rows, imageHStepSize=8, imageVStepSize=2,
+                       offsetHStepSize=8, offsetVStepSize=2, packetSize=4096,
+                       percentage=100.0, pixelFormatBitField=PIXEL_FORMAT.RAW16 | PIXEL_FORMAT.MONO8)
+        return info, mode == MODE.MODE_3
+
+    def validateFormat7Settings(self, settings):
+        cols, rows = _config['size']
+        valid = (settings.offsetX + settings.width <= cols and settings.offsetY + settings.height <= rows
+                 and settings.width > 0 and settings.height > 0
+                 and settings.width % 8 == 0 and settings.height % 2 == 0
+                 and settings.offsetX % 8 == 0 and settings.offsetY % 2 == 0)
+        return _Record(recommendedBytesPerPacket=2048, maxBytesPerPacket=4096,
+                       unitBytesPerPacket=4), valid
+
+    def setFormat7ConfigurationPacket(self, packet_size, settings):
+        self._packet_size = packet_size
+        self._format7 = settings
+
+    def getFormat7Configuration(self):
+        return self._format7, getattr(self, '_packet_size', 4096), 100.0
+
+    def _frame_rate(self):
+        # One isochronous packet per 125 us bus cycle caps the frame rate of large images
+        frame_bytes = self._format7.width * self._format7.height * 2
+        packet_size = getattr(self, '_packet_size', 4096)
+        return min(self._properties[PROPERTY_TYPE.FRAME_RATE],
+                   packet_size * BUS_CYCLES_PER_SECOND / float(frame_bytes))
+
+    # Properties and registers --------------
+    def getProperty(self, prop_type):
+        value = self._properties.get(prop_type, 0.0)
+        if prop_type == PROPERTY_TYPE.FRAME_RATE:
+            value = self._frame_rate()
+        return _Record(type=prop_type, present=True, absControl=True, onePush=False, onOff=True,
+                       autoManualMode=False, valueA=int(value), valueB=0, absValue=value)
+
+    def setProperty(self, type=None, absValue=None, **kwargs):
+        if absValue is not None:
+            self._properties[type] = absValue
+
+    def getEmbeddedImageInfo(self):
+        available = _Record(**{key: True for key in self._embedded})
+        return _Record(available=available, **self._embedded)
+
+    def setEmbeddedImageInfo(self, **kwargs):
+        for key, value in kwargs.items():
+            self._embedded[key] = bool(value)
+
+    def readRegister(self, address):
+        if address == 0x62C:
+            # Bit 31 stays set while the sensor is busy with the last trigger
+            return 0x80000000 if time.monotonic() < self._trigger_ready else 0
+        return self._registers.get(address, 0)
+
+    def writeRegister(self, address, value):
+        if address == 0x62C and value & 0x80000000:
+            self._fire_trigger()
+            return
+        self._registers[address] = value
+
+    def getTriggerMode(self):
+        return _Record(**self._trigger_mode.__dict__)
+
+    def setTriggerMode(self, trigger_mode):
+        self._trigger_mode = trigger_mode
+
+    def setConfiguration(self, **kwargs):
+        self._config.__dict__.update(kwargs)
+
+    def getConfiguration(self):
+        return self._config
+
+    # Capture ------------------------------
+    def startCapture(self, callback=None, callbackData=None):
+        if self._index is None:
+            raise Fc2error('Camera is not connected')
+        cols, rows = _config['size']
+        if _config['source']:
+            self._source = ReplaySource(_config['source'], rows, cols)
+        else:
+            self._source = SyntheticSource(rows, cols, seed=_config['seed'] + self._index)
+        self._period = 1.0 / self._frame_rate()
+        # Cameras on one bus are frame-locked: start on the next period boundary of the cycle timer
+        periods = -(-(time.monotonic() - _bus_epoch) // self._period)
+        self._start = _bus_epoch + periods * self._period
+        self._frame = 0
+        self._triggers = collections.deque()
+        self._trigger_cond = threading.Condition()
+        self._capturing = True
+        if callback is not None:
+            self._callback = (callback, callbackData)
+            self._thread = threading.Thread(target=self._callback_loop, daemon=True)
+            self._thread.start()
+
+    def stopCapture(self):
+        self._capturing = False
+        if self._thread is not None:
+            with self._trigger_cond:
+                self._trigger_cond.notify_all()
+            self._thread.join()
+            self._thread = None
+        self._callback = None
+
+    def _fire_trigger(self):
+        # Triggers are ignored until the previous exposure and readout are done
+        now = time.monotonic()
+        if now < self._trigger_ready or not self._capturing:
+            return
+        self._trigger_ready = now + self._period
+        with self._trigger_cond:
+            self._triggers.append(now + self._period / 2)
+            self._trigger_cond.notify_all()
+
+    def _wait_frame(self):
+        if self._trigger_mode.onOff:
+            # Triggered: one frame per software trigger, read out half a period later
+            timeout = self._config.grabTimeout / 1000.0 if self._config.grabTimeout > 0 else None
+            with self._trigger_cond:
+                if not self._trigger_cond.wait_for(
+                        lambda: self._triggers or not self._capturing, timeout):
+                    raise Fc2error('Timeout waiting for triggered image')
+                if not self._capturing:
+                    raise Fc2error('Capture stopped')
+                ready = self._triggers.popleft()
+            time.sleep(max(0.0, ready - time.monotonic()))
+            self._frame += 1
+            return ready - _bus_epoch
+
+        # Free running: frames arrive on a fixed schedule; a late reader gets
+        # the newest frame and the ones in between are lost, as with DROP_FRAMES
+        now = time.monotonic() - self._start
+        due = self._frame * self._period
+        if not _config['realtime']:
+            now = due
+        elif now < due:
+            time.sleep(due - now)
+        elif now - due > self._period * self._config.numBuffers:
+            self._frame = int(now / self._period)
+        if _config['drop_rate'] and self._rng.random() < _config['drop_rate']:
+            self._frame += 1
+        camera_time = self._start - _bus_epoch + self._frame * self._period
+        self._frame += 1
+        return camera_time
+
+    def _next_image(self):
+        if not self._capturing:
+            raise Fc2error('Camera is not capturing')
+        camera_time = self._wait_frame()
+        if _config['error_rate'] and self._rng.random() < _config['error_rate']:
+            raise Fc2error('Simulated isochronous transfer error')
+        cols, rows = _config['size']
+        settings = self._format7
+        data = self._source[self._frame - 1]
+        if (settings.width, settings.height) != (cols, rows):
+            data = data.reshape((rows, cols, 2))[settings.offsetY:settings.offsetY + settings.height,
+                                                 settings.offsetX:settings.offsetX + settings.width].ravel()
+        timestamp = TimeStamp(camera_time, time.time())
+        return Image(data, settings.height, settings.width, PIXEL_FORMAT.RAW16, timestamp)
+
+    def retrieveBuffer(self):
+        if self._callback is not None:
+            raise Fc2error('retrieveBuffer is not available in callback mode')
+        return self._next_image()
+
+    def _callback_loop(self):
+        callback, data = self._callback
+        while self._capturing:
+            try:
+                image = self._next_image()
+            except Fc2error:
+                continue
+            if data is None:
+                callback(image)
+            else:
+                callback(image, data)
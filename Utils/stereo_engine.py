@@ -0,0 +1,119 @@
+"""
+Persistent SGBM + WLS stereo matcher.
+
+The matchers and the filter are created once and kept for the whole session
+so their internal buffers stay warm between frames. Parameters are changed
+through setters instead of rebuilding the objects every frame.
+"""
+
+import numpy as np
+import cv2
+
+
+class StereoEngine(object):
+
+    def __init__(self, md=1, window_size=3, block_size=3, lmbda=8000, sigma=3,
+                 uniqueness_ratio=10, min_disparity=0):
+        self.md = md
+        self.window_size = window_size
+        self.lmbda = lmbda
+        self.sigma = sigma
+
+        # SGBM Parameters -----------------
+        self.left_matcher = cv2.StereoSGBM_create(
+            minDisparity = min_disparity,
+            numDisparities = md * 16,  # max_disp has to be dividable by 16 f. E. HH 192, 256
+            blockSize = block_size,
+            P1 = 8 * 3 * window_size**2,
+            P2 = 32 * 3 * window_size**2,
+            disp12MaxDiff = 12,
+            uniquenessRatio = uniqueness_ratio,
+            speckleWindowSize = 64,
+            speckleRange = 2,
+            preFilterCap = 63,
+            mode = cv2.STEREO_SGBM_MODE_SGBM_3WAY
+        )
+        self.right_matcher = cv2.ximgproc.createRightMatcher(self.left_matcher)
+        self._build_filter()
+
+        # Output buffers, (re)allocated only when the frame size changes
+        self._shape = None
+        self.displ = None
+        self.dispr = None
+        self.filtered = None
+
+    def _build_filter(self):
+        # The WLS filter bakes the disparity range into its ROI when created
+        self.wls_filter = cv2.ximgproc.createDisparityWLSFilter(
+            matcher_left=self.left_matcher)
+        self.wls_filter.setLambda(self.lmbda)
+        self.wls_filter.setSigmaColor(self.sigma)
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self.displ = np.empty(shape, dtype=np.int16)
+        self.dispr = np.empty(shape, dtype=np.int16)
+        self.filtered = np.empty(shape, dtype=np.int16)
+
+    # Setters ------------------------------
+    def set_max_disparity(self, md):
+        """Set the maximum disparity coefficient (numDisparities = md * 16)."""
+        if md == self.md:
+            return
+        self.md = md
+        num_disp = md * 16
+        min_disp = self.left_matcher.getMinDisparity()
+        self.left_matcher.setNumDisparities(num_disp)
+        self.right_matcher.setNumDisparities(num_disp)
+        self.right_matcher.setMinDisparity(-(min_disp + num_disp) + 1)
+        # The only change that cannot go through a setter on the filter
+        self._build_filter()
+
+    def set_window_size(self, window_size):
+        """Set the window size used to derive the P1/P2 smoothness penalties."""
+        self.window_size = window_size
+        for matcher in (self.left_matcher, self.right_matcher):
+            matcher.setP1(8 * 3 * window_size**2)
+            matcher.setP2(32 * 3 * window_size**2)
+
+    def set_uniqueness_ratio(self, ratio):
+        self.left_matcher.setUniquenessRatio(ratio)
+        self.right_matcher.setUniquenessRatio(ratio)
+
+    def set_lambda(self, lmbda):
+        self.lmbda = lmbda
+        self.wls_filter.setLambda(lmbda)
+
+    def set_sigma(self, sigma):
+        self.sigma = sigma
+        self.wls_filter.setSigmaColor(sigma)
+
+    # Processing ---------------------------
+    def disparity(self, imgL, imgR):
+        """Return the WLS-filtered int16 disparity (fixed-point, scaled by 16)."""
+        if imgL.shape[:2] != self._shape:
+            self._allocate(imgL.shape[:2])
+        self.left_matcher.compute(imgL, imgR, self.displ)
+        self.right_matcher.compute(imgR, imgL, self.dispr)
+        # important to put "imgL" here!!!
+        return self.wls_filter.filter(self.displ, imgL, self.filtered, self.dispr)
+
+    def compute(self, imgL, imgR, pool=None):
+        """Return the normalized uint8 disparity image and its JET heatmap."""
+        return visualize(self.disparity(imgL, imgR), pool)
+
+
+def visualize(filteredImg, pool=None):
+    """
+    Min/max-normalize an int16 disparity to uint8 and color it with JET.
+    With a BufferPool (Utils/buffer_pool.py) both outputs are acquired from it
+    and the caller owns one reference to each.
+    """
+    disparity = heatmap = None
+    if pool is not None:
+        disparity = pool.acquire(filteredImg.shape, np.uint8)
+        heatmap = pool.acquire(filteredImg.shape + (3,), np.uint8)
+    disparity = cv2.normalize(
+        src=filteredImg, dst=disparity, beta=0, alpha=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+    heatmap = cv2.applyColorMap(disparity, cv2.COLORMAP_JET, heatmap)
+    return disparity, heatmap
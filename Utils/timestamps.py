@@ -0,0 +1,41 @@
+"""
+1394 cycle-timer timestamps.
+
+Embedded PyCapture2 timestamps count cycleSeconds (0-127), cycleCount
+(0-7999, 125 us each) and cycleOffset (0-3071), so they wrap every 128 s.
+CycleClock unwraps them into a monotonic time in seconds.
+"""
+
+CYCLE_WRAP = 128.0
+CYCLES_PER_SECOND = 8000
+OFFSETS_PER_CYCLE = 3072
+
+
+def cycle_time(ts):
+    """Seconds within the current 128 s cycle-timer period."""
+    return (ts.cycleSeconds + ts.cycleCount / float(CYCLES_PER_SECOND)
+            + ts.cycleOffset / float(CYCLES_PER_SECOND * OFFSETS_PER_CYCLE))
+
+
+class CycleClock(object):
+    """Unwrap successive cycle timestamps; frames must be fed in capture order."""
+
+    def __init__(self):
+        self.wraps = 0
+        self.last = None
+
+    def update(self, ts):
+        t = cycle_time(ts)
+        if self.last is not None and t < self.last - CYCLE_WRAP / 2:
+            self.wraps += 1
+        self.last = t
+        return self.wraps * CYCLE_WRAP + t
+
+
+def enable_embedded_timestamp(cam, enable_timestamp=True):
+    """Ask the camera to embed its cycle timestamp in every image, if it can."""
+    embedded_info = cam.getEmbeddedImageInfo()
+    if embedded_info.available.timestamp:
+        cam.setEmbeddedImageInfo(timestamp = enable_timestamp)
+        return True
+    return False
@@ -0,0 +1,184 @@
+"""
+Software-triggered capture without busy waiting.
+
+Demo/AsyncTriggerEx.py spins on the SOFTWARE_TRIGGER register (0x62C) until
+the camera is ready and fires on input(). TriggerScheduler instead fires from
+its own thread at a target rate, on a threading.Event, or as fast as the camera
+allows, and polls readiness with an adaptive backoff: it first sleeps for most
+of the busy time measured on previous triggers, then polls with growing sleeps.
+Frames are delivered by a Utils.acquisition.Acquisition, so the next trigger is
+armed while the consumer still processes the previous frame.
+"""
+
+import threading
+import time
+from collections import deque
+import numpy as np
+
+from Utils.acquisition import Acquisition, CALLBACK
+
+TRIGGER_INQ = 0x530
+SOFTWARE_TRIGGER = 0x62C
+FIRE_VAL = 0x80000000
+SOFTWARE_SOURCE = 7
+
+
+def has_software_trigger(cam):
+    return cam.readRegister(TRIGGER_INQ) & 0x10000 == 0x10000
+
+
+def enable_software_trigger(cam, grab_timeout=5000):
+    trigger_mode = cam.getTriggerMode()
+    trigger_mode.onOff = True
+    trigger_mode.mode = 0
+    trigger_mode.parameter = 0
+    trigger_mode.source = SOFTWARE_SOURCE
+    cam.setTriggerMode(trigger_mode)
+    cam.setConfiguration(grabTimeout = grab_timeout)
+
+
+def disable_software_trigger(cam):
+    trigger_mode = cam.getTriggerMode()
+    trigger_mode.onOff = False
+    cam.setTriggerMode(trigger_mode)
+
+
+class ReadyPoller(object):
+    """
+    Wait for the camera to accept a trigger. The expected busy time is learned
+    from past waits, slept through at once, and the rest is polled with
+    exponentially growing sleeps between min_sleep and max_sleep.
+    """
+
+    def __init__(self, cam, min_sleep=50e-6, max_sleep=2e-3, margin=0.9):
+        self.cam = cam
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.margin = margin
+        self.busy_time = 0.0
+        self.reads = 0
+
+    def wait(self, since, timeout=1.0):
+        """Block until ready; `since` is the host time of the last trigger. False on timeout."""
+        now = time.monotonic()
+        expected = since + self.margin * self.busy_time
+        if expected > now:
+            time.sleep(expected - now)
+        sleep = self.min_sleep
+        deadline = time.monotonic() + timeout
+        while True:
+            self.reads += 1
+            if not self.cam.readRegister(SOFTWARE_TRIGGER) & FIRE_VAL:
+                break
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(sleep)
+            sleep = min(sleep * 2, self.max_sleep)
+        # Exponential average of the busy time, follows shutter changes
+        busy = time.monotonic() - since
+        self.busy_time = busy if not self.busy_time else 0.8 * self.busy_time + 0.2 * busy
+        return True
+
+
+class TriggerScheduler(object):
+    """
+    Fire software triggers on `cam` and hand the resulting frames out with
+    get()/release(). Triggers follow `rate` (per second), or `event` when
+    given (set it to fire once), or else the camera's maximum triggered rate.
+    """
+
+    def __init__(self, cam, rate=None, event=None, mode=CALLBACK, depth=4, metrics=None, window=1000):
+        self.cam = cam
+        self.rate = rate
+        self.event = event
+        self.poller = ReadyPoller(cam)
+        self.acquisition = Acquisition(cam, mode, depth, metrics)
+        self.fired = 0
+        self.missed = 0
+        self.latencies = deque(maxlen=window)
+        self._fire_times = deque()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def start(self):
+        if not has_software_trigger(self.cam):
+            raise RuntimeError('SOFT_ASYNC_TRIGGER not implemented on this Camera!')
+        enable_software_trigger(self.cam)
+        self.acquisition.start()
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='trigger', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self.event is not None:
+            self.event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.acquisition.stop()
+        disable_software_trigger(self.cam)
+
+    def _run(self):
+        last = time.monotonic()
+        next_time = last
+        while not self._stop_event.is_set():
+            if self.event is not None:
+                self.event.wait()
+                self.event.clear()
+                if self._stop_event.is_set():
+                    break
+            elif self.rate:
+                next_time += 1.0 / self.rate
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+                else:
+                    # Behind schedule: skip the missed slots instead of bursting
+                    slots = int(-delay * self.rate)
+                    self.missed += slots
+                    next_time += slots / self.rate
+            if not self.poller.wait(last):
+                print('Camera not ready for a software trigger')
+                continue
+            last = time.monotonic()
+            self._fire_times.append(last)
+            self.fired += 1
+            self.cam.writeRegister(SOFTWARE_TRIGGER, FIRE_VAL)
+
+    def get(self, timeout=None):
+        """Next triggered frame (Utils.acquisition.AcquiredFrame) or None on timeout."""
+        frame = self.acquisition.get(timeout)
+        if frame is not None:
+            # A frame answers the latest trigger fired before it arrived; the triggers of
+            # frames dropped on the way are skipped, the ones fired since are kept
+            while len(self._fire_times) > 1 and self._fire_times[1] <= frame.host_time:
+                self._fire_times.popleft()
+            if self._fire_times and self._fire_times[0] <= frame.host_time:
+                self.latencies.append(frame.host_time - self._fire_times.popleft())
+        return frame
+
+    def release(self, frame):
+        self.acquisition.release(frame)
+
+    def stats(self):
+        elapsed = time.monotonic() - self._start if self._start else float('nan')
+        latencies = np.array(self.latencies) * 1000.0 if self.latencies else np.full(1, np.nan)
+        return {
+            'fired': self.fired,
+            'frames': self.acquisition.delivered,
+            'missed': self.missed,
+            'trigger_rate': self.fired / elapsed,
+            'register_reads': self.poller.reads,
+            'latency_mean_ms': float(latencies.mean()),
+            'latency_p95_ms': float(np.percentile(latencies, 95)),
+            'latency_max_ms': float(latencies.max()),
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
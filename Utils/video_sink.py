@@ -0,0 +1,96 @@
+"""
+Streaming video encoder fed from a bounded queue.
+
+The cv2.VideoWriters are opened up front and a background thread encodes
+frame sets as they arrive, so memory stays constant regardless of how long
+the session runs. When the encoder falls behind, the backpressure policy
+decides whether the producer waits ('block') or the frame set is discarded
+('drop').
+"""
+
+import os
+import threading
+import queue
+import cv2
+
+BLOCK = 'block'
+DROP = 'drop'
+POLICIES = (BLOCK, DROP)
+
+_STOP = object()
+
+
+class StreamingVideoWriter(object):
+    """
+    Write several synchronized video streams from one encoder thread.
+
+    `streams` is a list of (name, filename, is_color) tuples, optionally with a
+    fourth (width, height) element overriding `size` for that stream. Frames
+    passed to write() are queued by reference, so callers must not modify them
+    afterwards.
+    """
+
+    def __init__(self, save_path, streams, size, fps=30, fourcc='DIVX',
+                 max_queue=32, policy=BLOCK, on_written=None):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown backpressure policy: {policy}')
+        if not os.path.exists(save_path):
+            os.makedirs(save_path)
+
+        self.policy = policy
+        # Called with the frames dict once it has been encoded or dropped
+        self.on_written = on_written
+        self.names = [stream[0] for stream in streams]
+        self.writers = {}
+        for stream in streams:
+            name, filename, is_color = stream[:3]
+            stream_size = stream[3] if len(stream) > 3 else size
+            self.writers[name] = cv2.VideoWriter(
+                f'{save_path}/{filename}', cv2.VideoWriter_fourcc(*fourcc), fps, stream_size, is_color)
+
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='video-encoder', daemon=True)
+        self._thread.start()
+
+    def write(self, **frames):
+        """Queue one frame per stream. Returns False if the set was dropped."""
+        if self.policy == BLOCK:
+            self._queue.put(frames)
+            return True
+        try:
+            self._queue.put_nowait(frames)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.on_written:
+                self.on_written(frames)
+            return False
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            frames = self._queue.get()
+            if frames is _STOP:
+                break
+            for name, frame in frames.items():
+                self.writers[name].write(frame)
+            if self.on_written:
+                self.on_written(frames)
+            self.written += 1
+
+    def close(self):
+        """Drain the queue, then release every writer."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        for writer in self.writers.values():
+            writer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()